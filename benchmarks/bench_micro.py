@@ -0,0 +1,153 @@
+"""
+Micro-benchmarks of individual functions that dominate
+the run time of model setup, on synthetic grids of increasing size
+(see the --scale option in conftest.py).
+"""
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pytest
+from shapely.geometry import box
+
+from mfsetup.discretization import find_remove_isolated_cells
+from mfsetup.fileio import load_array, save_array, write_list_file
+from mfsetup.grid import get_intercell_connections, rasterize
+from mfsetup.interpolate import interp_weights, interpolate, regrid, regrid3d
+from mfsetup.tdis import aggregate_dataframe_to_stress_periods
+
+
+@pytest.fixture(scope='module')
+def xy_points(synthetic_grid, synthetic_parent_grid):
+    source = np.transpose([synthetic_parent_grid.xcellcenters.ravel(),
+                           synthetic_parent_grid.ycellcenters.ravel()])
+    dest = np.transpose([synthetic_grid.xcellcenters.ravel(),
+                         synthetic_grid.ycellcenters.ravel()])
+    return source, dest
+
+
+def test_interp_weights(benchmark, xy_points):
+    source, dest = xy_points
+    vtx, wts = benchmark.pedantic(interp_weights, args=(source, dest),
+                                  rounds=3, iterations=1)
+    assert len(wts) == len(dest)
+
+
+def test_interpolate(benchmark, xy_points, synthetic_parent_grid):
+    source, dest = xy_points
+    vtx, wts = interp_weights(source, dest)
+    values = synthetic_parent_grid.top.ravel()
+    result = benchmark(interpolate, values, vtx, wts)
+    assert len(result) == len(dest)
+
+
+@pytest.mark.parametrize('method', ['linear', 'nearest'])
+def test_regrid(benchmark, synthetic_grid, synthetic_parent_grid, method):
+    arr = synthetic_parent_grid.top
+    result = benchmark.pedantic(regrid, args=(arr, synthetic_parent_grid, synthetic_grid),
+                                kwargs={'method': method}, rounds=3, iterations=1)
+    assert result.shape == synthetic_grid.shape[1:]
+
+
+def test_regrid3d(benchmark, small_grid_pair):
+    # 3D triangulation scales poorly;
+    # benchmark a fixed 10^4 cell problem regardless of --scale
+    parent_grid, grid = small_grid_pair
+    result = benchmark.pedantic(regrid3d, args=(parent_grid.botm, parent_grid, grid),
+                                rounds=1, iterations=1)
+    assert result.shape == grid.shape
+
+
+@pytest.fixture(scope='module')
+def polygons(synthetic_grid):
+    """Polygons covering about half of the grid area,
+    each about 5 x 5 cells in size."""
+    rng = np.random.default_rng(0)
+    x0, x1, y0, y1 = synthetic_grid.extent
+    size = 5 * synthetic_grid.delr[0]
+    npolygons = int(0.5 * (x1 - x0) * (y1 - y0) / size**2)
+    x = rng.uniform(x0, x1 - size, npolygons)
+    y = rng.uniform(y0, y1 - size, npolygons)
+    return gpd.GeoDataFrame({'id': np.arange(1, npolygons + 1),
+                             'geometry': [box(xi, yi, xi + size, yi + size)
+                                          for xi, yi in zip(x, y)]},
+                            crs=synthetic_grid.crs)
+
+
+def test_rasterize(benchmark, synthetic_grid, polygons):
+    result = benchmark.pedantic(rasterize, args=(polygons, synthetic_grid),
+                                kwargs={'id_column': 'id'}, rounds=3, iterations=1)
+    assert result.shape == synthetic_grid.shape[1:]
+
+
+def test_find_remove_isolated_cells(benchmark, synthetic_idomain):
+    result = benchmark.pedantic(find_remove_isolated_cells, args=(synthetic_idomain,),
+                                kwargs={'minimum_cluster_size': 10},
+                                rounds=3, iterations=1)
+    assert result.shape == synthetic_idomain.shape
+
+
+def test_save_array(benchmark, synthetic_grid, tmp_path):
+    arr = synthetic_grid.botm[0]
+    filename = tmp_path / 'botm.dat'
+    benchmark(save_array, filename, arr, fmt='%.6e')
+    assert filename.exists()
+
+
+def test_load_array(benchmark, synthetic_grid, tmp_path):
+    arr = synthetic_grid.botm[0]
+    filename = tmp_path / 'botm.dat'
+    save_array(filename, arr, fmt='%.6e')
+    result = benchmark(load_array, filename, shape=arr.shape)
+    np.testing.assert_allclose(result, arr, rtol=1e-6)
+
+
+def test_get_intercell_connections(benchmark, test_data_path):
+    binary_grid_file = test_data_path / 'shellmound/tmr_parent/shellmound.dis.grb'
+    df = benchmark(get_intercell_connections, binary_grid_file)
+    assert len(df) > 0
+
+
+@pytest.fixture(scope='module')
+def list_records(ncells):
+    """One-based k, i, j stress period records with a head value,
+    one record per model cell (10^5 or 10^7 rows at the small
+    and large --scale settings)."""
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({'#k': rng.integers(1, 11, ncells),
+                         'i': rng.integers(1, 1001, ncells),
+                         'j': rng.integers(1, 1001, ncells),
+                         'head': rng.uniform(50, 150, ncells)})
+
+
+@pytest.mark.parametrize('binary', [False, True], ids=['text', 'binary'])
+def test_write_list_file(benchmark, list_records, binary, tmp_path):
+    filename = tmp_path / 'chd_000.dat'
+    benchmark.pedantic(write_list_file, args=(filename, list_records),
+                       kwargs={'binary': binary}, rounds=3, iterations=1)
+    assert filename.exists()
+
+
+@pytest.fixture(scope='module')
+def pumping_records(ncells):
+    """Monthly pumping records over 10 years (about one record per
+    model cell), and period_stats input for 120 monthly stress periods."""
+    rng = np.random.default_rng(0)
+    months = pd.date_range('2010-01-01', periods=121, freq='MS')
+    nwells = ncells // 120
+    n = nwells * 120
+    records = pd.DataFrame({'well': np.arange(n) % nwells,
+                            'datetime': months[np.arange(n) // nwells],
+                            'q': rng.uniform(-1000, 0, n)})
+    period_stats = {kper: {'period_stat': 'mean',
+                           'start_datetime': start,
+                           'end_datetime': end}
+                    for kper, (start, end) in enumerate(zip(months[:-1], months[1:]))}
+    return records, period_stats
+
+
+def test_aggregate_dataframe_to_stress_periods(benchmark, pumping_records):
+    records, period_stats = pumping_records
+    result = benchmark(aggregate_dataframe_to_stress_periods, records,
+                       id_column='well', data_column='q',
+                       period_stats=period_stats)
+    assert set(result['per']) == set(period_stats.keys())
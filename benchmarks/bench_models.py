@@ -0,0 +1,26 @@
+"""
+Macro-benchmarks that build the test models end to end
+from their configuration files (in mfsetup/tests/data).
+"""
+import pytest
+
+from mfsetup import MF6model, MFnwtModel
+
+
+def setup_model(model_class, cfg):
+    m = model_class.setup_from_cfg(cfg)
+    m.write_input()
+    return m
+
+
+@pytest.mark.parametrize('cfg_file,model_class,default_file', [
+    ('shellmound.yml', MF6model, 'mf6_defaults.yml'),
+    ('pleasant_mf6_test.yml', MF6model, 'mf6_defaults.yml'),
+    ('pleasant_nwt_test.yml', MFnwtModel, 'mfnwt_defaults.yml'),
+    ('pfl_nwt_test.yml', MFnwtModel, 'mfnwt_defaults.yml'),
+])
+def test_model_setup(benchmark, model_cfg, cfg_file, model_class, default_file):
+    cfg = model_cfg(cfg_file, default_file)
+    m = benchmark.pedantic(setup_model, args=(model_class, cfg),
+                           rounds=1, iterations=1)
+    assert m.nrow > 0
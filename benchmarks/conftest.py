@@ -0,0 +1,113 @@
+"""
+Fixtures for the modflow-setup performance benchmarks.
+
+All input is either synthetic (generated here) or from the test
+data bundled with the repository, so that the benchmarks can be run offline.
+"""
+import os
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from mfsetup.fileio import load_cfg
+from mfsetup.grid import MFsetupGrid
+
+# number of model cells in the synthetic scaling fixtures,
+# by --scale option
+scales = {'small': [int(1e5)],
+          'medium': [int(1e5), int(1e6)],
+          'large': [int(1e5), int(1e6), int(1e7)]
+          }
+
+
+def pytest_addoption(parser):
+    parser.addoption('--scale', default='small', choices=scales.keys(),
+                     help=("Largest synthetic problem size to benchmark: "
+                           "small (10^5 cells), medium (10^6 cells) "
+                           "or large (10^7 cells)."))
+
+
+def pytest_generate_tests(metafunc):
+    if 'ncells' in metafunc.fixturenames:
+        ncells = scales[metafunc.config.getoption('scale')]
+        metafunc.parametrize('ncells', ncells, ids=[f'{n:.0e}cells' for n in ncells],
+                            scope='module')
+
+
+@pytest.fixture(scope='session')
+def project_root_path():
+    return Path(__file__).parent.parent
+
+
+@pytest.fixture(scope='session')
+def test_data_path(project_root_path):
+    return project_root_path / 'mfsetup/tests/data'
+
+
+def make_synthetic_grid(ncells, nlay=10, cell_size=100., xoff=500000., yoff=1000000.):
+    """Make a square, layered model grid with approximately
+    ncells cells."""
+    nrow = ncol = int(np.round(np.sqrt(ncells / nlay)))
+    top = np.ones((nrow, ncol)) * 100.
+    # gently sloping layers
+    x = np.linspace(0, 1, ncol)
+    surface = top - 5 * x[np.newaxis, :]
+    botm = np.array([surface - 10 * (k + 1) for k in range(nlay)])
+    grid = MFsetupGrid(delc=np.ones(nrow) * cell_size,
+                       delr=np.ones(ncol) * cell_size,
+                       top=surface, botm=botm,
+                       xoff=xoff, yoff=yoff, crs=5070)
+    return grid
+
+
+@pytest.fixture(scope='module')
+def synthetic_grid(ncells):
+    """Synthetic 10-layer grid with ncells cells."""
+    return make_synthetic_grid(ncells)
+
+
+@pytest.fixture(scope='module')
+def synthetic_parent_grid(synthetic_grid):
+    """Synthetic grid with twice the cell size (1/4 of the
+    cells per layer) of :func:`synthetic_grid`, covering the same area,
+    to regrid from."""
+    grid = synthetic_grid
+    nlay, nrow, ncol = grid.shape
+    return make_synthetic_grid(nlay * (nrow // 2) * (ncol // 2), nlay=nlay,
+                               cell_size=grid.delr[0] * 2,
+                               xoff=grid.xoffset, yoff=grid.yoffset)
+
+
+@pytest.fixture(scope='session')
+def small_grid_pair():
+    """Fixed 10^4 cell synthetic grid, and a grid with twice the
+    cell size covering the same area to regrid from (for benchmarks
+    that scale poorly, regardless of the --scale option)."""
+    grid = make_synthetic_grid(int(1e4))
+    parent_grid = make_synthetic_grid(int(1e4) // 4, cell_size=200.)
+    return parent_grid, grid
+
+
+@pytest.fixture(scope='module')
+def synthetic_idomain(synthetic_grid):
+    """Random active/inactive cells, with some isolated clusters."""
+    rng = np.random.default_rng(0)
+    return (rng.random(synthetic_grid.shape) > 0.3).astype(int)
+
+
+@pytest.fixture
+def model_cfg(test_data_path, tmp_path):
+    """Load a test model configuration, with output
+    redirected to a temporary folder."""
+    def load(cfg_file, default_file):
+        cfg = load_cfg(test_data_path / cfg_file, default_file=default_file)
+        if 'sim_ws' in cfg.get('simulation', {}):
+            cfg['simulation']['sim_ws'] = str(tmp_path)
+        else:
+            cfg['model']['model_ws'] = str(tmp_path)
+        cfg['mfsetup_options'] = {'write_profile': False}
+        return cfg
+    cwd = os.getcwd()
+    yield load
+    os.chdir(cwd)
@@ -2,10 +2,36 @@ from ._version import get_versions
 
 __version__ = get_versions()['version']
 del get_versions
-from mfsetup.fileio import load_modelgrid
-from mfsetup.mf6model import MF6model
-from mfsetup.mfnwtmodel import MFnwtModel
 
-from . import _version, interpolate
+from . import _version
 
 __version__ = _version.get_versions()['version']
+
+# the model classes (and flopy, geopandas, etc. that they depend on)
+# are only imported on first access (PEP 562), so that
+# "import mfsetup" is fast in command line calls and worker processes
+_lazy_attributes = {
+    'load_modelgrid': 'mfsetup.fileio',
+    'MF6model': 'mfsetup.mf6model',
+    'MFnwtModel': 'mfsetup.mfnwtmodel',
+}
+_lazy_submodules = {'interpolate'}
+
+__all__ = ['__version__', 'interpolate'] + list(_lazy_attributes)
+
+
+def __getattr__(name):
+    import importlib
+    if name in _lazy_attributes:
+        module = importlib.import_module(_lazy_attributes[name])
+        value = getattr(module, name)
+    elif name in _lazy_submodules:
+        value = importlib.import_module(f'{__name__}.{name}')
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -1,8 +1,8 @@
 """
 Functions for simple MODFLOW boundary conditions such as ghb, drain, etc.
 """
+import hashlib
 import numbers
-import shutil
 import warnings
 
 import flopy
@@ -12,12 +12,10 @@ import pandas as pd
 
 fm = flopy.modflow
 import pyproj
-import rasterio
-from gisutils import project
-from rasterstats import zonal_stats
 from shapely.geometry import Polygon
 
 from mfsetup.discretization import cellids_to_kij, get_highest_active_layer, get_layer
+from mfsetup.fileio import link_or_copy, write_list_file
 from mfsetup.grid import rasterize
 from mfsetup.sourcedata import TransientTabularSourceData
 from mfsetup.units import convert_length_units, convert_time_units
@@ -147,6 +145,7 @@ def setup_basic_stress_data(model, shapefile=None, csvfile=None,
                 if not any(filename_entries):
                     continue
                 filename = entry[filename_entries[0]]
+                import rasterio
                 with rasterio.open(filename) as src:
                     meta = src.meta
 
@@ -157,6 +156,7 @@ def setup_basic_stress_data(model, shapefile=None, csvfile=None,
                 except:
                     raster_crs = pyproj.crs.CRS.from_user_input(src.crs)
                 if raster_crs != m.modelgrid.crs:
+                    from gisutils import project
                     polygons = project(df.geometry.tolist(), m.modelgrid.crs, raster_crs)
                 else:
                     polygons = df.geometry.tolist()
@@ -170,6 +170,13 @@ def setup_basic_stress_data(model, shapefile=None, csvfile=None,
                 with rasterio.open(filename) as src:
                     affine = src.transform
                     array = src.read(1)
+                # sample double precision rasters at the intermediate
+                # precision set in mfsetup_options: dtype
+                float_dtype = getattr(model, 'float_dtype', None)
+                if float_dtype is not None and np.issubdtype(array.dtype, np.floating) \
+                        and array.dtype.itemsize > float_dtype.itemsize:
+                    array = array.astype(float_dtype)
+                from rasterstats import zonal_stats
                 results = zonal_stats(polygons, array, affine=affine, stats=stat,
                                     all_touched=all_touched)
                 #values = np.ones((m.nrow * m.ncol), dtype=float) * np.nan
@@ -326,69 +333,63 @@ def mftransientlist_to_dataframe(mftransientlist, squeeze=True):
     """
 
     data = mftransientlist
-    names = ['cellid']
+    names = ['k', 'i', 'j']
     if isinstance(data.package, flopy.mf6.modflow.ModflowGwfmaw):
         names += ['wellid']
 
-    # monkey patch the mf6 version to behave like the mf2005 version
-    #if isinstance(mftransientlist, flopy.mf6.data.mfdatalist.MFTransientList):
-    #    mftransientlist.data = {per: ra for per, ra in enumerate(mftransientlist.array)}
-
     # find relevant variable names
     # may have to iterate over the first stress period
-    #for per in range(data.model.nper):
     for per, spd in data.data.items():
         if spd is not None and hasattr(spd, 'dtype'):
             varnames = list([n for n in spd.dtype.names
                              if n not in ['k', 'i', 'j', 'cellid', 'boundname']])
             break
 
-    # create list of dataframes for each stress period
-    # each with index of k, i, j
+    # stack the stress period data into one long table
+    # with integer k, i, j columns and a period column
+    periods = []
     dfs = []
     for per, recs in data.data.items():
-
+        periods.append(per)
+        # stress periods that are set to 0 (e.g. no pumping during a
+        # predevelopment period) are filled with nans below
         if recs is None or len(recs) == 0:
-            # add an empty dataframe if a stress period is
-            # set to 0 (e.g. no pumping during a predevelopment
-            # period)
-            columns = names + list(['{}{}'.format(c, per)
-                                    for c in varnames])
-            dfi = pd.DataFrame(data=None, columns=columns)
-            dfi = dfi.set_index(names)
+            continue
+        if 'cellid' in recs.dtype.names:
+            k, i, j = np.array(recs['cellid'].tolist(),
+                               dtype=int).reshape(-1, 3).T
         else:
-            dfi = pd.DataFrame.from_records(recs)
-            if {'k', 'i', 'j'}.issubset(dfi.columns):
-                dfi['cellid'] = list(zip(dfi.k, dfi.i, dfi.j))
-                dfi.drop(['k', 'i', 'j'], axis=1, inplace=True)
-            if 'cellid' in dfi.columns:
-                dfi['cellid'] = dfi['cellid'].astype(str)
-            dfi = dfi.set_index(names)
-
-            # aggregate (sum) data to model cells
-            # because pd.concat can't handle a non-unique index
-            # (and modflow input doesn't have a unique identifier at sub-cell level)
-            dfg = dfi.groupby(names)
-            dfi = dfg.sum()  # aggregate
-            #dfi.columns = names + list(['{}{}'.format(c, per) for c in varnames])
-            dfi.columns = ['{}{}'.format(c, per) if c in varnames else c for c in dfi.columns]
+            k, i, j = recs['k'], recs['i'], recs['j']
+        dfi = pd.DataFrame({'k': k, 'i': i, 'j': j})
+        for name in names[3:] + varnames:
+            dfi[name] = recs[name]
+        dfi['per'] = per
         dfs.append(dfi)
-    df = pd.concat(dfs, axis=1)
+    if len(dfs) > 0:
+        df = pd.concat(dfs, ignore_index=True)
+    else:
+        df = pd.DataFrame(columns=names + varnames + ['per'])
+
+    # aggregate (sum) data to model cells
+    # (modflow input doesn't have a unique identifier at sub-cell level)
+    # and make a column for each variable and stress period
+    df = df.groupby(names + ['per'])[varnames].sum().unstack('per')
+    periods = sorted(periods)
+    df = df.reindex(columns=pd.MultiIndex.from_product([varnames, periods]))
+    df.columns = ['{}{}'.format(var, per) for var, per in df.columns]
     if squeeze:
         keep = []
         for var in varnames:
-            diffcols = list([n for n in df.columns if var in n])
+            diffcols = ['{}{}'.format(var, per) for per in periods]
             squeezed = squeeze_columns(df[diffcols])
             keep.append(squeezed)
         df = pd.concat(keep, axis=1)
     data_cols = df.columns.tolist()
-    df.index = [eval(s) for s in df.index]
+    df.reset_index(inplace=True)
+    df.index = pd.MultiIndex.from_arrays([df['k'], df['i'], df['j']],
+                                         names=[None] * 3)
     df['cellid'] = df.index.tolist()
-    idx_cols = ['cellid']
-    if isinstance(df.index.values[0], tuple):
-        df['k'], df['i'], df['j'] = list(zip(*df['cellid']))
-        idx_cols += ['k', 'i', 'j']
-    cols = idx_cols + data_cols
+    cols = ['cellid'] + names + data_cols
     df = df[cols]
     return df
 
@@ -405,28 +406,53 @@ def remove_inactive_bcs(pckg, external_files=False):
         active = model.dis.idomain.array > 0
     else:
         active = model.bas6.ibound.array > 0
+    # lookup of active cells by linear (node) index
+    shape = active.shape
+    active = active.ravel()
     spd = pckg.stress_period_data.data
 
     new_spd = {}
+    new_cells = {}
+    nodes = None
     for per, rec in spd.items():
         if 'cellid' in rec.dtype.names:
-            k, i, j = zip(*rec['cellid'])
+            k, i, j = np.array(rec['cellid'].tolist(),
+                               dtype=int).reshape(-1, 3).T
         else:
-            k, i, j = zip(*rec[['k', 'i', 'j']])
-        new_spd[per] = rec[active[k, i, j]]
+            k, i, j = rec['k'], rec['i'], rec['j']
+        period_nodes = np.ravel_multi_index((k, i, j), shape)
+        # only recompute the filter if the cells change
+        if nodes is None or not np.array_equal(period_nodes, nodes):
+            nodes = period_nodes
+            is_active = active.take(nodes)
+        new_spd[per] = rec[is_active]
+        new_cells[per] = k[is_active], i[is_active], j[is_active]
 
     if external_files:
         if model.version == 'mf6':
             spd_input = {}
+            written = {}
             for per, filename in external_files.items():
-                df = pd.DataFrame(new_spd[per])
-                df['#k'], df['i'], df['j'] = zip(*df['cellid'])
-                df[['#k', 'i', 'j']] += 1  # convert to 1-based for external file
-                cols = ['#k', 'i', 'j'] + list(new_spd[per].dtype.names[1:])
+                # periods can share external files
+                # (see setup_flopy_stress_period_data)
+                filename_key = filename['filename'] if isinstance(filename, dict) else filename
+                if filename_key in written:
+                    spd_input[per] = written[filename_key]
+                    continue
+                k, i, j = new_cells[per]
+                # convert to 1-based for external file
+                df = pd.DataFrame({'#k': k + 1, 'i': i + 1, 'j': j + 1})
+                for name in new_spd[per].dtype.names[1:]:
+                    df[name] = new_spd[per][name]
+                binary = False
                 if isinstance(filename, dict):
+                    binary = filename.get('binary', False)
                     filename = filename['filename']
-                df[cols].to_csv(filename, index=False, sep=' ', float_format='%g')
+                write_list_file(filename, df, binary=binary)
                 spd_input[per] = {'filename': filename}
+                if binary:
+                    spd_input[per]['binary'] = True
+                written[filename] = spd_input[per]
                 # make a copy for the intermediate data folder, for consistency with mf-2005
                 #shutil.copy(file_entry['filename'], model.cfg['intermediate_data']['output_folder'])
             pckg.stress_period_data = spd_input
@@ -462,9 +488,37 @@ def squeeze_columns(df, fillna=0.):
     return squeezed
 
 
+def get_period_hashes(data):
+    """Get a hash of the records in each stress period of a table of
+    stress period data that doesn't depend on the order of the records,
+    for identifying periods with the same input.
+
+    Parameters
+    ----------
+    data : DataFrame
+        Stress period data, with a 'per' column of stress periods.
+
+    Returns
+    -------
+    period_hashes : dict
+        Hexadecimal hash strings, keyed by stress period.
+    """
+    cols = [c for c in data.columns if c != 'per']
+    # one hash for each record, sorted by stress period and then hash
+    row_hashes = pd.util.hash_pandas_object(data[cols], index=False).values
+    order = np.lexsort((row_hashes, data['per'].values))
+    row_hashes = row_hashes[order]
+    periods, starts = np.unique(data['per'].values[order], return_index=True)
+    period_hashes = {}
+    for per, period_row_hashes in zip(periods, np.split(row_hashes, starts[1:])):
+        period_hashes[per] = hashlib.sha1(period_row_hashes.tobytes()).hexdigest()
+    return period_hashes
+
+
 def setup_flopy_stress_period_data(model, package, data, flopy_package_class,
                                    variable_columns=None, external_files=True,
-                                   external_filename_fmt="{}_{:03d}.dat"):
+                                   external_filename_fmt="{}_{:03d}.dat",
+                                   binary=False, deduplicate_periods=True):
     """Set up stress period data input for flopy, from a DataFrame
     of stress period data information.
 
@@ -489,6 +543,16 @@ def setup_flopy_stress_period_data(model, package, data, flopy_package_class,
     external_filename_fmt : format str
         Format for external file names. For example, "{}_{:03d}.dat"
         would produce "wel_000.dat" for the package='wel' and stress period 0.
+    binary : bool
+        Option to write the external files as MODFLOW 6 binary list input
+        (see :func:`mfsetup.fileio.write_list_file`). Boundnames aren't
+        supported with binary input. By default, False.
+    deduplicate_periods : bool
+        For MODFLOW 6 models, omit stress periods with the same records
+        as the previous period (MODFLOW 6 reuses the last period block
+        for omitted periods), and point periods with the same records as
+        an earlier, non-consecutive period to the same external file.
+        By default, True.
 
     Returns
     -------
@@ -516,6 +580,9 @@ def setup_flopy_stress_period_data(model, package, data, flopy_package_class,
         df['i'] += 1
         df['j'] += 1
         cols = ['per', '#k', 'i', 'j'] + variable_columns + ['boundname']
+        if binary:
+            for filepath in filepaths.values():
+                filepath['binary'] = True
     else:
         cols = ['per', 'k', 'i', 'j'] + variable_columns + ['boundname']
     cols = [c for c in cols if c in df.columns]
@@ -523,14 +590,34 @@ def setup_flopy_stress_period_data(model, package, data, flopy_package_class,
 
     spd = {}
     period_groups = df.groupby('per')
+    deduplicate_periods = deduplicate_periods and model.version == 'mf6'
+    if deduplicate_periods:
+        period_hashes = get_period_hashes(df)
+    previous_hash = None
+    files_by_hash = {}
     for kper in range(model.nper):
         if kper in period_groups.groups:
+            if deduplicate_periods:
+                period_hash = period_hashes[kper]
+                # omit periods that are the same as the last one
+                if period_hash == previous_hash:
+                    if external_files:
+                        del filepaths[kper]
+                    continue
+                previous_hash = period_hash
+                # reuse external files for repeated periods
+                if external_files and period_hash in files_by_hash:
+                    filepaths[kper]['filename'] = files_by_hash[period_hash]
+                    continue
             group = period_groups.get_group(kper)
             group.drop('per', axis=1, inplace=True)
             if external_files and model.version == 'mf6':
-                group.to_csv(filepaths[kper]['filename'], index=False, sep=' ', float_format='%g')
+                write_list_file(filepaths[kper]['filename'], group, binary=binary)
+                if deduplicate_periods:
+                    files_by_hash[period_hash] = filepaths[kper]['filename']
                 # make a copy for the intermediate data folder, for consistency with mf-2005
-                shutil.copy(filepaths[kper]['filename'], model.cfg['intermediate_data']['output_folder'])
+                link_or_copy(filepaths[kper]['filename'],
+                             model.cfg['intermediate_data']['output_folder'])
 
                 # external list or tabular type files not supported for MODFLOW-NWT
                 # adding support for this may require changes to Flopy
@@ -580,4 +667,8 @@ def setup_flopy_stress_period_data(model, package, data, flopy_package_class,
                 spd[kper] = kspd
         else:
             pass  # spd[kper] = None
+    if external_files and deduplicate_periods:
+        # only list the files that MODFLOW will actually read
+        model.cfg['external_files'][f'{package}_stress_period_data'] = \
+            {per: filepath['filename'] for per, filepath in filepaths.items()}
     return spd
@@ -6,6 +6,7 @@ from re import L
 
 import flopy
 import numpy as np
+import pandas as pd
 from flopy.mf6.data.mfdatalist import MFList
 from scipy import ndimage
 from scipy.signal import convolve2d
@@ -433,6 +434,130 @@ def make_lgr_idomain(parent_modelgrid, inset_modelgrid,
     return idomain
 
 
+def get_lgr_exchange_data(lgr):
+    """Get GWF-GWF exchange data for an LGR parent and inset model.
+    Equivalent to :meth:`flopy.utils.lgrutil.Lgr.get_exchange_data`
+    with ``angldegx=True`` and ``cdist=True``, but computed with
+    array operations instead of a loop over every inset model cell.
+
+    Parameters
+    ----------
+    lgr : :class:`flopy.utils.lgrutil.Lgr` instance
+
+    Returns
+    -------
+    exchangedata : DataFrame
+        One row per parent/inset cell connection, in the same order
+        as :meth:`~flopy.utils.lgrutil.Lgr.get_exchange_data`, with columns:
+
+        ========== =====================================================
+        k1, i1, j1 zero-based layer, row, column of the parent model cell
+        k2, i2, j2 zero-based layer, row, column of the inset model cell
+        ihc        0 for vertical, 1 or 2 for horizontal connections
+        cl1        distance from the parent cell center to the shared face
+        cl2        distance from the inset cell center to the shared face
+        hwva       width (horizontal) or area (vertical) of the shared face
+        angldegx   angle of the connection face normal
+        cdist      distance between the cell centers
+        ========== =====================================================
+    """
+    ncpp = lgr.ncpp
+    ncppl = np.asarray(lgr.ncppl, dtype=int)
+    parent_idomain = np.asarray(lgr.idomain)
+    nlayp, nrowp, ncolp = parent_idomain.shape
+
+    # parent layer, row and column containing each inset layer, row and column
+    parent_layers = np.arange(lgr.nplbeg, lgr.nplend + 1)
+    kp_of_kc = np.zeros(lgr.nlay, dtype=int)
+    kp_of_kc_refined = np.repeat(parent_layers, ncppl[parent_layers])[:lgr.nlay]
+    kp_of_kc[:len(kp_of_kc_refined)] = kp_of_kc_refined
+    ip_of_ic = lgr.nprbeg + np.arange(lgr.nrow) // ncpp
+    jp_of_jc = lgr.npcbeg + np.arange(lgr.ncol) // ncpp
+
+    # active inset model cells (not within the active parent model area)
+    kc, ic, jc = [a.ravel() for a in
+                  np.meshgrid(np.arange(lgr.nlay), np.arange(lgr.nrow),
+                              np.arange(lgr.ncol), indexing='ij')]
+    kp, ip, jp = kp_of_kc[kc], ip_of_ic[ic], jp_of_jc[jc]
+    active = parent_idomain[kp, ip, jp] != 1
+    kc, ic, jc, kp, ip, jp = [a[active] for a in (kc, ic, jc, kp, ip, jp)]
+
+    # connections to active parent cells in each direction, in the order of
+    # Lgr.get_parent_connections: (idir, inset cells on the face, parent cell offset)
+    ibcl = np.asarray(lgr.ibcl)
+    directions = [(-1, jc % ncpp == 0, (0, 0, -1)),
+                  (1, (jc + 1) % ncpp == 0, (0, 0, 1)),
+                  (2, ic % ncpp == 0, (0, -1, 0)),
+                  (-2, (ic + 1) % ncpp == 0, (0, 1, 0)),
+                  (-3, kc + 1 == ibcl[kp], (1, 0, 0))]
+    cells = []
+    idir = []
+    parent_cells = []
+    for idir_value, on_face, (dk, di, dj) in directions:
+        k1, i1, j1 = kp + dk, ip + di, jp + dj
+        connected = on_face & (k1 < nlayp) & \
+            (i1 >= 0) & (i1 < nrowp) & (j1 >= 0) & (j1 < ncolp)
+        connected[connected] = parent_idomain[k1[connected],
+                                              i1[connected],
+                                              j1[connected]] != 0
+        cells.append(np.flatnonzero(connected))
+        idir.append(np.full(connected.sum(), idir_value))
+        parent_cells.append(np.stack([k1, i1, j1])[:, connected])
+    cells = np.concatenate(cells)
+    idir = np.concatenate(idir)
+    k1, i1, j1 = np.concatenate(parent_cells, axis=1)
+    # sort by inset model cell, then direction
+    # (cells and the directions list are already in order)
+    order = np.argsort(cells, kind='stable')
+    idir = idir[order]
+    k1, i1, j1 = k1[order], i1[order], j1[order]
+    cells = cells[order]
+    k2, i2, j2 = kc[cells], ic[cells], jc[cells]
+
+    delrp = np.asarray(lgr.delrp, dtype=float)
+    delcp = np.asarray(lgr.delcp, dtype=float)
+    delrc = np.asarray(lgr.delr, dtype=float)
+    delcc = np.asarray(lgr.delc, dtype=float)
+    topp = np.asarray(lgr.topp, dtype=float)
+    botp = np.asarray(lgr.botmp, dtype=float)
+    topc = np.asarray(lgr.top, dtype=float)
+    botc = np.asarray(lgr.botm, dtype=float)
+
+    vertical = idir == -3
+    along_x = np.abs(idir) == 1
+    ihc = np.where(ncppl[k1] > 1, 2, 1)
+    ihc[vertical] = 0
+    angldegx = np.select([idir == 2, idir == -1, idir == -2],
+                         [270., 0., 90.], 180.)
+
+    # cell tops and bottoms for vertical connections
+    tpp = np.where(k1 > 0, botp[k1 - 1, i1, j1], topp[i1, j1])
+    btp = botp[k1, i1, j1]
+    tpc = np.where(k2 > 0, botc[k2 - 1, i2, j2], topc[i2, j2])
+    btc = botc[k2, i2, j2]
+    cl1 = np.select([vertical, along_x],
+                    [0.5 * (tpp - btp), 0.5 * delrp[j1]], 0.5 * delcp[i1])
+    cl2 = np.select([vertical, along_x],
+                    [0.5 * (tpc - btc), 0.5 * delrc[j2]], 0.5 * delcc[i2])
+    hwva = np.select([vertical, along_x],
+                     [delrc[j2] * delcc[i2], delcc[i2]], delrc[j2])
+
+    # distances between cell centers
+    xc = lgr.xll + np.cumsum(delrc) - 0.5 * delrc
+    yc = lgr.yll + delcc.sum() - (np.cumsum(delcc) - 0.5 * delcc)
+    xp = lgr.xllp + np.cumsum(delrp) - 0.5 * delrp
+    yp = lgr.yllp + delcp.sum() - (np.cumsum(delcp) - 0.5 * delcp)
+    cdist = np.where(vertical, cl1 + cl2,
+                     np.hypot(xc[j2] - xp[j1], yc[i2] - yp[i1]))
+
+    exchangedata = pd.DataFrame({'k1': k1, 'i1': i1, 'j1': j1,
+                                 'k2': k2, 'i2': i2, 'j2': j2,
+                                 'ihc': ihc, 'cl1': cl1, 'cl2': cl2,
+                                 'hwva': hwva, 'angldegx': angldegx,
+                                 'cdist': cdist})
+    return exchangedata
+
+
 def make_idomain(top, botm, nodata=-9999,
                  minimum_layer_thickness=1,
                  drop_thin_cells=True, tol=1e-4):
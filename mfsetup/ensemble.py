@@ -0,0 +1,482 @@
+"""
+Build ensembles of model variants that differ only in a few inputs
+(for example, hydraulic conductivity multipliers, recharge scaling
+or a different wells file), while only setting up the parts of
+the model that are shared by all of the variants (the grid, interpolation
+weights, idomain, lakes, SFR routing, etc.) once.
+"""
+import copy
+import filecmp
+import multiprocessing
+import os
+import shutil
+import time
+import warnings
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from mfsetup.bcs import remove_inactive_bcs
+from mfsetup.fileio import (
+    add_version_to_fileheader,
+    link_or_copy,
+    model_output_extensions,
+)
+
+# packages that can be remade for a variant
+# without affecting the set up of other packages
+# (variants with changes to any other blocks in the configuration
+# are set up from scratch)
+remakeable_packages = {'ic', 'npf', 'sto', 'rch', 'oc',
+                       'chd', 'drn', 'ghb', 'riv', 'wel',
+                       'upw', 'mnw2'}
+
+# packages whose setup reads input from another remakeable package
+# (for example, distributing well fluxes by transmissivity)
+package_dependencies = {'wel': {'npf', 'upw'},
+                        'mnw2': {'upw'}}
+
+# packages with boundary conditions that are culled to active cells on writing
+culled_bc_packages = {'mf6': {'chd', 'drn', 'ghb', 'riv', 'wel'},
+                      'mfnwt': {'chd'}}
+
+# the set-up base model and workspace paths,
+# for building variants in the current (worker) process
+_state = {}
+
+
+def setup_ensemble(cfg, overrides, ensemble_ws=None, model_class=None,
+                   base_name='base', n_jobs=1, link_files=True):
+    """Set up an ensemble of model variants from a base configuration and a table
+    of configuration overrides for each variant.
+
+    The base model is set up once, in its own workspace. For each variant,
+    only the packages named in the overrides (and any packages that depend
+    on them, such as a WEL package with fluxes distributed by transmissivity)
+    are set up again, using the base configuration for that package updated
+    with the overrides. All other files in the variant workspace are
+    hard links to the base model files (falling back to copies if the
+    file system doesn't support hard links), as are any files remade for the
+    variant that are identical to the base model version. Variants that
+    override configuration blocks other than the packages in
+    :data:`remakeable_packages` (for example, the grid or discretization)
+    are set up from scratch; unchanged files in their workspaces are also
+    replaced with hard links to the base model files. Model output files
+    (heads, budgets, listing files, etc.) in the base model workspace are
+    not linked to the variants, so that running a variant doesn't overwrite
+    the base model results.
+
+    .. warning::
+        A hard link is the same file as the base model file, not a copy.
+        Editing a linked file in place in a variant workspace (for example,
+        rewriting a package with Flopy, or with a text editor that saves
+        in place) also changes the base model and all of the other
+        variants that share the file. To edit variant input files after
+        the ensemble is built, delete the file and write a new one,
+        or build the ensemble with ``link_files=False``.
+
+    Parameters
+    ----------
+    cfg : str, pathlike or dict
+        Base model configuration file, or configuration dictionary
+        (as produced by :func:`mfsetup.fileio.load_cfg`).
+    overrides : DataFrame or dict
+        Configuration overrides for each variant. Either a DataFrame, with
+        one row per variant (indexed by variant name), and columns of
+        configuration keys separated by '.' (for example, 'npf.source_data.k.mult'
+        or 'rch.source_data.recharge.mult'); or a dictionary of the same
+        structure (``{variant name: {key: value, ...}, ...}``). Missing (NaN)
+        values are not applied. Relative file paths are assumed to be relative
+        to the current working directory.
+    ensemble_ws : str or pathlike, optional
+        Folder for the base model and variant workspaces, which are
+        made in subfolders named by ``base_name`` and the variant names.
+        By default, the model (or simulation) workspace in the base configuration.
+    model_class : MF6model or MFnwtModel, optional
+        By default, MF6model for configurations with a simulation block,
+        otherwise MFnwtModel.
+    base_name : str
+        Subfolder for the base model, by default 'base'.
+    n_jobs : int
+        Number of processes for building the variants. Each process
+        starts with a copy of the set-up base model (via fork), so that
+        parallel builds are only available on platforms that support fork
+        (Linux and macOS). By default, 1 (the variants are built in
+        the current process).
+    link_files : bool
+        Option to hard link unchanged variant files to the base model files.
+        If False, the files are copied instead, so that variant files
+        can be safely edited in place, at the cost of the time and
+        disk space to copy them. By default, True.
+
+    Returns
+    -------
+    summary : DataFrame
+        Summary of the variants built, indexed by variant name, with columns:
+
+        ============ ==========================================================
+        workspace    variant model workspace
+        method       'remade' (only the packages in ``packages`` were set up)
+                     or 'rebuilt' (set up from scratch)
+        packages     packages set up for the variant
+        linked       number of files hard linked to (or copied from, with
+                     ``link_files=False``) the base model
+        written      number of files written for the variant
+        seconds      time to set up and write the variant
+        ============ ==========================================================
+
+    Examples
+    --------
+    >>> overrides = pd.DataFrame({'npf.source_data.k.mult': [0.5, 2.],
+    ...                           'rch.source_data.recharge.mult': [0.8, 1.2]},
+    ...                          index=['low', 'high'])
+    >>> summary = setup_ensemble('shellmound.yml', overrides, n_jobs=2)
+    """
+    from mfsetup.fileio import load, load_cfg
+    from mfsetup.mf6model import MF6model
+    from mfsetup.mfnwtmodel import MFnwtModel
+
+    cwd = os.getcwd()
+    variants = _parse_overrides(overrides)
+
+    if not isinstance(cfg, dict):
+        if model_class is None:
+            model_class = MF6model if 'simulation' in load(cfg, cache=True) \
+                else MFnwtModel
+        cfg = load_cfg(cfg, default_file=model_class.default_file)
+    else:
+        cfg = copy.deepcopy(cfg)
+        if model_class is None:
+            model_class = MF6model if 'simulation' in cfg else MFnwtModel
+    if not cfg['model'].get('relative_external_paths', True):
+        raise ValueError('Ensembles require relative_external_paths: True '
+                         'in the model configuration block.')
+    if ensemble_ws is None:
+        ensemble_ws = _get_workspace(cfg)
+    ensemble_ws = Path(ensemble_ws).absolute()
+    base_ws = ensemble_ws / base_name
+    if base_name in variants:
+        raise ValueError(f"Variant name {base_name} is the same as base_name")
+
+    # set up and write the base model
+    print(f'\nSetting up base model in {base_ws}...')
+    base_cfg = _set_workspace_in_cfg(cfg, base_ws)
+    m = model_class.setup_from_cfg(copy.deepcopy(base_cfg))
+    if m.inset is not None and any(inset._is_lgr for inset in m.inset.values()):
+        raise NotImplementedError('Ensembles of LGR models are not supported.')
+    m.write_input()
+
+    _state.clear()
+    _state.update({'model': m,
+                   'model_class': model_class,
+                   'cfg': base_cfg,
+                   'base_ws': base_ws,
+                   'ensemble_ws': ensemble_ws,
+                   'link_files': link_files})
+    scratch_root = ensemble_ws / '.scratch'
+    tasks = list(variants.items())
+    try:
+        if n_jobs > 1 and 'fork' not in multiprocessing.get_all_start_methods():
+            warnings.warn('Parallel ensemble builds require the fork start method; '
+                          'building variants in serial.')
+            n_jobs = 1
+        if n_jobs > 1:
+            context = multiprocessing.get_context('fork')
+            with context.Pool(n_jobs, initializer=_init_worker,
+                              initargs=(scratch_root,)) as pool:
+                results = pool.starmap(_build_variant, tasks, chunksize=1)
+        else:
+            _init_worker(scratch_root)
+            results = [_build_variant(*task) for task in tasks]
+    finally:
+        os.chdir(cwd)
+        _state.clear()
+        shutil.rmtree(scratch_root, ignore_errors=True)
+    summary = pd.DataFrame(results).set_index('variant')
+    print(f'\nEnsemble of {len(summary)} variants set up in {ensemble_ws}:')
+    print(summary.drop('workspace', axis=1).to_string() + '\n')
+    return summary
+
+
+def _parse_overrides(overrides):
+    """Convert a DataFrame or dictionary of overrides to a
+    dictionary of {variant name: {key: value}}, dropping missing values."""
+    if isinstance(overrides, pd.DataFrame):
+        overrides = overrides.to_dict(orient='index')
+    variants = {}
+    for name, variant in overrides.items():
+        variant_overrides = {}
+        for key, value in variant.items():
+            if np.isscalar(value) and pd.isna(value):
+                continue
+            if isinstance(value, str) and os.path.exists(value):
+                value = os.path.abspath(value)
+            variant_overrides[key] = value
+        variants[str(name)] = variant_overrides
+    return variants
+
+
+def _get_workspace(cfg):
+    if 'simulation' in cfg:
+        return cfg['simulation']['sim_ws']
+    return cfg['model']['model_ws']
+
+
+def _set_workspace_in_cfg(cfg, workspace):
+    """Return a copy of a configuration dictionary with the model
+    (or simulation) workspace changed to workspace, including
+    any file paths within the original workspace (such as output folders)."""
+    cfg = _replace_workspace_paths(cfg, _get_workspace(cfg), workspace)
+    workspace = os.path.normpath(os.path.abspath(workspace))
+    if 'simulation' in cfg:
+        cfg['simulation']['sim_ws'] = workspace
+    else:
+        cfg['model']['model_ws'] = workspace
+    return cfg
+
+
+def set_cfg_value(cfg, key, value):
+    """Set a value in a nested configuration dictionary.
+
+    Parameters
+    ----------
+    cfg : dict
+        Configuration dictionary.
+    key : str
+        Sequence of keys separated by '.',
+        e.g. 'npf.source_data.k.mult' for cfg['npf']['source_data']['k']['mult'].
+        Integer keys (e.g. stress periods or layers) can be specified as digits.
+    value : object
+        Value to set.
+    """
+    keys = key.split('.')
+    d = cfg
+    for k in keys[:-1]:
+        if k not in d and k.isdigit() and int(k) in d:
+            k = int(k)
+        if d.get(k) is None:
+            d[k] = {}
+        d = d[k]
+    k = keys[-1]
+    if k not in d and k.isdigit() and (int(k) in d or len(d) > 0 and
+                                       all(isinstance(kk, int) for kk in d)):
+        k = int(k)
+    d[k] = value
+
+
+def _init_worker(scratch_root):
+    """Make a working copy of the base model workspace,
+    and point the base model to it, so that packages can be remade
+    without modifying the base model files."""
+    m = _state['model']
+    scratch_ws = Path(scratch_root, str(os.getpid()))
+    if scratch_ws.exists():
+        shutil.rmtree(scratch_ws)
+    shutil.copytree(_state['base_ws'], scratch_ws)
+    _set_model_workspace(m, _state['base_ws'], scratch_ws)
+    _state['scratch_ws'] = scratch_ws
+    _state['initial_cfg'] = _replace_workspace_paths(m._initial_cfg,
+                                                     _state['base_ws'], scratch_ws)
+    _state['modified'] = set()
+
+
+def _replace_workspace_paths(cfg, old_ws, new_ws):
+    """Return a copy of a configuration dictionary,
+    with any absolute paths within old_ws moved to new_ws."""
+    old_ws = os.path.normpath(os.path.abspath(old_ws))
+    new_ws = os.path.normpath(os.path.abspath(new_ws))
+
+    def replace(item):
+        if isinstance(item, str) or isinstance(item, Path):
+            path = os.path.normpath(item)
+            if os.path.isabs(path) and \
+                    (path == old_ws or path.startswith(old_ws + os.sep)):
+                return type(item)(new_ws + path[len(old_ws):])
+        elif isinstance(item, dict):
+            for k, v in item.items():
+                item[k] = replace(v)
+        elif isinstance(item, list):
+            for i, v in enumerate(item):
+                item[i] = replace(v)
+        return item
+    return replace(copy.deepcopy(cfg))
+
+
+def _set_model_workspace(m, old_ws, new_ws):
+    """Point a set-up model to a copy of its workspace."""
+    os.chdir(new_ws)
+    # modflow-setup works within the model workspace,
+    # with paths relative to it
+    m.model_ws = Path('.')
+    if m.version == 'mf6':
+        m.simulation.set_sim_path(str(new_ws))
+    m.cfg = _replace_workspace_paths(m.cfg, old_ws, new_ws)
+    for name, folder in m.cfg['postprocessing']['output_folders'].items():
+        setattr(m, f'_{name}_path', folder)
+
+
+def _build_variant(name, overrides):
+    """Build a model variant, by remaking the packages named in overrides
+    if possible, otherwise by setting up the model from scratch."""
+    t0 = time.time()
+    m = _state['model']
+    variant_ws = _state['ensemble_ws'] / name
+    if variant_ws.exists():
+        shutil.rmtree(variant_ws)
+    packages = {key.split('.')[0] for key in overrides}
+    model_packages = {p for p in packages if getattr(m, p, None) is not None}
+    if packages.issubset(remakeable_packages) and packages == model_packages:
+        result = _remake_variant(name, overrides, packages, variant_ws)
+    else:
+        result = _rebuild_variant(name, overrides, variant_ws)
+    result['seconds'] = round(time.time() - t0, 2)
+    print(f"finished variant {name} in {result['seconds']:.2f}s")
+    return result
+
+
+def _remake_variant(name, overrides, packages, variant_ws):
+    """Build a variant by remaking only the packages named in overrides
+    (and any packages that depend on them) in the working copy of the
+    base model, then linking the base model files that weren't changed."""
+    print(f'\nSetting up variant {name} (remaking {", ".join(sorted(packages))})...')
+    m = _state['model']
+    scratch_ws = _state['scratch_ws']
+    # include packages that depend on the packages being remade
+    remake = set(packages)
+    for pkg, depends_on in package_dependencies.items():
+        if depends_on & packages and getattr(m, pkg, None) is not None:
+            remake.add(pkg)
+    # restore any packages that the remade packages depend on
+    # that were modified for a previous variant
+    restore = set()
+    for pkg in remake:
+        restore |= package_dependencies.get(pkg, set())
+    restore = (restore & _state['modified']) - remake
+
+    before = _scan_workspace(scratch_ws)
+    for pkg in [p for p in m._package_setup_order if p in remake | restore]:
+        m.cfg[pkg] = copy.deepcopy(_state['initial_cfg'][pkg])
+        if pkg in remake:
+            for key, value in overrides.items():
+                if key.split('.')[0] == pkg:
+                    set_cfg_value(m.cfg, key, copy.deepcopy(value))
+        _remake_package(m, pkg)
+    written = [p for p in m._package_setup_order if p in remake]
+    _write_packages(m, written)
+    _state['modified'] = (_state['modified'] | remake) - restore
+
+    # files that were written for the variant
+    after = _scan_workspace(scratch_ws)
+    changed = {f for f, stat in after.items() if before.get(f) != stat}
+    if not m.cfg['mfsetup_options'].get('keep_original_arrays', False):
+        changed = {f for f in changed if f.parts[0] != m.tmpdir.name}
+    nlinked, nwritten = _link_workspace(_state['base_ws'], scratch_ws,
+                                        variant_ws, changed,
+                                        link=_state['link_files'])
+    return {'variant': name, 'workspace': str(variant_ws), 'method': 'remade',
+            'packages': ', '.join(written), 'linked': nlinked, 'written': nwritten}
+
+
+def _remake_package(m, package):
+    """Remove a package from a model, and set it up again
+    from the model configuration."""
+    if getattr(m, package, None) is not None:
+        m.remove_package(package if m.version == 'mf6' else package.upper())
+    package_setup = getattr(m, f'setup_{package}')
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        package_setup(**m.cfg[package], **m.cfg[package]['mfsetup_options'])
+
+
+def _write_packages(m, packages):
+    """Write selected packages (including the version header),
+    as in the model write_input method."""
+    for pkg in packages:
+        package = getattr(m, pkg)
+        if pkg in culled_bc_packages[m.version]:
+            if m.version == 'mf6':
+                remove_inactive_bcs(package,
+                                    external_files=m.cfg[pkg]['stress_period_data'])
+            else:
+                remove_inactive_bcs(package)
+        if m.version == 'mf6':
+            package.write()
+            files = [package.filename]
+        else:
+            package.write_file()
+            files = [package.file_name[0]]
+        for f in files:
+            if Path(f).suffix not in {'.hyd', '.gag', '.gage'}:
+                add_version_to_fileheader(f, model_info=m.header)
+
+
+def _rebuild_variant(name, overrides, variant_ws):
+    """Set up a variant from scratch (for variants with changes
+    that affect more than the remakeable packages)."""
+    print(f'\nSetting up variant {name} from scratch...')
+    cwd = os.getcwd()
+    cfg = _set_workspace_in_cfg(_state['cfg'], variant_ws)
+    for key, value in overrides.items():
+        set_cfg_value(cfg, key, copy.deepcopy(value))
+    # reuse any parent model snapshot from the base model
+    # (snapshots are replaced, not edited in place, when they are updated)
+    base_cache = _state['base_ws'] / '.mfsetup-cache'
+    if base_cache.is_dir():
+        for f in base_cache.iterdir():
+            link_or_copy(f, variant_ws / base_cache.name / f.name)
+    try:
+        variant = _state['model_class'].setup_from_cfg(cfg)
+        variant.write_input()
+    finally:
+        os.chdir(cwd)
+    files = set(_scan_workspace(variant_ws).keys())
+    # replace files that are the same as in the base model with links
+    nlinked = 0
+    for f in files:
+        base_file = _state['base_ws'] / f
+        variant_file = variant_ws / f
+        if not _state['link_files'] or f.suffix.lower() in model_output_extensions:
+            continue
+        if base_file.exists() and filecmp.cmp(base_file, variant_file, shallow=False):
+            link_or_copy(base_file, variant_file)
+            nlinked += 1
+    return {'variant': name, 'workspace': str(variant_ws), 'method': 'rebuilt',
+            'packages': 'all', 'linked': nlinked, 'written': len(files) - nlinked}
+
+
+def _scan_workspace(workspace):
+    """Get the size and modification time of
+    each file in a workspace, by path relative to the workspace."""
+    files = {}
+    for root, dirs, filenames in os.walk(workspace):
+        for filename in filenames:
+            path = Path(root, filename)
+            stat = path.stat()
+            files[path.relative_to(workspace)] = (stat.st_size, stat.st_mtime_ns)
+    return files
+
+
+def _link_workspace(base_ws, scratch_ws, variant_ws, changed, link=True):
+    """Populate a variant workspace with links to (or if link=False,
+    copies of) the base model input files, and copies of files in the
+    working copy that were changed for the variant (unless they are
+    identical to the base model files). Base model output files aren't
+    included, so that they can't be overwritten by running the variant."""
+    nlinked = 0
+    nwritten = 0
+    for f in _scan_workspace(base_ws):
+        if f not in changed and f.suffix.lower() not in model_output_extensions:
+            link_or_copy(base_ws / f, variant_ws / f, link=link)
+            nlinked += 1
+    for f in changed:
+        base_file = base_ws / f
+        scratch_file = scratch_ws / f
+        if base_file.exists() and filecmp.cmp(base_file, scratch_file, shallow=False):
+            link_or_copy(base_file, variant_ws / f, link=link)
+            nlinked += 1
+        else:
+            (variant_ws / f).parent.mkdir(parents=True, exist_ok=True)
+            shutil.copy2(scratch_file, variant_ws / f)
+            nwritten += 1
+    return nlinked, nwritten
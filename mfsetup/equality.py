@@ -1,15 +1,230 @@
 """
 Functions for checking equality between Flopy objects
 """
+import hashlib
+import os
+
 import flopy
 import numpy as np
+import pandas as pd
 
 fm = flopy.modflow
 mf6 = flopy.mf6
 from flopy.datbase import DataInterface, DataType
 from flopy.mbase import ModelInterface
+from flopy.mf6.data.mfdatastorage import DataStorageType
 from flopy.utils import TemporalReference
 
+# content hashes of external files,
+# by (path, size, modification time)
+_file_hashes = {}
+
+# attributes of MODFLOW-2005 style Flopy data objects
+# that hold their values (or the data objects that do)
+_value_attributes = {'Util2d': ('_Util2d__value', '_Util2d__value_built', 'cnstnt'),
+                     'Util3d': ('util_2ds',),
+                     'Transient2d': ('transient_2ds',),
+                     'Transient3d': ('transient_3ds',),
+                     'MfList': ('_MfList__data',)}
+
+
+def hash_array(array):
+    """Get a hash of the contents of a numpy array (or record array),
+    including its dtype and shape.
+    """
+    array = np.ascontiguousarray(array)
+    fingerprint = hashlib.blake2b(digest_size=16)
+    fingerprint.update(f'{array.dtype.descr} {array.shape}'.encode())
+    if array.dtype.hasobject:
+        # hash object (e.g. string) values by content instead of by reference
+        df = pd.DataFrame(array.reshape(len(array), -1) if array.dtype.names is None
+                          else array)
+        fingerprint.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    else:
+        fingerprint.update(array.tobytes())
+    return fingerprint.hexdigest()
+
+
+def hash_file(filename):
+    """Get a hash of the contents of a file. Hashes are cached
+    by the file path, size and modification time, so that files
+    are only read once (unless they change)."""
+    stat = os.stat(filename)
+    key = (os.path.abspath(filename), stat.st_size, stat.st_mtime_ns)
+    if key not in _file_hashes:
+        fingerprint = hashlib.blake2b(digest_size=16)
+        with open(filename, 'rb') as src:
+            for chunk in iter(lambda: src.read(2**20), b''):
+                fingerprint.update(chunk)
+        _file_hashes[key] = fingerprint.hexdigest()
+    return _file_hashes[key]
+
+
+def _get_external_files(data):
+    """Get the external files (and multiplication factors)
+    for a MODFLOW 6 array that is only stored in external text or binary
+    files; or None if any of the array data are internal, or only in memory."""
+    try:
+        storage_objects = getattr(data, '_data_storage', None)
+        if isinstance(storage_objects, dict):
+            storage_objects = storage_objects.items()
+        else:
+            storage_objects = [(None, data._get_storage_obj())]
+        files = []
+        for key, storage in storage_objects:
+            for layer_storage in storage.layer_storage.elements():
+                if layer_storage.data_storage_type != DataStorageType.external_file or\
+                        layer_storage.internal_data is not None:
+                    return
+                filename = data._simulation_data.mfpath.resolve_path(
+                    layer_storage.fname, data._model_or_sim.name)
+                files.append((key, filename, layer_storage.factor))
+        return files
+    except Exception:
+        return
+
+
+def get_fingerprint(data):
+    """Get a fingerprint (hash) of the contents of a Flopy array
+    or list data object. Arrays that are only stored in external files are
+    fingerprinted by the file contents (without loading the arrays); other
+    data are fingerprinted by their values in memory.
+
+    Parameters
+    ----------
+    data : Flopy data object (:class:`flopy.datbase.DataInterface`)
+
+    Returns
+    -------
+    fingerprint : str
+        Hash of the data contents; or None if the data
+        couldn't be fingerprinted.
+    """
+    fingerprint = hashlib.blake2b(digest_size=16)
+    if data.data_type in {DataType.list, DataType.transientlist}:
+        periods = _get_list_data(data)
+        if periods is None:
+            return
+        for per, ra in sorted(periods.items()):
+            fingerprint.update(f'{per} {_hash_value(ra)}'.encode())
+        return fingerprint.hexdigest()
+    files = _get_external_files(data)
+    if files is not None:
+        for key, filename, factor in files:
+            fingerprint.update(f'{key} {hash_file(filename)} {factor}'.encode())
+        return 'files:' + fingerprint.hexdigest()
+    try:
+        return _hash_value(data.array)
+    except Exception:
+        return
+
+
+def _get_data_state(data):
+    """Get a list of the objects that hold the values of a Flopy data
+    object (arrays, constants, multipliers, etc.), for checking whether
+    the data have been set since they were fingerprinted. Returns None
+    if the data (or any part of them) are stored in external files
+    (MODFLOW 6), or the data object type isn't supported.
+    """
+    state = []
+
+    def add(item):
+        name = type(item).__name__
+        if isinstance(item, dict):
+            for key, value in item.items():
+                state.append(key)
+                add(value)
+        elif isinstance(item, (list, tuple)):
+            state.append(len(item))
+            for value in item:
+                add(value)
+        elif name in _value_attributes:
+            for attribute in _value_attributes[name]:
+                add(getattr(item, attribute, None))
+        else:
+            state.append(item)
+
+    if isinstance(data, mf6.data.mfdata.MFData):
+        storage_objects = getattr(data, '_data_storage', None)
+        if isinstance(storage_objects, dict):
+            storage_objects = storage_objects.items()
+        else:
+            storage_objects = [(None, data._get_storage_obj())]
+        for key, storage in storage_objects:
+            layer_storages = storage.layer_storage.elements() \
+                if hasattr(storage, 'layer_storage') else [storage]
+            for layer_storage in layer_storages:
+                if layer_storage.data_storage_type == DataStorageType.external_file:
+                    return
+                state += [key, layer_storage.data_storage_type,
+                          layer_storage.internal_data,
+                          getattr(layer_storage, 'factor', None),
+                          getattr(layer_storage, 'data_const_value', None)]
+        return state
+    elif type(data).__name__ in _value_attributes:
+        add(data)
+        return state
+
+
+def _same_state(state1, state2):
+    """Check whether two lists of data objects from
+    :func:`_get_data_state` are the same. Arrays (and other
+    mutable objects) must be the same objects; other
+    values (numbers, strings, etc.) must be equal."""
+    if state1 is None or state2 is None or len(state1) != len(state2):
+        return False
+    for item1, item2 in zip(state1, state2):
+        if item1 is item2:
+            continue
+        if type(item1) is not type(item2) or \
+                not isinstance(item1, (str, int, float, np.number)) or item1 != item2:
+            return False
+    return True
+
+
+def get_package_fingerprint(package, name, data):
+    """Get a fingerprint of a data attribute of a Flopy package
+    (see :func:`get_fingerprint`). Fingerprints of data in memory
+    are cached on the package, along with the objects that hold
+    the data values, so that the data are only hashed again if they are set
+    (for example, by assigning the package attribute, or with ``set_data``).
+    Changes made in place to the arrays held by the data object aren't detected.
+
+    Parameters
+    ----------
+    package : Flopy package instance
+    name : str
+        Name of the data attribute.
+    data : Flopy data object (:class:`flopy.datbase.DataInterface`)
+
+    Returns
+    -------
+    fingerprint : str
+        Hash of the data contents; or None if the data
+        couldn't be fingerprinted.
+    """
+    cache = package.__dict__.setdefault('_fingerprints', {})
+    cached = cache.get(name)
+    if cached is not None and cached[0] is data and \
+            _same_state(cached[1], _get_data_state(data)):
+        return cached[2]
+    fingerprint = get_fingerprint(data)
+    # get the state after fingerprinting,
+    # in case any data were loaded from files in the process
+    state = _get_data_state(data)
+    if fingerprint is not None and state is not None and \
+            not fingerprint.startswith('files:'):
+        cache[name] = (data, state, fingerprint)
+    else:
+        cache.pop(name, None)
+    return fingerprint
+
+
+def _hash_value(value):
+    if isinstance(value, np.ndarray):
+        return hash_array(value)
+    return repr(value)
+
 
 def get_package_list(model):
     if model.version == 'mf6':
@@ -19,12 +234,48 @@ def get_package_list(model):
     return packages
 
 
-def package_eq(pk1, pk2):
-    """Test for equality between two package objects."""
+def package_eq(pk1, pk2, differences=None):
+    """Test for equality between two package objects.
+
+    Array and list data are compared by their fingerprints first
+    (see :func:`get_package_fingerprint`); values are only compared if the
+    fingerprints are different.
+
+    Parameters
+    ----------
+    pk1, pk2 : Flopy package instances
+    differences : list, optional
+        If a list is supplied, descriptions of the package attributes
+        that differ (including the array layers or stress periods that differ)
+        are appended to it, and all attributes are compared.
+        By default, None (the comparison stops at the first difference).
+
+    Returns
+    -------
+    equal : bool
+    """
+    equal = True
+    # (set up the fingerprint caches before comparing the package attributes)
+    for package in pk1, pk2:
+        package.__dict__.setdefault('_fingerprints', {})
+    package_name = getattr(pk1, 'name', type(pk1).__name__)
+    if isinstance(package_name, list):
+        package_name = package_name[0]
+
+    def differ(attribute, detail=None):
+        nonlocal equal
+        equal = False
+        if differences is not None:
+            text = f'{package_name}.{attribute}'
+            if detail is not None:
+                text += f' ({detail})'
+            differences.append(text)
+        return differences is None
+
     for k, v in pk1.__dict__.items():
-        v2 = pk2.__dict__[k]
         if k in ['_child_package_groups',
                  '_data_list',
+                 '_fingerprints',
                  '_packagelist',
                  '_simulation_data',
                  'blocks',
@@ -37,111 +288,233 @@ def package_eq(pk1, pk2):
                  'structure'
                  ]:
             continue
+        elif k not in pk2.__dict__:
+            if differ(k, 'missing'):
+                return False
+            continue
+        v2 = pk2.__dict__[k]
         # skip packages within packages to avoid RecursionError
-        elif isinstance(v, mf6.mfpackage.MFPackage) or\
+        if isinstance(v, mf6.mfpackage.MFPackage) or\
             isinstance(v, mf6.mfbase.PackageContainer):
             continue
         elif isinstance(v, mf6.mfpackage.MFChildPackages):
-            if not package_eq(v, v2):
-                return False
-        elif k not in pk2.__dict__:
-            return False
+            if not package_eq(v, v2, differences=differences):
+                if differ(k):
+                    return False
         elif type(v) == bool:
             if not v == v2:
-                return False
+                if differ(k):
+                    return False
         elif type(v) == dict:
             for v_k, v_v in v.items():
                 if v_k not in v2:
-                    return False
+                    if differ(k, f'missing {v_k}'):
+                        return False
+                    continue
                 # skip packages within packages to avoid RecursionError
                 if isinstance(v_v, mf6.mfpackage.MFPackage):
                     continue
                 elif v[v_k] != v2[v_k]:
-                    return False
+                    if differ(k, v_k):
+                        return False
         elif type(v) in [str, int, float, list]:
             if v != v2:
-                return False
+                if differ(k):
+                    return False
         elif isinstance(v, ModelInterface):
             # weak, but calling model_eq would result in recursion
             if v.__repr__() != v2.__repr__():
-                return False
+                if differ(k):
+                    return False
         elif isinstance(v, DataInterface):
-            if v != v2:
-                if v.data_type == DataType.transientlist or \
-                        v.data_type == DataType.list:
-                    if not list_eq(v, v2):
+            # compare fingerprints first
+            fingerprint = get_package_fingerprint(pk1, k, v)
+            if fingerprint is not None and \
+                    fingerprint == get_package_fingerprint(pk2, k, v2):
+                continue
+            if v.data_type == DataType.transientlist or \
+                    v.data_type == DataType.list:
+                periods, first_difference = list_differences(v, v2)
+                if periods:
+                    per, row = first_difference
+                    detail = f'periods {periods}; first difference in period {per}'
+                    if row is not None:
+                        detail += f', row {row}'
+                    if differ(k, detail):
                         return False
-                else:
-                    a1, a2 = v.array, v2.array
-                    if a1 is None and a2 is None:
-                        continue
-                    if not isinstance(a1, np.ndarray):
-                        if a1 != a2:
+            else:
+                a1, a2 = v.array, v2.array
+                if a1 is None and a2 is None:
+                    continue
+                if not isinstance(a1, np.ndarray):
+                    if a1 != a2:
+                        if differ(k):
                             return False
-                    # TODO: this may return False if there are nans
-                    elif not np.allclose(v.array, v2.array):
+                elif not isinstance(a2, np.ndarray) or a1.shape != a2.shape:
+                    if differ(k, 'shape'):
+                        return False
+                # TODO: this may return False if there are nans
+                elif not np.allclose(a1, a2):
+                    detail = None
+                    if a1.ndim > 2:
+                        # report the first dimension (layers or periods) that differ
+                        axes = tuple(range(1, a1.ndim))
+                        different = np.where(~np.isclose(a1, a2).all(axis=axes))[0]
+                        label = 'periods' if v.data_type in {DataType.transient2d,
+                                                             DataType.transient3d} \
+                            else 'layers'
+                        detail = f'{label} {different.tolist()}'
+                    if differ(k, detail):
                         return False
         elif isinstance(v, TemporalReference):
             pass
         elif v != v2:
-            return False
-    return True
+            if differ(k):
+                return False
+    return equal
+
+
+def _get_list_data(mflist):
+    """Get the data for a Flopy list object,
+    as a dictionary of np.recarrays by stress period."""
+    if isinstance(mflist, mf6.data.mfdatalist.MFTransientList):
+        array = mflist.array
+        if array is None:
+            return {}
+        return {per: ra for per, ra in enumerate(array)}
+    elif isinstance(mflist, mf6.data.mfdatalist.MFList):
+        return {0: mflist.array}
+    elif hasattr(mflist, 'data'):
+        return mflist.data
+    # lists that don't have a data attribute
+    # (e.g. in the ModflowGwfoc package) aren't compared for now
+
+
+def list_differences(mflist1, mflist2):
+    """Get the stress periods that differ between two transientlists.
+
+    The data for the stress periods with the same fields (and dtypes)
+    are stacked into one set of columns (with a period index), and compared
+    field by field in one vectorized pass. As in :func:`list_eq`, NaN values
+    in floating point fields are treated as zeros.
+
+    Returns
+    -------
+    periods : list
+        Stress periods in mflist1 that are missing from
+        or different in mflist2.
+    first_difference : tuple or None
+        (stress period, row) of the first difference found;
+        row is None if the period is missing from mflist2, or the
+        periods have different lengths or fields.
+    """
+    data1 = _get_list_data(mflist1)
+    data2 = _get_list_data(mflist2)
+    if data1 is None:
+        return [], None
+    different = {}
+    # periods that can be compared row by row,
+    # grouped by their dtypes
+    stack_periods = {}
+    for per, v in data1.items():
+        v2 = data2.get(per)
+        if per not in data2:
+            different[per] = None
+        elif v is None and v2 is None:
+            continue
+        elif not isinstance(v, np.ndarray) or not isinstance(v2, np.ndarray):
+            if not isinstance(v, np.ndarray) and not isinstance(v2, np.ndarray) \
+                    and v == v2:
+                continue
+            different[per] = None
+        elif v.dtype.names != v2.dtype.names or len(v) != len(v2):
+            different[per] = None
+        elif len(v) > 0:
+            stack_periods.setdefault((v.dtype, v2.dtype), []).append(per)
+
+    for group in stack_periods.values():
+        different.update(_stacked_differences(data1, data2, group))
+    periods = sorted(different)
+    first_difference = None
+    if periods:
+        first_difference = (periods[0], different[periods[0]])
+    return periods, first_difference
+
+
+def _stacked_differences(data1, data2, periods):
+    """Compare the recarrays for a set of stress periods
+    (with the same fields and dtypes in each dataset) in one pass,
+    by stacking them. Returns a dictionary of the first differing
+    row in each period that differs."""
+    lengths = [len(data1[per]) for per in periods]
+    period = np.repeat(periods, lengths)
+    row = np.arange(len(period)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    row_differs = np.zeros(len(period), dtype=bool)
+    for name in data1[periods[0]].dtype.names:
+        c1 = np.concatenate([data1[per][name] for per in periods])
+        c2 = np.concatenate([data2[per][name] for per in periods])
+        if np.issubdtype(c1.dtype, np.floating):
+            c1 = np.where(np.isnan(c1), 0, c1)
+        if np.issubdtype(c2.dtype, np.floating):
+            c2 = np.where(np.isnan(c2), 0, c2)
+        equal = np.asarray(c1 == c2, dtype=bool)
+        if equal.shape != c1.shape:
+            equal = np.zeros(len(c1), dtype=bool)
+        row_differs |= ~equal
+    # first differing row in each period
+    differs = np.flatnonzero(row_differs)
+    different_periods, first = np.unique(period[differs], return_index=True)
+    return {int(per): int(row[i])
+            for per, i in zip(different_periods, differs[first])}
 
 
 def list_eq(mflist1, mflist2):
     """Compare two transientlists.
     """
-    if isinstance(mflist1, mf6.data.mfdatalist.MFTransientList):
-        data1 = {per: ra for per, ra in enumerate(mflist1.array)}
-        data2 = {per: ra for per, ra in enumerate(mflist2.array)}
-    elif isinstance(mflist1, mf6.data.mfdatalist.MFList):
-        data1 = {0: mflist1.array}
-        data2 = {0: mflist2.array}
-    elif hasattr(mflist1, 'data'):
-        data1 = mflist1.data
-        data2 = mflist2.data
-    else:  # pass on lists that don't have a data attribute for now;
-        # this affects the ModflowGwfoc package
-        return True
-    for k, v in data1.items():
-        if k not in data2:
-            return False
-        v2 = data2[k]
-        if v is None and v2 is None:
-            continue
-        elif not isinstance(v, np.recarray):
-            if v != v2:
-                return False
-        else:
-            # compare the two np.recarrays
-            # not sure if this will work for all relevant cases
-            for c, dtype in v.dtype.fields.items():
-                c1 = v[c].copy()
-                c2 = v2[c].copy()
-                if np.issubdtype(dtype[0].type, np.floating):
-                    c1[np.isnan(c1)] = 0
-                    c2[np.isnan(c2)] = 0
-                if not np.array_equal(c1, c2):
-                    return False
-    return True
+    periods, first_difference = list_differences(mflist1, mflist2)
+    return not periods
 
 
-def model_eq(m1, m2):
-    """Test for equality between two model objects."""
+def model_eq(m1, m2, differences=None):
+    """Test for equality between two model objects.
+
+    Parameters
+    ----------
+    m1, m2 : Flopy model instances
+    differences : list, optional
+        If a list is supplied, descriptions of the packages,
+        package attributes, array layers and stress periods that differ are
+        appended to it, and all packages are compared. By default, None
+        (the comparison stops at the first difference).
+
+    Returns
+    -------
+    equal : bool
+    """
     if not isinstance(m2, m1.__class__):
+        if differences is not None:
+            differences.append('model type')
         return False
     m1packages = get_package_list(m1)
     m2packages = get_package_list(m2)
     if m1packages != m2packages:
+        if differences is None:
+            return False
+        differences.append(f'packages {m1packages} != {m2packages}')
         return False
+    equal = True
     if m2.modelgrid != m1.modelgrid:
-        if m1.modelgrid.__repr__() != m2.modelgrid.__repr__():
-            return False
+        grid_eq = m1.modelgrid.__repr__() == m2.modelgrid.__repr__()
         for attr in ['xcellcenters', 'ycellcenters']:
-            if not np.allclose(getattr(m1.modelgrid, attr),
-                               getattr(m2.modelgrid, attr)
-                               ):
+            if grid_eq and not np.allclose(getattr(m1.modelgrid, attr),
+                                           getattr(m2.modelgrid, attr)
+                                           ):
+                grid_eq = False
+        if not grid_eq:
+            if differences is None:
                 return False
+            differences.append('modelgrid')
+            equal = False
     for k, v in m1.__dict__.items():
         if k in [
                  '_packagelist',
@@ -152,15 +525,23 @@ def model_eq(m1, m2):
                  '_ftype_num_dict']:
             continue
         elif k not in m2.__dict__:
-            return False
+            if differences is None:
+                return False
+            differences.append(f'model attribute {k}')
+            equal = False
         elif type(v) == bool:
             if not v == m2.__dict__[k]:
-                return False
+                if differences is None:
+                    return False
+                differences.append(f'model attribute {k}')
+                equal = False
         elif type(v) in [str, int, float, dict, list]:
             if v != m2.__dict__[k]:
                 pass
             continue
     for pk in m1packages:
-        if not package_eq(getattr(m1, pk), getattr(m2, pk)):
-            return False
-    return True
+        if not package_eq(getattr(m1, pk), getattr(m2, pk), differences=differences):
+            if differences is None:
+                return False
+            equal = False
+    return equal
@@ -12,8 +12,13 @@ from five reservoirs in Texas: U.S. Geological Survey Scientific Investigations
 """
 import numpy as np
 
+from mfsetup.tdis import select_xarray_period
 from mfsetup.units import convert_length_units
 
+# period statistics that can be accumulated
+# one block of days at a time
+blockwise_stats = {'mean', 'sum', 'min', 'max'}
+
 
 def solar_declination(julian_day):
     """
@@ -123,6 +128,14 @@ def hamon_evaporation(day_of_year, tmean_c, latitude_dd,
     -------
     E : float
         Open water evaporation, in inches per day
+
+    Notes
+    -----
+    The inputs can also be numpy arrays or xarray DataArrays
+    that broadcast against each other, for example, day_of_year
+    with shape (ntimes, 1, 1), tmean_c with shape (ntimes, nrow, ncol)
+    and latitude_dd with shape (nrow, ncol). Dask-backed DataArrays
+    are computed lazily.
     """
     delta = solar_declination(day_of_year)
     omega = sunset_hour_angle(latitude_dd, delta)
@@ -133,3 +146,122 @@ def hamon_evaporation(day_of_year, tmean_c, latitude_dd,
     E_inches = 0.55 * (D/12)**2 * (svd/100)
     mult = convert_length_units('inches', dest_length_units)
     return E_inches * mult
+
+
+def grid_latitude(x, y, crs=None):
+    """Get the latitude of grid cell centers.
+
+    Parameters
+    ----------
+    x : 1D or 2D array-like
+        Cell center x-coordinates.
+    y : 1D or 2D array-like
+        Cell center y-coordinates. If x and y are 1D
+        (e.g. the coordinates of a NetCDF file), they are
+        expanded to 2D (nrow, ncol) arrays.
+    crs : obj, optional
+        Coordinate reference system of x and y. Any input
+        that :class:`pyproj.CRS` can create an instance from.
+        If None, or a geographic CRS, y is assumed to be
+        latitude in decimal degrees. By default, None.
+
+    Returns
+    -------
+    latitude_dd : 2D ndarray
+        Latitude, decimal degrees
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if x.ndim == 1 and y.ndim == 1:
+        x, y = np.meshgrid(x, y)
+    if crs is None:
+        return y
+    import pyproj
+    crs = pyproj.CRS(crs)
+    if crs.is_geographic:
+        return y
+    transformer = pyproj.Transformer.from_crs(crs, 'epsg:4326', always_xy=True)
+    _, latitude_dd = transformer.transform(x, y)
+    return latitude_dd
+
+
+def hamon_evaporation_by_period(tmean_c, latitude_dd, period_stats,
+                                datetime_coords_name='time',
+                                dest_length_units='inches',
+                                blocksize=366):
+    """Compute open water evaporation with the Hamon method
+    from gridded daily air temperatures, and aggregate it to
+    stress periods in the same pass.
+
+    Evaporation is computed for all cells at once, for up to
+    ``blocksize`` days at a time, so that only one block of the
+    temperature data is in memory at once. The mean, sum, min or max
+    for each period is accumulated block by block; other statistics
+    are computed from the evaporation for the whole period.
+
+    Parameters
+    ----------
+    tmean_c : xarray.DataArray
+        Average daily air temperature, in Celsius,
+        with dimensions of (time, y, x). Can be lazily loaded
+        (for example, with :func:`xarray.open_dataset`) or dask-backed.
+    latitude_dd : float or array-like
+        Latitude, decimal degrees; either a single value,
+        or the latitude of each cell, with shape (y, x)
+        (see :func:`grid_latitude`).
+    period_stats : dict
+        Aggregation input by stress period, as keyword arguments
+        to :func:`mfsetup.tdis.select_xarray_period`
+        (for example, ``TransientSourceDataMixin.period_stats``).
+        Periods with input of None are skipped.
+    datetime_coords_name : str
+        Name of the time coordinate in tmean_c. By default, 'time'.
+    dest_length_units : str
+        Length units of output (e.g. ft., feet, meters, etc.)
+    blocksize : int
+        Number of days to compute at once. By default, 366.
+
+    Yields
+    ------
+    kper : int
+        Stress period
+    E : ndarray
+        Open water evaporation for the period, in dest_length_units per day,
+        with shape (y, x)
+    """
+    latitude_dd = np.asarray(latitude_dd, dtype=float)
+    for kper, period_stat in period_stats.items():
+        if period_stat is None:
+            continue
+        stat, data = select_xarray_period(tmean_c,
+                                          datetime_coords_name=datetime_coords_name,
+                                          **period_stat)
+        ntimes = data.shape[0]
+        if ntimes == 0:
+            raise ValueError(f"No temperature data for stress period {kper}: "
+                             f"{period_stat}")
+        # other statistics need all of the values for the period
+        period_blocksize = blocksize if stat in blockwise_stats else ntimes
+        aggregated = None
+        for start in range(0, ntimes, period_blocksize):
+            block = data[start:start + period_blocksize]
+            day_of_year = block[datetime_coords_name].dt.dayofyear.values
+            day_of_year = day_of_year.reshape((-1,) + (1,) * (block.ndim - 1))
+            evaporation = hamon_evaporation(day_of_year,
+                                            np.asarray(block.values, dtype=float),
+                                            latitude_dd,
+                                            dest_length_units=dest_length_units)
+            if stat not in blockwise_stats:
+                aggregated = getattr(evaporation, stat)(axis=0)
+            elif aggregated is None:
+                aggregated = getattr(evaporation,
+                                     'sum' if stat == 'mean' else stat)(axis=0)
+            elif stat in {'mean', 'sum'}:
+                aggregated += evaporation.sum(axis=0)
+            elif stat == 'min':
+                aggregated = np.minimum(aggregated, evaporation.min(axis=0))
+            else:
+                aggregated = np.maximum(aggregated, evaporation.max(axis=0))
+        if stat == 'mean':
+            aggregated /= ntimes
+        yield kper, aggregated
@@ -1,12 +1,17 @@
 """Functions for reading and writing stuff to disk, and working with file paths.
 """
 import datetime as dt
+import hashlib
 import inspect
 import json
 import os
+import pickle
+import re
 import shutil
 import sys
 import time
+import warnings
+from collections import OrderedDict
 from pathlib import Path
 
 import flopy
@@ -29,7 +34,7 @@ from flopy.utils import TemporalReference, mfreadnam
 
 import mfsetup
 from mfsetup.grid import MFsetupGrid
-from mfsetup.utils import get_input_arguments, update
+from mfsetup.utils import get_input_arguments, get_packages, update
 
 
 def check_source_files(fileslist):
@@ -43,15 +48,291 @@ def check_source_files(fileslist):
             raise IOError(f'Cannot find {f.absolute()}')
 
 
-def load(filename):
-    """Load a configuration file."""
+def load(filename, cache=False):
+    """Load a configuration file.
+
+    Parameters
+    ----------
+    filename : str or pathlike
+        YAML or JSON file.
+    cache : bool
+        Option to keep the parsed contents in memory,
+        so that subsequent loads of the same file (with the same contents)
+        don't have to parse it again. A copy of the contents is returned
+        in either case. By default, False.
+    """
     filename = Path(filename)
+    if cache:
+        key = _get_cache_key(filename)
+        data = _load_cached(key)
+        if data is None:
+            data = load(filename)
+            _cache(key, data)
+        return data
     if set(filename.suffixes).intersection({'.yml', '.yaml'}):
         return load_yml(filename)
     elif filename.suffix == '.json':
         return load_json(filename)
 
 
+# parsed (and resolved) configuration data, pickled, by cache key
+# (with the most recently used entries last)
+_config_cache = OrderedDict()
+
+# maximum number of configurations to keep in memory
+config_cache_size = 64
+
+
+def _get_cache_key(*files, **kwargs):
+    """Get a key for caching configuration data
+    derived from one or more files. The key is a hash of the
+    file locations and contents, any keyword arguments
+    that affect the result, and the modflow-setup version.
+    """
+    key = hashlib.sha256(mfsetup.__version__.encode())
+    for f in files:
+        f = Path(f)
+        key.update(str(f.resolve()).encode())
+        key.update(f.read_bytes())
+    key.update(repr(sorted(kwargs.items())).encode())
+    return key.hexdigest()
+
+
+def _load_cached(key, cache_dir=None):
+    """Get a fresh copy of cached configuration data,
+    first from memory, then from cache_dir (if specified).
+    Returns None if the data aren't cached.
+    """
+    data = _config_cache.get(key)
+    if data is not None:
+        _config_cache.move_to_end(key)
+    elif cache_dir is not None:
+        cache_file = Path(cache_dir, f'{key}.pkl')
+        if cache_file.exists():
+            data = cache_file.read_bytes()
+            _cache_in_memory(key, data)
+    if data is not None:
+        return pickle.loads(data)
+
+
+def _cache_in_memory(key, data):
+    """Add pickled configuration data to the in-memory cache,
+    dropping the least recently used entries if there are
+    more than config_cache_size."""
+    _config_cache[key] = data
+    _config_cache.move_to_end(key)
+    while len(_config_cache) > config_cache_size:
+        _config_cache.popitem(last=False)
+
+
+def _cache(key, data, cache_dir=None):
+    """Cache configuration data in memory,
+    and in cache_dir (if specified)."""
+    data = pickle.dumps(data)
+    _cache_in_memory(key, data)
+    if cache_dir is not None:
+        Path(cache_dir).mkdir(parents=True, exist_ok=True)
+        # write to a temporary file first,
+        # so that concurrent processes don't read a partial file
+        cache_file = Path(cache_dir, f'{key}.pkl')
+        tmp_file = cache_file.with_suffix(f'.{os.getpid()}.tmp')
+        tmp_file.write_bytes(data)
+        os.replace(tmp_file, cache_file)
+
+
+def clear_config_cache(cache_dir=None):
+    """Clear cached configuration data from memory,
+    and from cache_dir (if specified)."""
+    _config_cache.clear()
+    if cache_dir is not None:
+        for cache_file in Path(cache_dir).glob('*.pkl'):
+            cache_file.unlink()
+
+
+# file extensions for model output (including flopy check output,
+# which is written on loading), which don't affect a loaded model
+model_output_extensions = {'.bud', '.cbb', '.cbc', '.chk', '.ddn', '.grb', '.hds',
+                           '.hed', '.list', '.lst', '.ucn'}
+
+
+# references to other input files within MODFLOW input files
+# (external arrays and lists, and MODFLOW 6 time series, observation files, etc.)
+_file_reference = re.compile(r'''(?:OPEN/CLOSE|FILEIN)\s+('[^']+'|"[^"]+"|\S+)''',
+                             re.IGNORECASE)
+
+
+# MODFLOW 6 model types, as listed in the simulation namefile
+model_namefile_types = {'GWF6', 'GWT6', 'GWE6', 'PRT6'}
+
+
+def _resolve_input_path(model_ws, filename):
+    filename = filename.strip('\'"').replace('\\', '/')
+    return Path(os.path.normpath(Path(model_ws, filename).absolute()))
+
+
+def _read_namefile_entries(namefile):
+    """Get the (package, simulation-level or model) files listed in a
+    MODFLOW-2005 style or MODFLOW 6 namefile, as a list of
+    (file type, filename) tuples. Output files (the listing file,
+    and files opened with REPLACE or NEW status) are not included."""
+    with open(namefile, errors='replace') as src:
+        lines = [line.split() for line in src
+                 if line.strip() and not line.strip().startswith(('#', '!', '//'))]
+    entries = []
+    if any(line[0].upper() == 'BEGIN' for line in lines):
+        # MODFLOW 6: (file type, filename, ...) within the blocks
+        # (other than options, which only has output files)
+        block = None
+        for line in lines:
+            keyword = line[0].upper()
+            if keyword == 'BEGIN':
+                block = line[1].upper() if len(line) > 1 else None
+            elif keyword == 'END':
+                block = None
+            elif block not in {None, 'OPTIONS'} and len(line) > 1:
+                entries.append((keyword, line[1]))
+    else:
+        # MODFLOW-2005: file type, unit, filename, (status)
+        for line in lines:
+            if len(line) < 3 or line[0].upper() == 'LIST':
+                continue
+            if len(line) > 3 and line[3].upper() in {'REPLACE', 'NEW'}:
+                continue
+            entries.append((line[0].upper(), line[2]))
+    return entries
+
+
+def get_model_input_files(model_ws, namefile):
+    """Get the input files for a MODFLOW model: the files listed in the
+    namefile (for MODFLOW 6, the simulation namefile mfsim.nam, and the
+    model namefiles listed in it), and any files that those files reference
+    with OPEN/CLOSE or FILEIN (which may be outside of model_ws).
+    Model output files are not included.
+
+    Parameters
+    ----------
+    model_ws : str or pathlike
+        Model (or MODFLOW 6 simulation) workspace,
+        that relative paths in the model input are relative to.
+    namefile : str or pathlike
+        Model namefile (or for MODFLOW 6, the simulation namefile),
+        relative to model_ws.
+
+    Returns
+    -------
+    input_files : list of pathlib.Path
+        Absolute paths to the input files (including any
+        that are referenced, but don't exist), sorted by name.
+    """
+    input_files = set()
+    # files to read for references to other files,
+    # and whether they are namefiles
+    to_read = [(_resolve_input_path(model_ws, namefile), True)]
+    while to_read:
+        path, is_namefile = to_read.pop(0)
+        if path in input_files:
+            continue
+        input_files.add(path)
+        if not path.is_file():
+            continue
+        if is_namefile:
+            for ftype, filename in _read_namefile_entries(path):
+                entry = _resolve_input_path(model_ws, filename)
+                if entry.suffix.lower() not in model_output_extensions:
+                    # MODFLOW 6 model namefiles are listed in mfsim.nam
+                    to_read.append((entry, ftype in model_namefile_types))
+            continue
+        with open(path, errors='replace') as src:
+            text = src.read()
+        for match in _file_reference.finditer(text):
+            reference = _resolve_input_path(model_ws, match.group(1))
+            if reference.suffix.lower() in model_output_extensions:
+                continue
+            if match.group(0).upper().startswith('FILEIN'):
+                # files read by packages may reference other files
+                to_read.append((reference, False))
+            else:
+                input_files.add(reference)
+    return sorted(input_files)
+
+
+def get_model_snapshot_key(model_ws, namefile, load_kwargs=None):
+    """Get a key for a snapshot of a model loaded from model_ws. The
+    key is a hash of the location and contents of each model input file
+    (see :func:`get_model_input_files`), the keyword arguments to the model
+    load function (load_kwargs), and the modflow-setup and flopy versions.
+
+    Parameters
+    ----------
+    model_ws : str or pathlike
+        Model (or MODFLOW 6 simulation) workspace.
+    namefile : str or pathlike
+        Model namefile (or for MODFLOW 6, the simulation namefile),
+        relative to model_ws.
+    load_kwargs : dict, optional
+        Keyword arguments to the model load function.
+
+    Returns
+    -------
+    key : str
+    """
+    key = hashlib.sha256(f'{mfsetup.__version__} {flopy.__version__}'.encode())
+    model_ws = Path(model_ws).absolute()
+    for path in get_model_input_files(model_ws, namefile):
+        key.update(f'{os.path.relpath(path, model_ws)} '.encode())
+        if not path.is_file():
+            key.update(b'(missing)')
+            continue
+        with open(path, 'rb') as src:
+            for chunk in iter(lambda: src.read(2**20), b''):
+                key.update(chunk)
+    if load_kwargs is not None:
+        # lists of packages to load may be in any order
+        load_kwargs = {k: sorted(v, key=str) if isinstance(v, (list, set, tuple)) else v
+                       for k, v in load_kwargs.items()}
+        key.update(repr(sorted(load_kwargs.items())).encode())
+    return key.hexdigest()
+
+
+def load_model_snapshot(snapshot_file, key):
+    """Load a model from a snapshot file written by
+    :func:`save_model_snapshot`. Returns None if the snapshot doesn't exist,
+    was made with a different key (i.e. the model files have changed),
+    or can't be read.
+    """
+    snapshot_file = Path(snapshot_file)
+    if not snapshot_file.exists():
+        return
+    try:
+        with open(snapshot_file, 'rb') as src:
+            if pickle.load(src) != key:
+                return
+            return pickle.load(src)
+    except Exception as e:
+        warnings.warn(f'Could not read model snapshot {snapshot_file}:\n{e}')
+
+
+def save_model_snapshot(snapshot_file, key, model):
+    """Save a loaded model to a snapshot file (a pickle of
+    the key, followed by a pickle of the model), so that later loads of the
+    same model files can skip parsing the model input. Models that can't be
+    pickled are skipped with a warning.
+    """
+    snapshot_file = Path(snapshot_file)
+    snapshot_file.parent.mkdir(parents=True, exist_ok=True)
+    # write to a temporary file first,
+    # so that concurrent processes don't read a partial file
+    tmp_file = snapshot_file.with_suffix(f'.{os.getpid()}.tmp')
+    try:
+        with open(tmp_file, 'wb') as dest:
+            pickle.dump(key, dest)
+            pickle.dump(model, dest, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, snapshot_file)
+    except Exception as e:
+        tmp_file.unlink(missing_ok=True)
+        warnings.warn(f'Could not write model snapshot {snapshot_file}:\n{e}')
+
+
 def dump(filename, data):
     """Write a dictionary to a configuration file."""
     if str(filename).endswith('.yml') or str(filename).endswith('.yaml'):
@@ -155,6 +436,151 @@ def save_array(filename, arr, nodata=-9999,
     print("took {:.2f}s".format(time.time() - t0))
 
 
+def write_list_file(filename, data, float_format='%g', binary=False,
+                    n_index_columns=3):
+    """Write tabular (list-type) MODFLOW input, such as stress period data,
+    to a space-delimited text file with a header of column names,
+    or to MODFLOW 6 binary list input.
+    All text records are formatted with one format string built from
+    the column dtypes, which is much faster than
+    :meth:`pandas.DataFrame.to_csv` for large tables
+    (but produces the same output). Any existing file is replaced
+    (not overwritten in place), so that hard links to it
+    (see :func:`link_or_copy`) keep the previous version.
+
+    Parameters
+    ----------
+    filename : str or pathlike
+    data : DataFrame or numpy structured array
+        Columns are written in order; integer columns as integers,
+        float columns with float_format, and anything else as strings
+        (quoted if they contain spaces or quotes, as with
+        :data:`csv.QUOTE_MINIMAL`). Missing values are written as blanks.
+    float_format : str
+        Format for float columns. By default, '%g'.
+    binary : bool
+        Option to write MODFLOW 6 binary list input (for use with the
+        ``(BINARY)`` keyword), with the index (cellid) columns
+        as 32-bit integers and all other columns as 64-bit floats
+        (regardless of their dtype), as MODFLOW 6 expects. Binary files
+        have no header, and can't include text columns such as boundnames.
+        By default, False.
+    n_index_columns : int
+        Number of leading index columns in ``data`` (for binary output);
+        by default 3, for the one-based (layer, row, column) cellid
+        of a structured grid.
+    """
+    if isinstance(data, pd.DataFrame):
+        names = data.columns.tolist()
+        columns = [data[name].values for name in names]
+    else:
+        names = list(data.dtype.names)
+        columns = [data[name] for name in names]
+    tmpfile = '{}.tmp'.format(filename)
+    if binary:
+        dtype = []
+        for n, (name, column) in enumerate(zip(names, columns)):
+            if n < n_index_columns:
+                if not np.issubdtype(column.dtype, np.integer):
+                    raise ValueError("Index column {} can't be written to "
+                                     "MODFLOW 6 binary list input; cellids "
+                                     "must be integers.".format(name))
+                dtype.append((name, np.int32))
+            elif np.issubdtype(column.dtype, np.number):
+                # MODFLOW 6 reads all values after the cellid as doubles,
+                # including integer-valued ones (e.g. cond: 1000 in the config)
+                dtype.append((name, np.float64))
+            else:
+                raise ValueError("Column {} can't be written to MODFLOW 6 binary "
+                                 "list input; only numeric columns are "
+                                 "supported (no boundnames).".format(name))
+        records = np.empty(len(data), dtype=dtype)
+        for name, column in zip(names, columns):
+            records[name] = column
+        records.tofile(tmpfile)
+    else:
+        formats = []
+        values = []
+        for column in columns:
+            if np.issubdtype(column.dtype, np.integer):
+                formats.append('%d')
+            elif np.issubdtype(column.dtype, np.floating):
+                isnan = np.isnan(column)
+                if not isnan.any():
+                    formats.append(float_format)
+                else:
+                    # write missing values as blanks, like to_csv
+                    formats.append('%s')
+                    column = np.array([float_format % v for v in column],
+                                      dtype=object)
+                    column[isnan] = ''
+            else:
+                formats.append('%s')
+                column = pd.Series(column, dtype=object)
+                # write missing values as blanks, like to_csv
+                missing = column.isna()
+                column = _quote_minimal(column.astype(str))
+                column[missing] = ''
+            values.append(column.tolist())
+        row_format = ' '.join(formats) + '\n'
+        with open(tmpfile, 'w', buffering=2**20) as dest:
+            dest.write(' '.join(_quote_minimal(pd.Series(names, dtype=str))) + '\n')
+            dest.write(''.join(row_format % row for row in zip(*values)))
+    os.replace(tmpfile, filename)
+
+
+def _quote_minimal(column):
+    """Quote strings in a Series that contain spaces, quotes or line breaks,
+    with any quotes doubled, like :data:`csv.QUOTE_MINIMAL`
+    (for a space-delimited file)."""
+    needs_quotes = column.str.contains('[ "\r\n]', regex=True, na=False)
+    if needs_quotes.any():
+        column = column.copy()
+        quoted = column[needs_quotes].str.replace('"', '""', regex=False)
+        column[needs_quotes] = '"' + quoted + '"'
+    return column
+
+
+def link_or_copy(src, dst, link=True):
+    """Hard link src to dst (a file path or folder), so that the
+    file contents don't have to be copied. Falls back to a copy
+    if a hard link isn't possible (for example, across file systems).
+    Any existing file at dst is replaced, and any missing folders
+    for dst are made.
+
+    Parameters
+    ----------
+    src : str or pathlike
+        File to link or copy.
+    dst : str or pathlike
+        Destination file path, or folder to link or copy src into.
+    link : bool
+        Option to hard link src to dst. If False, src is always copied.
+        By default, True.
+
+    Returns
+    -------
+    dst : pathlib.Path
+        Path of the linked or copied file.
+    """
+    dst = Path(dst)
+    if dst.is_dir():
+        dst = dst / Path(src).name
+    if dst.exists():
+        if link and os.path.samefile(src, dst):
+            return dst
+        dst.unlink()
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    if link:
+        try:
+            os.link(src, dst)
+            return dst
+        except OSError:
+            pass
+    shutil.copy2(src, dst)
+    return dst
+
+
 def append_csv(filename, df, **kwargs):
     """Read data from filename,
     append to dataframe, and write appended dataframe
@@ -165,7 +591,8 @@ def append_csv(filename, df, **kwargs):
     df.to_csv(filename, **kwargs)
 
 
-def load_cfg(cfgfile, verbose=False, default_file=None):
+def load_cfg(cfgfile, verbose=False, default_file=None, cache=True,
+             cache_dir=None):
     """This method loads a YAML or JSON configuration file,
     applies configuration defaults from a default_file if specified,
     adds the absolute file path of the configuration file
@@ -178,6 +605,28 @@ def load_cfg(cfgfile, verbose=False, default_file=None):
     ----------
     cfgfile : str
         Path to MFsetup configuration file (json or yaml)
+    verbose : bool
+        Verbose model option (cfg['model']['verbose']).
+    default_file : str
+        Name of the configuration defaults file in the mfsetup package
+        (e.g. 'mf6_defaults.yml').
+    cache : bool
+        Option to cache the resolved configuration, so that subsequent
+        loads of the same configuration file (with the same contents and
+        defaults) are fast. The cache is invalidated by any change to
+        the configuration file, the defaults file or the modflow-setup version.
+        By default, True.
+    cache_dir : str or pathlike, optional
+        Folder for caching the resolved configuration on disk, so that it
+        can be reused by other processes (for example, in batch or
+        ensemble runs). If None, the ``MFSETUP_CONFIG_CACHE`` environment
+        variable is used, if it is set. Otherwise, the resolved
+        configuration is only cached in memory.
+
+        .. warning::
+            Cached configurations are stored as pickles, which can run
+            arbitrary code when they are loaded. Only use a cache folder
+            that is not writable by anyone you don't trust.
 
     Returns
     -------
@@ -196,10 +645,19 @@ def load_cfg(cfgfile, verbose=False, default_file=None):
     default_file = Path(default_file)
     check_source_files([cfgfile, source_path / default_file])
 
+    if cache:
+        if cache_dir is None:
+            cache_dir = os.environ.get('MFSETUP_CONFIG_CACHE')
+        key = _get_cache_key(cfgfile, source_path / default_file,
+                             verbose=verbose)
+        cfg = _load_cached(key, cache_dir)
+        if cfg is not None:
+            return cfg
+
     # default configuration
     default_cfg = {}
     if default_file is not None:
-        default_cfg = load(source_path / default_file)
+        default_cfg = load(source_path / default_file, cache=cache)
         default_cfg['filename'] = source_path / default_file
 
         # for now, only apply defaults for the model and simulation blocks
@@ -223,6 +681,8 @@ def load_cfg(cfgfile, verbose=False, default_file=None):
     # to absolute paths, based on the location of the config file
     config_file_location = os.path.split(os.path.abspath(cfgfile))[0]
     cfg = set_cfg_paths_to_absolute(cfg, config_file_location)
+    if cache:
+        _cache(key, cfg, cache_dir)
     return cfg
 
 
@@ -477,7 +937,7 @@ def setup_external_filepaths(model, package, variable_name,
                              'finf', 'pet', 'extdp', 'extwc',
                              }
     transient3D_variables = {'lakarr', 'bdlknc'}
-    tabular_variables = {'connectiondata'}
+    tabular_variables = {'connectiondata', 'exchangedata'}
     transient_tabular_variables = {'stress_period_data'}
     transient_variables = transient2D_variables | transient3D_variables | transient_tabular_variables
 
@@ -791,6 +1251,95 @@ def flopy_mf2005_load(m, load_only=None, forgive=False, check=False):
     return m
 
 
+def flopy_mf2005_load_package(m, package):
+    """Load a single package into an existing flopy.modflow.Modflow
+    instance, from the file listed in the model name file.
+
+    Parameters
+    ----------
+    m : flopy.modflow.Modflow instance
+    package : str
+        Package file type, e.g. 'upw' or 'WEL'.
+
+    Returns
+    -------
+    package : flopy.pakbase.Package instance
+        Loaded package, or None if the package isn't in the name file.
+    """
+    namefile_path = os.path.join(m.model_ws, m.namefile)
+    ext_unit_dict = mfreadnam.parsenamefile(
+        namefile_path, m.mfnam_packages, verbose=m.verbose)
+    try:
+        for key, item in ext_unit_dict.items():
+            if item.filetype == package.upper() and item.package is not None:
+                package_load_args = \
+                    list(inspect.getfullargspec(item.package.load))[0]
+                kwargs = {'check': False} if 'check' in package_load_args else {}
+                return item.package.load(item.filename, m,
+                                         ext_unit_dict=ext_unit_dict, **kwargs)
+    finally:
+        for item in ext_unit_dict.values():
+            if item.filehandle is not None:
+                item.filehandle.close()
+
+
+class LazyModflow(flopy.modflow.Modflow):
+    """flopy.modflow.Modflow model that defers loading its packages
+    (other than the discretization) until they are first accessed,
+    for example as attributes (``m.upw``) or with ``m.get_package('upw')``.
+    Packages that are never used aren't read.
+
+    Deferred packages are included in :meth:`get_package_list`.
+    """
+    def __getattr__(self, item):
+        self._load_deferred_package(item)
+        return super().__getattr__(item)
+
+    def _load_deferred_package(self, name):
+        # use __dict__ to avoid recursion (e.g. in unpickling)
+        deferred = self.__dict__.get('deferred_packages')
+        if deferred and name.upper() in deferred:
+            deferred.remove(name.upper())
+            print(f'loading deferred {name.upper()} package for {self.name}...')
+            flopy_mf2005_load_package(self, name)
+
+    def get_package(self, name):
+        self._load_deferred_package(name)
+        return super().get_package(name)
+
+    def get_package_list(self, ftype=None):
+        package_list = super().get_package_list(ftype=ftype)
+        if ftype is None:
+            package_list += sorted(self.__dict__.get('deferred_packages', []))
+        return package_list
+
+    def load_deferred_packages(self):
+        """Load any packages that haven't been loaded yet."""
+        for name in sorted(self.__dict__.get('deferred_packages', [])):
+            self._load_deferred_package(name)
+
+    @classmethod
+    def load(cls, f, load_only=None, **kwargs):
+        """Load the model discretization (DIS) package,
+        and defer loading of the other packages.
+
+        Parameters
+        ----------
+        f : str
+            Name file.
+        load_only : list of str, optional
+            Packages to (eventually) load. By default, all packages in the name file.
+        **kwargs : keyword arguments to flopy.modflow.Modflow.load
+        """
+        model_ws = kwargs.get('model_ws', '.')
+        packages = {p.upper() for p in get_packages(os.path.join(model_ws, f))}
+        if load_only is not None:
+            packages &= {p.upper() for p in load_only}
+        m = super().load(f, load_only=[], **kwargs)
+        m.deferred_packages = packages - set(m.get_package_list())
+        return m
+
+
 def flopy_mfsimulation_load(sim, model, strict=True, load_only=None,
              verify_data=False):
     """Execute the code in flopy.mf6.MFSimulation.load on
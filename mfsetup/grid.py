@@ -9,7 +9,6 @@ import warnings
 from pathlib import Path
 
 import geopandas as gpd
-import gisutils
 import numpy as np
 import pandas as pd
 import pyproj
@@ -17,14 +16,10 @@ import shapely
 from flopy.discretization import StructuredGrid
 from flopy.mf6.utils.binarygrid_util import MfGrdFile
 from geopandas.geodataframe import GeoDataFrame
-from gisutils import df2shp, get_proj_str, project, shp2df
 from packaging import version
-from rasterio import Affine
 from scipy import spatial
 from shapely.geometry import MultiPolygon, Point, Polygon, box
 
-from mfsetup import fileio as fileio
-
 from .mf5to6 import get_model_length_units
 from .units import convert_length_units
 from .utils import get_input_arguments
@@ -386,6 +381,7 @@ class MFsetupGrid(StructuredGrid):
                            'j': j.ravel(),
                            'geometry': self.polygons
                            })
+        from gisutils import df2shp
         df2shp(df, filename, epsg=self.epsg, proj_str=self.proj_str)
 
     def _set_polygons(self):
@@ -499,6 +495,91 @@ def get_ij(grid, x, y, local=False):
     return i, j
 
 
+def intersect_points(grid, x, y, local=False, forgive=False):
+    """Return the row and column of the cells containing a sequence
+    of points in real-world coordinates. Same as
+    :meth:`flopy.discretization.StructuredGrid.intersect`,
+    but for all points at once.
+
+    Parameters
+    ----------
+    grid : flopy.discretization.StructuredGrid instance
+    x : sequence of x coordinates
+    y : sequence of y coordinates
+    local: bool (optional)
+        If True, x and y are in local coordinates (defaults to False)
+    forgive: bool (optional)
+        If True, points outside of the grid are returned as NaNs;
+        otherwise a ValueError is raised (defaults to False)
+
+    Returns
+    -------
+    i : array of rows (zero-based)
+    j : array of columns (zero-based)
+        Integer arrays, or float arrays if forgive=True
+        and any points are outside of the grid.
+    """
+    x = np.atleast_1d(np.asarray(x, dtype=float))
+    y = np.atleast_1d(np.asarray(y, dtype=float))
+    if not local:
+        x, y = grid.get_local_coords(x, y)
+    xe, ye = grid.xyedges
+    # column edges increase; row edges decrease
+    j = np.searchsorted(xe, x, side='left') - 1
+    i = len(ye) - np.searchsorted(ye[::-1], y, side='right') - 1
+    outside = (j < 0) | (j >= grid.ncol) | (i < 0) | (i >= grid.nrow)
+    if np.any(outside):
+        if not forgive:
+            raise ValueError(f"{outside.sum()} x, y point(s) are outside of the model area")
+        i = np.where(outside, np.nan, i)
+        j = np.where(outside, np.nan, j)
+    return i, j
+
+
+def points_within(x, y, features):
+    """Return a boolean mask of the points that are within
+    one or more polygon features, for large numbers of points.
+
+    Points are first culled to the bounding box of the features
+    with numpy comparisons; the remaining candidates are then tested
+    with :func:`shapely.contains_xy` (single polygons) or an
+    :class:`shapely.STRtree` query (multiple polygons).
+    Same as ``[Point(x, y).within(features) ...]``; points on
+    feature boundaries are not within the features.
+
+    Parameters
+    ----------
+    x : sequence of x coordinates
+    y : sequence of y coordinates
+    features : shapely Polygon or MultiPolygon, or sequence of Polygons
+
+    Returns
+    -------
+    within : 1D boolean array
+    """
+    x = np.atleast_1d(np.asarray(x, dtype=float))
+    y = np.atleast_1d(np.asarray(y, dtype=float))
+    within = np.zeros(len(x), dtype=bool)
+    parts = shapely.get_parts(np.atleast_1d(np.asarray(features, dtype=object)))
+    if len(parts) == 0 or len(x) == 0:
+        return within
+    xmin, ymin, xmax, ymax = shapely.total_bounds(parts)
+    candidates = np.flatnonzero((x > xmin) & (x < xmax) &
+                                (y > ymin) & (y < ymax))
+    if len(candidates) == 0:
+        return within
+    if len(parts) == 1:
+        polygon = parts[0]
+        shapely.prepare(polygon)
+        within[candidates] = shapely.contains_xy(polygon, x[candidates], y[candidates])
+    else:
+        tree = shapely.STRtree(parts)
+        points = shapely.points(x[candidates], y[candidates])
+        point_idx, _ = tree.query(points, predicate='within')
+        within[candidates[point_idx]] = True
+    return within
+
+
 def get_kij_from_node3d(node3d, nrow, ncol):
     """For a consecutive cell number in row-major order
     (row, column, layer), get the zero-based row, column position.
@@ -596,6 +677,7 @@ def get_nearest_point_on_grid(x, y, transform=None,
     # get the closet (fractional) grid cell location
     # (in case the grid is rotated)
     if transform is None:
+        from rasterio import Affine
         transform = Affine(dx, 0., xul,
                            0., dy, yul) * \
                     Affine.rotation(rotation)
@@ -687,6 +769,7 @@ def rasterize(feature, grid, id_column=None,
         return
 
     if crs is not None:
+        import gisutils
         if version.parse(gisutils.__version__) < version.parse('0.2.0'):
             raise ValueError("The rasterize function requires gisutils >= 0.2")
         from gisutils import get_authority_crs
@@ -704,6 +787,7 @@ def rasterize(feature, grid, id_column=None,
         if isinstance(feature[0], str) or isinstance(feature[0], Path):
             # use shp2df to read multiple shapefiles
             # then convert to gdf
+            from gisutils import shp2df
             df = shp2df(feature, dest_crs=grid.crs)
             df = gpd.GeoDataFrame(df, crs=grid.crs)
         else:
@@ -865,7 +949,7 @@ def setup_structured_grid(xoff=None, yoff=None, xul=None, yul=None,
                           crs=None, epsg=None, prj=None, wkt=None,
                           model_length_units=None,
                           grid_file='grid.json',
-                          bbox_shapefile=None, **kwargs):
+                          bbox_shapefile=None, coarsen_factor=1, **kwargs):
     """_summary_
 
     Parameters
@@ -931,6 +1015,13 @@ def setup_structured_grid(xoff=None, yoff=None, xul=None, yul=None,
         _description_, by default 'grid.json'
     bbox_shapefile : _type_, optional
         _description_, by default None
+    coarsen_factor : int, optional
+        Option to make a coarser version of the specified grid,
+        with row and column spacings multiplied by ``coarsen_factor``
+        (and the numbers of rows and columns reduced accordingly).
+        Intended for quick preview builds of a model; snapping
+        to a parent model grid or the National Hydrogeologic Grid
+        is skipped for coarsened grids. By default 1 (no coarsening).
 
     Returns
     -------
@@ -992,6 +1083,22 @@ def setup_structured_grid(xoff=None, yoff=None, xul=None, yul=None,
                 delc_grid = delc_grid[0]
             else:
                 regular = False
+
+    # option to coarsen the grid (for a quick preview of the model)
+    if coarsen_factor is not None and coarsen_factor > 1:
+        coarsen_factor = int(coarsen_factor)
+        print(f'coarsening the grid spacing by a factor of {coarsen_factor}...')
+        delr_grid = coarsen_spacing(delr_grid, coarsen_factor)
+        delc_grid = coarsen_spacing(delc_grid, coarsen_factor)
+        if nrow is not None:
+            nrow = int(np.ceil(nrow / coarsen_factor))
+        if ncol is not None:
+            ncol = int(np.ceil(ncol / coarsen_factor))
+        # coarsened spacings generally won't align
+        # with the parent model grid or the NHG
+        snap_to_parent = False
+        snap_to_NHG = False
+
     if parent_model is not None and snap_to_parent:
         to_grid_units_parent = convert_length_units(get_model_length_units(parent_model), grid_units)
         # parent model grid spacing in meters
@@ -1224,6 +1331,7 @@ def setup_structured_grid(xoff=None, yoff=None, xul=None, yul=None,
             grid_cfg['wkt'] = grid_cfg['crs'].to_wkt()
         del grid_cfg['crs']
 
+    from mfsetup import fileio
     fileio.dump(grid_file, grid_cfg)
     if bbox_shapefile is not None:
         write_bbox_shapefile(modelgrid, bbox_shapefile)
@@ -1231,6 +1339,30 @@ def setup_structured_grid(xoff=None, yoff=None, xul=None, yul=None,
     return modelgrid
 
 
+def coarsen_spacing(spacing, coarsen_factor):
+    """Coarsen row or column spacing(s) by an integer factor.
+
+    Parameters
+    ----------
+    spacing : scalar or sequence
+        Uniform spacing, or spacing for each row or column.
+    coarsen_factor : int
+        Number of cells to combine into each coarsened cell.
+
+    Returns
+    -------
+    coarsened : scalar or ndarray
+        Uniform spacing multiplied by coarsen_factor, or
+        the sums of each consecutive group of coarsen_factor spacings
+        (the last group may have fewer cells).
+    """
+    if np.isscalar(spacing):
+        return np.round(spacing * coarsen_factor, 4)
+    spacing = np.array(spacing, dtype=float)
+    starts = np.arange(0, len(spacing), coarsen_factor)
+    return np.round(np.add.reduceat(spacing, starts), 4)
+
+
 def get_cellface_midpoint(grid, k, i, j, direction):
     """Return the midpoint of vertical cell face within a structured grid.
     For example, the midpoint for the right cell face is halfway between
@@ -1347,6 +1479,7 @@ def get_transform(modelgrid):
     x0 = modelgrid.xyedges[0][0]
     y0 = modelgrid.xyedges[1][0]
     xul, yul = modelgrid.get_coords(x0, y0)
+    from rasterio import Affine
     return Affine(modelgrid.delr[0], 0., xul,
                     0., -modelgrid.delc[0], yul) * \
             Affine.rotation(-modelgrid.angrot)
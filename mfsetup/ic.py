@@ -5,11 +5,13 @@ import shutil
 
 from mfsetup.fileio import save_array, setup_external_filepaths
 from mfsetup.mf5to6 import get_variable_name, get_variable_package_name
+from mfsetup.profiling import span
 from mfsetup.sourcedata import (
     ArraySourceData,
     MFArrayData,
     MFBinaryArraySourceData,
     get_source_data_file_ext,
+    to_float64,
 )
 from mfsetup.utils import get_input_arguments
 
@@ -111,7 +113,8 @@ def setup_strt(model, package, strt=None, source_data_config=None,
                           f'{var} values: {strt}\n'
                           f'source_data config:\n{source_data_config}'))
     else:
-        data = sd.get_data()
+        with span(f'{type(sd).__name__}.get_data', variable=var):
+            data = to_float64(sd.get_data())
 
     filepaths = model.setup_external_filepaths(package, var, filename_fmt,
                                                file_numbers=list(data.keys()))
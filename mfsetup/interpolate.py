@@ -6,6 +6,13 @@ import numpy as np
 from scipy.interpolate import griddata
 from scipy.spatial import qhull as qhull
 
+from mfsetup.profiling import check_memory_budget, within_memory_budget
+
+# approximate memory needed to triangulate source points
+# (qhull Delaunay triangulation and barycentric transforms)
+# in bytes per point, by number of dimensions
+delaunay_bytes_per_point = {2: 700, 3: 2500}
+
 
 def get_source_dest_model_xys(source_model, dest_model,
                               source_mask=None):
@@ -40,7 +47,7 @@ def get_source_dest_model_xys(source_model, dest_model,
     return source_model_xy, dest_model_xy
 
 
-def interp_weights(xyz, uvw, d=2, mask=None):
+def interp_weights(xyz, uvw, d=2, mask=None, dtype=None):
     """Speed up interpolation vs scipy.interpolate.griddata (method='linear'),
     by only computing the weights once:
     https://stackoverflow.com/questions/20915502/speedup-scipy-griddata-for-multiple-interpolations-between-two-irregular-grids
@@ -55,6 +62,11 @@ def interp_weights(xyz, uvw, d=2, mask=None):
         (shape n destination points x ndims)
     d : int
         Number of dimensions (2 for 2D, 3 for 3D, etc.)
+    dtype : numpy dtype, optional
+        Floating point precision of the returned weights
+        (e.g. ``np.float32`` to reduce memory use). The triangulation
+        and barycentric coordinates are always computed in double precision.
+        By default, None (weights are returned as float64).
 
     Returns
     -------
@@ -73,6 +85,8 @@ def interp_weights(xyz, uvw, d=2, mask=None):
     xyz = np.array(xyz)
     if xyz.shape[-1] != d:
         xyz = xyz.T
+    check_memory_budget(len(xyz) * delaunay_bytes_per_point.get(d, 2500),
+                        f'{d}D triangulation of {len(xyz):,d} source points')
     t0 = time.time()
     tri = qhull.Delaunay(xyz)
     simplex = tri.find_simplex(uvw)
@@ -85,11 +99,13 @@ def interp_weights(xyz, uvw, d=2, mask=None):
     # so that the weights for each simplex sum to 1
     # sums not exactly == 1 seem to cause spurious values
     weights = np.round(weights, 6)
+    if dtype is not None:
+        weights = weights.astype(dtype, copy=False)
     print("finished in {:.2f}s\n".format(time.time() - t0))
     return vertices, weights
 
 
-def interpolate(values, vtx, wts, fill_value='mean'):
+def interpolate(values, vtx, wts, fill_value='mean', dtype=None):
     """Apply the interpolation weights to a set of values.
 
     Parameters
@@ -101,10 +117,18 @@ def interpolate(values, vtx, wts, fill_value='mean'):
         Value used to fill in for requested points outside of the convex hull
         of the input points (i.e., those with at least one negative weight).
         If not provided, then the default is nan.
+    dtype : numpy dtype, optional
+        Floating point precision to use for the values and weights
+        in the interpolation, and for the result. By default, None
+        (precision determined by the inputs).
+
     Returns
     -------
     interpolated values
     """
+    if dtype is not None:
+        values = np.asarray(values, dtype=dtype)
+        wts = np.asarray(wts, dtype=dtype)
     result = np.einsum('nj,nj->n', np.take(values, vtx), wts)
 
     # fill nans that might result from
@@ -117,7 +141,8 @@ def interpolate(values, vtx, wts, fill_value='mean'):
     return result
 
 
-def regrid(arr, grid, grid2, mask1=None, mask2=None, method='linear'):
+def regrid(arr, grid, grid2, mask1=None, mask2=None, method='linear',
+           dtype=None):
     """Interpolate array values from one model grid to another,
     using scipy.interpolate.griddata.
 
@@ -138,6 +163,10 @@ def regrid(arr, grid, grid2, mask1=None, mask2=None, method='linear'):
         is used (not for integer/categorical arrays).
     method : str
         interpolation method ('nearest', 'linear', or 'cubic')
+    dtype : numpy dtype, optional
+        Floating point precision of the returned array. Source and
+        destination cell center coordinates are always kept in
+        double precision. By default, None (float64).
     """
     try:
         from scipy.interpolate import griddata
@@ -178,10 +207,13 @@ def regrid(arr, grid, grid2, mask1=None, mask2=None, method='linear'):
     #    arr2[fill] = nodataval
     if arr2.min() < 0:
         j=2
+    if dtype is not None:
+        arr2 = arr2.astype(dtype, copy=False)
     return arr2
 
 
-def regrid3d(arr, grid, grid2, mask1=None, mask2=None, method='linear'):
+def regrid3d(arr, grid, grid2, mask1=None, mask2=None, method='linear',
+             dtype=None):
     """Interpolate array values from one model grid to another,
     using scipy.interpolate.griddata.
 
@@ -202,6 +234,10 @@ def regrid3d(arr, grid, grid2, mask1=None, mask2=None, method='linear'):
         is used (not for integer/categorical arrays).
     method : str
         interpolation method ('nearest', 'linear', or 'cubic')
+    dtype : numpy dtype, optional
+        Floating point precision of the returned array. Source and
+        destination cell center coordinates are always kept in
+        double precision. By default, None (float64).
 
     Returns
     -------
@@ -262,6 +298,20 @@ def regrid3d(arr, grid, grid2, mask1=None, mask2=None, method='linear'):
         pz = pz.ravel()
         arr = arr.ravel()
 
+    # if triangulating all of the source points would exceed the memory budget,
+    # only include source points within a window around the destination grid
+    nbytes = len(arr) * delaunay_bytes_per_point[3]
+    if not within_memory_budget(nbytes):
+        x0, x1, y0, y1 = grid2.extent
+        buffer = 2 * np.max([np.max(grid.delr), np.max(grid.delc)])
+        in_window = (px > x0 - buffer) & (px < x1 + buffer) & \
+                    (py > y0 - buffer) & (py < y1 + buffer)
+        print(f'regrid3d: memory budget exceeded; only using the {in_window.sum():,d} '
+              f'of {len(arr):,d} source points within the destination grid area')
+        px, py, pz, arr = px[in_window], py[in_window], pz[in_window], arr[in_window]
+        nbytes = len(arr) * delaunay_bytes_per_point[3]
+    check_memory_budget(nbytes, f'regrid3d (3D triangulation of {len(arr):,d} source points)')
+
     # dest modelgrid points
     x, y, z = grid2.xyzcellcenters
     try:
@@ -297,6 +347,8 @@ def regrid3d(arr, grid, grid2, mask1=None, mask2=None, method='linear'):
     # (floating point arrays)
     if method == 'linear':
         arr2[fill] = np.nanmean(arr2[~fill])
+    if dtype is not None:
+        arr2 = arr2.astype(dtype, copy=False)
     return arr2
 
 
@@ -319,6 +371,9 @@ class Interpolator:
         Boolean array of same structure as the `source_values` array
         input to the :meth:`~mfsetup.interpolate.Interpolator.interpolate` method,
         with the same number of active values as the size of `xyz`.
+    dtype : numpy dtype, optional
+        Floating point precision of the interpolation weights and
+        interpolated values. By default, None (float64).
 
     Notes
     -----
@@ -326,11 +381,12 @@ class Interpolator:
     https://stackoverflow.com/questions/20915502/speedup-scipy-griddata-for-multiple-interpolations-between-two-irregular-grids
 
     """
-    def __init__(self, xyz, uvw, d=2, source_values_mask=None):
+    def __init__(self, xyz, uvw, d=2, source_values_mask=None, dtype=None):
 
         self.xyz = xyz
         self.uvw = uvw
         self.d = d
+        self.dtype = dtype
 
         # properties
         self._interp_weights = None
@@ -341,7 +397,8 @@ class Interpolator:
     def interp_weights(self):
         """Calculate the interpolation weights."""
         if self._interp_weights is None:
-            self._interp_weights = interp_weights(self.xyz, self.uvw, self.d)
+            self._interp_weights = interp_weights(self.xyz, self.uvw, self.d,
+                                                  dtype=self.dtype)
         return self._interp_weights
 
     @property
@@ -382,10 +439,12 @@ class Interpolator:
             source_values = source_values.flatten()[self.source_values_mask.flatten()]
         if method == 'linear':
             interpolated = interpolate(source_values, *self.interp_weights,
-                                       fill_value=None)
+                                       fill_value=None, dtype=self.dtype)
         elif method == 'nearest':
             interpolated = griddata(self.xyz, source_values,
                                     self.uvw, method=method)
+            if self.dtype is not None:
+                interpolated = interpolated.astype(self.dtype, copy=False)
         return interpolated
 
 
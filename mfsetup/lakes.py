@@ -11,7 +11,6 @@ from scipy.ndimage import sobel
 from shapely.geometry import Polygon
 
 fm = flopy.modflow
-from gisutils import project, shp2df
 
 from mfsetup.evaporation import hamon_evaporation
 from mfsetup.fileio import save_array
@@ -20,7 +19,7 @@ from mfsetup.sourcedata import (
     SourceData,
     TabularSourceData,
     TransientSourceDataMixin,
-    aggregate_dataframe_to_stress_period,
+    aggregate_dataframe_to_stress_periods,
 )
 from mfsetup.units import convert_length_units, convert_temperature_units
 from mfsetup.utils import get_input_arguments
@@ -35,6 +34,7 @@ def make_lakarr2d(grid, lakesdata,
     if isinstance(lakesdata, str):
         # implement automatic reprojection in gis-utils
         # maintaining backwards compatibility
+        from gisutils import shp2df
         kwargs = {'dest_crs': grid.crs}
         kwargs = get_input_arguments(kwargs, shp2df)
         lakes = shp2df(lakesdata, **kwargs)
@@ -187,6 +187,7 @@ def setup_lake_info(model):
     nlakes = len(lakesdata)
 
     # make dataframe with lake IDs, names and locations
+    from gisutils import project
     centroids = project([g.centroid for g in lakesdata.geometry],
                         lakesdata.crs, 4269)
     # boundnames for lakes
@@ -804,21 +805,10 @@ class PrismSourceData(SourceData, TransientSourceDataMixin):
         #if endtimes_equal_startimes:
         #    endtimes -= pd.Timedelta(1, unit='d')
 
-        period_data = []
-        #current_stat = None
-        #for kper, (start, end) in enumerate(zip(starttimes, endtimes)):
-        for kper, period_stat in self.period_stats.items():
-            if period_stat is None:
-                continue
-            # missing (period) keys default to 'mean';
-            # 'none' to explicitly skip the stress period
-            #period_stat = self.period_stats.get(kper, current_stat)
-            #current_stat = period_stat
-            aggregated = aggregate_dataframe_to_stress_period(df, id_column=self.id_column, data_column=self.data_columns,
-                                                              datetime_column=self.datetime_column,
-                                                              **period_stat)
-            aggregated['per'] = kper
-            period_data.append(aggregated)
-        dfm = pd.concat(period_data)
+        # missing (period) keys default to 'mean';
+        # 'none' to explicitly skip the stress period
+        dfm = aggregate_dataframe_to_stress_periods(df, id_column=self.id_column, data_column=self.data_columns,
+                                                    datetime_column=self.datetime_column,
+                                                    period_stats=self.period_stats)
         dfm.sort_values(by=['per', self.id_column], inplace=True)
         return dfm.reset_index(drop=True)
@@ -11,7 +11,6 @@ import pandas as pd
 fm = flopy.modflow
 mf6 = flopy.mf6
 from flopy.utils.lgrutil import Lgr
-from gisutils import get_values_at_points
 
 from mfsetup.bcs import remove_inactive_bcs
 from mfsetup.discretization import (
@@ -19,11 +18,16 @@ from mfsetup.discretization import (
     create_vertical_pass_through_cells,
     deactivate_idomain_above,
     find_remove_isolated_cells,
+    get_lgr_exchange_data,
     make_idomain,
     make_irch,
     make_lgr_idomain,
 )
-from mfsetup.fileio import add_version_to_fileheader, flopy_mfsimulation_load
+from mfsetup.fileio import (
+    add_version_to_fileheader,
+    flopy_mfsimulation_load,
+    link_or_copy,
+)
 from mfsetup.fileio import load as load_config
 from mfsetup.fileio import load_cfg
 from mfsetup.ic import setup_strt
@@ -80,7 +84,7 @@ class MF6model(MFsetupMixin, mf6.ModflowGwf):
                                      'wel', 'maw', 'obs']
         # set up the model configuration dictionary
         # start with the defaults
-        self.cfg = load_config(self.source_path / self.default_file) #'mf6_defaults.yml')
+        self.cfg = load_config(self.source_path / self.default_file, cache=True) #'mf6_defaults.yml')
         self.relative_external_paths = self.cfg.get('model', {}).get('relative_external_paths', True)
         # set the model workspace and change working directory to there
         self.model_ws = self._get_model_ws(cfg=cfg)
@@ -168,6 +172,7 @@ class MF6model(MFsetupMixin, mf6.ModflowGwf):
                     time_units=self.time_units,
                     parent_model=self.parent,
                     parent_stress_periods=parent_stress_periods,
+                    max_nper=(self.preview or {}).get('nper'),
                     )
             self._perioddata = perioddata
             # reset nper property so that it will reference perioddata table
@@ -315,6 +320,7 @@ class MF6model(MFsetupMixin, mf6.ModflowGwf):
     def get_raster_values_at_cell_centers(self, raster, out_of_bounds_errors='coerce'):
         """Sample raster values at centroids
         of model grid cells."""
+        from gisutils import get_values_at_points
         values = get_values_at_points(raster,
                                       x=self.modelgrid.xcellcenters.ravel(),
                                       y=self.modelgrid.ycellcenters.ravel(),
@@ -480,6 +486,7 @@ class MF6model(MFsetupMixin, mf6.ModflowGwf):
 
     def setup_lgr_exchanges(self):
 
+        exchangedata_files = []
         for inset_name, inset_model in self.inset.items():
 
             # update cell information for computing any bottom exchanges
@@ -491,24 +498,41 @@ class MF6model(MFsetupMixin, mf6.ModflowGwf):
                 self.dis.botm.array[parent_top_below_child:]
 
             # get the exchange data
-            exchangelist = self.lgr[inset_name].get_exchange_data(angldegx=True, cdist=True)
-
-            # make a dataframe for concise unpacking of cellids
-            columns = ['cellidm1', 'cellidm2', 'ihc', 'cl1', 'cl2', 'hwva', 'angldegx', 'cdist']
-            exchangedf = pd.DataFrame(exchangelist, columns=columns)
-
-            # unpack the cellids and get their respective ibound values
-            k1, i1, j1 = zip(*exchangedf['cellidm1'])
-            k2, i2, j2 = zip(*exchangedf['cellidm2'])
-            # limit connections to
-            active1 = self.idomain[k1, i1, j1] >= 1
-
-            active2 = inset_model.idomain[k2, i2, j2] >= 1
+            exchangedata = get_lgr_exchange_data(self.lgr[inset_name])
 
             # screen out connections involving an inactive cell
-            active_connections = active1 & active2
-            nexg = active_connections.sum()
-            active_exchangelist = [l for i, l in enumerate(exchangelist) if active_connections[i]]
+            active1 = self.idomain[exchangedata['k1'], exchangedata['i1'],
+                                   exchangedata['j1']] >= 1
+            active2 = inset_model.idomain[exchangedata['k2'], exchangedata['i2'],
+                                          exchangedata['j2']] >= 1
+            exchangedata = exchangedata.loc[active1 & active2]
+            nexg = len(exchangedata)
+
+            # option to write exchangedata to an external file
+            if self.cfg['gwfgwf']['external_files']:
+                # get the file path (allowing for different external file locations, specified name format, etc.)
+                # (the parent model name is prepended to the filename for LGR models)
+                filename_fmt = self.cfg['gwfgwf']['exchangedata_filename_fmt'].format(inset_name)
+                filepath = self.setup_external_filepaths('gwfgwf', 'exchangedata', filename_fmt)
+                exchangedata_input = filepath[0]
+                # list the exchange files for all of the inset models
+                exchangedata_files.append(exchangedata_input['filename'])
+                self.cfg['external_files']['gwfgwf_exchangedata'] = exchangedata_files
+                # MODFLOW cellids are one-based
+                external_exchangedata = exchangedata.copy()
+                cellid_cols = ['k1', 'i1', 'j1', 'k2', 'i2', 'j2']
+                external_exchangedata[cellid_cols] += 1
+                external_exchangedata.rename(columns={'k1': '#k1'}, inplace=True)
+                external_exchangedata.to_csv(exchangedata_input['filename'], index=False, sep=' ')
+                # make a copy for the intermediate data folder, for consistency with mf-2005
+                link_or_copy(exchangedata_input['filename'],
+                             self.cfg['intermediate_data']['output_folder'])
+            else:
+                exchangedata_input = list(zip(
+                    zip(exchangedata['k1'], exchangedata['i1'], exchangedata['j1']),
+                    zip(exchangedata['k2'], exchangedata['i2'], exchangedata['j2']),
+                    *(exchangedata[c] for c in ['ihc', 'cl1', 'cl2', 'hwva',
+                                                'angldegx', 'cdist'])))
 
             # arguments to ModflowGwfgwf
             kwargs = {'exgtype': 'gwf6-gwf6',
@@ -516,7 +540,7 @@ class MF6model(MFsetupMixin, mf6.ModflowGwf):
                         'exgmnameb': inset_name,
                         'nexg': nexg,
                         'auxiliary': [('angldegx', 'cdist')],
-                        'exchangedata': active_exchangelist
+                        'exchangedata': exchangedata_input
                         }
             kwargs = get_input_arguments(kwargs, mf6.ModflowGwfgwf)
 
@@ -524,7 +548,7 @@ class MF6model(MFsetupMixin, mf6.ModflowGwf):
             gwfgwf = mf6.ModflowGwfgwf(self.simulation, **kwargs)
 
             # set up a Mover Package if needed
-            self.setup_simulation_mover(gwfgwf)
+            self.setup_simulation_mover(gwfgwf, exchangedata)
 
 
     def setup_dis(self, **kwargs):
@@ -918,7 +942,7 @@ class MF6model(MFsetupMixin, mf6.ModflowGwf):
         print("finished in {:.2f}s\n".format(time.time() - t0))
         return ims
 
-    def setup_simulation_mover(self, gwfgwf):
+    def setup_simulation_mover(self, gwfgwf, exchangedata=None):
         """Set up the MODFLOW-6 water mover package at the simulation level.
         Automate set-up of the mover between SFR packages in LGR parent and inset models.
         todo: automate set-up of mover between SFR and lakes (within a model).
@@ -926,6 +950,10 @@ class MF6model(MFsetupMixin, mf6.ModflowGwf):
         Parameters
         ----------
         gwfgwf : Flopy :class:`~flopy.mf6.modflow.mfgwfgwf.ModflowGwfgwf` package instance
+        exchangedata : DataFrame, optional
+            Exchange data for gwfgwf, as returned by
+            :func:`mfsetup.discretization.get_lgr_exchange_data`.
+            By default, None (read from gwfgwf).
 
         Notes
         ------
@@ -935,26 +963,29 @@ class MF6model(MFsetupMixin, mf6.ModflowGwf):
         print('\nSetting up the simulation water mover package...')
         t0 = time.time()
 
+        if exchangedata is None:
+            exchangedata = gwfgwf.exchangedata.array
         perioddata_dfs = []
         if self.get_package('sfr') is not None:
             if self.inset is not None:
                 for inset_name, inset in self.inset.items():
                     if inset.get_package('sfr'):
                         inset_perioddata = get_mover_sfr_package_input(
-                            self, inset, gwfgwf.exchangedata.array)
+                            self, inset, exchangedata)
                         perioddata_dfs.append(inset_perioddata)
                         # for each SFR reach with a connection
                         # to a reach in another model
                         # set the SFR Package downstream connection to 0
-                        for i, r in inset_perioddata.iterrows():
-                            rd = self.simulation.get_model(r['mname1']).sfrdata.reach_data
-                            rd.loc[rd['rno'] == r['id1']+1, 'outreach'] = 0
+                        for mname1, group in inset_perioddata.groupby('mname1'):
+                            rd = self.simulation.get_model(mname1).sfrdata.reach_data
+                            rd.loc[rd['rno'].isin(group['id1'] + 1), 'outreach'] = 0
                             # fix flopy connectiondata as well
-                            sfr_package = self.simulation.get_model(r['mname1']).sfr
+                            sfr_package = self.simulation.get_model(mname1).sfr
                             cd = sfr_package.connectiondata.array.tolist()
                             # there should be no downstream reaches
                             # (indicated by negative numbers)
-                            cd[r['id1']] = tuple(v for v in cd[r['id1']] if v > 0)
+                            for id1 in group['id1']:
+                                cd[id1] = tuple(v for v in cd[id1] if v > 0)
                             sfr_package.connectiondata = cd
                         # re-write the shapefile exports with corrected routing
                         inset.sfrdata.write_shapefiles(f'{inset._shapefiles_path}/{inset_name}')
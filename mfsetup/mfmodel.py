@@ -1,3 +1,4 @@
+import copy
 import os
 import time
 import warnings
@@ -13,11 +14,6 @@ from packaging import version
 
 fm = flopy.modflow
 mf6 = flopy.mf6
-import gisutils
-import sfrmaker
-from gisutils import get_shapefile_crs, get_values_at_points, project
-from sfrmaker import Lines
-from sfrmaker.utils import assign_layers
 
 from mfsetup.bcs import (
     get_bc_package_cells,
@@ -26,11 +22,15 @@ from mfsetup.bcs import (
 )
 from mfsetup.config import validate_configuration
 from mfsetup.fileio import (
+    LazyModflow,
     check_source_files,
+    get_model_snapshot_key,
     load,
     load_array,
     load_cfg,
+    load_model_snapshot,
     save_array,
+    save_model_snapshot,
     set_cfg_paths_to_absolute,
     setup_external_filepaths,
 )
@@ -48,6 +48,13 @@ from mfsetup.mf5to6 import (
     get_package_name,
 )
 from mfsetup.model_version import get_versions
+from mfsetup.profiling import (
+    add_counts,
+    parse_memory_size,
+    profiler,
+    span,
+    timed,
+)
 from mfsetup.sourcedata import TransientTabularSourceData, setup_array
 from mfsetup.tdis import (
     concat_periodata_groups,
@@ -61,13 +68,6 @@ from mfsetup.units import convert_length_units, lenuni_text, lenuni_values
 from mfsetup.utils import flatten, get_input_arguments, get_packages, update
 from mfsetup.wells import setup_wel_data
 
-if version.parse(gisutils.__version__) < version.parse('0.2.2'):
-    warnings.warn('Automatic reprojection functionality requires gis-utils >= 0.2.2'
-                  '\nPlease pip install --upgrade gis-utils')
-if version.parse(sfrmaker.__version__) < version.parse('0.6'):
-    warnings.warn('sfr: sfrmaker_options: add_outlet functionality requires sfrmaker >= 0.6'
-                  '\nPlease pip install --upgrade sfrmaker')
-
 
 class MFsetupMixin():
     """Mixin class for shared functionality between MF6model and MFnwtModel.
@@ -102,6 +102,7 @@ class MFsetupMixin():
         self._modelgrid = None
         self._bbox = None
         self._parent = parent
+        self._parent_snapshot = None  # (snapshot file, key, deferred packages)
         self._parent_layers = None
         self._parent_default_source_data = False
         self._parent_mask = None
@@ -123,6 +124,7 @@ class MFsetupMixin():
         self._lgr_idomain2d = None # array of Lgr inset model locations within parent grid
         self.tmr = None  # holds TMR class instance for TMR-type perimeter boundaries
         self._load = False  # whether model is being made or loaded from existing files
+        self._initial_cfg = None  # configuration before package setup
         self.lake_info = None
         self.lake_fluxes = None
 
@@ -275,6 +277,42 @@ class MFsetupMixin():
     #        perioddata = setup_perioddata(self)
     #    return self._perioddata
 
+    @property
+    def preview(self):
+        """Settings for a coarsened preview build of the model,
+        from the ``preview:`` block of the configuration file,
+        or None if the model is being built at full resolution.
+
+        Items:
+
+        ============== =========================================
+        coarsen_factor Factor by which to coarsen the model grid
+                       row and column spacings (default 1)
+        nper           Maximum number of stress periods to
+                       include (default 3)
+        ============== =========================================
+        """
+        preview_cfg = self.cfg.get('preview')
+        if preview_cfg:
+            preview = {'coarsen_factor': 1,
+                       'nper': 3}
+            preview.update(preview_cfg)
+            return preview
+
+    @property
+    def float_dtype(self):
+        """Floating point precision for intermediate arrays
+        (resampled and interpolated source data), from the
+        ``dtype:`` item in the global ``mfsetup_options:`` block
+        of the configuration file. Model input arrays are
+        always written in double precision.
+        """
+        dtype = np.dtype(self.cfg['mfsetup_options'].get('dtype', 'float64'))
+        if not np.issubdtype(dtype, np.floating):
+            raise ValueError("mfsetup_options: dtype must be a floating point "
+                             f"type (e.g. float32 or float64), not {dtype}")
+        return dtype
+
     @property
     def parent(self):
         return self._parent
@@ -431,7 +469,8 @@ class MFsetupMixin():
         if self._interp_weights is None:
             parent_xy, inset_xy = get_source_dest_model_xys(self.parent,
                                                                         self)
-            self._interp_weights = interp_weights(parent_xy, inset_xy)
+            self._interp_weights = interp_weights(parent_xy, inset_xy,
+                                                  dtype=self.float_dtype)
         return self._interp_weights
 
     @property
@@ -568,6 +607,11 @@ class MFsetupMixin():
         for f in features_file:
             if f not in self._features.keys():
                 if os.path.exists(f):
+                    import gisutils
+                    from gisutils import get_shapefile_crs
+                    if version.parse(gisutils.__version__) < version.parse('0.2.2'):
+                        warnings.warn('Automatic reprojection functionality requires gis-utils >= 0.2.2'
+                                      '\nPlease pip install --upgrade gis-utils')
                     features_crs = get_shapefile_crs(f)
                     if bbox_filter is None:
                         if self.bbox is not None:
@@ -578,6 +622,7 @@ class MFsetupMixin():
                             assert model_crs is not None
 
                         if features_crs != self.modelgrid.crs:
+                            from gisutils import project
                             bbox_filter = project(bbox, self.modelgrid.crs, features_crs).bounds
                         else:
                             bbox_filter = bbox.bounds
@@ -667,19 +712,31 @@ class MFsetupMixin():
             dropped.
         method : str ('linear', 'nearest')
             Interpolation method.
+
+        Notes
+        -----
+        Floating point arrays are returned in the
+        :attr:`float_dtype` precision; other arrays (e.g. idomain or zones)
+        keep their type with method='nearest'.
         """
+        dtype = None
+        if np.issubdtype(np.asarray(parent_array).dtype, np.floating):
+            dtype = self.float_dtype
+        elif method == 'nearest':
+            dtype = np.asarray(parent_array).dtype
         if mask is not None:
             return regrid(parent_array, self.parent.modelgrid, self.modelgrid,
                           mask1=mask,
-                          method=method)
+                          method=method, dtype=dtype)
         if method == 'linear':
             #parent_values = parent_array.flatten()[self.parent_mask.flatten()]
             parent_values = parent_array[self.parent_mask].flatten()
             regridded = interpolate(parent_values,
-                                    *self.interp_weights)
+                                    *self.interp_weights,
+                                    dtype=dtype)
         elif method == 'nearest':
             regridded = regrid(parent_array, self.parent.modelgrid, self.modelgrid,
-                               method='nearest')
+                               method='nearest', dtype=dtype)
         regridded = np.reshape(regridded, (self.nrow, self.ncol))
         return regridded
 
@@ -973,6 +1030,7 @@ class MFsetupMixin():
                 bathymetry_file = bathymetry_file['filename']
 
             # sample pre-made bathymetry at grid points
+            from gisutils import get_values_at_points
             bathy = get_values_at_points(bathymetry_file,
                                          x=self.modelgrid.xcellcenters.ravel(),
                                          y=self.modelgrid.ycellcenters.ravel(),
@@ -1061,6 +1119,49 @@ class MFsetupMixin():
         self._parent._mg_resync = False
         self._parent._modelgrid = MFsetupGrid(**kwargs)
 
+    def _load_parent_model(self, load_function, parent_model_ws, modelname=None,
+                           **kwargs):
+        """Load the parent model with load_function(**kwargs), or from a
+        snapshot of a previous load of the same parent model files
+        (if mfsetup_options: parent_snapshots: is True). Snapshots are kept in the
+        .mfsetup-cache folder of the model workspace.
+        """
+        if not self.cfg['mfsetup_options'].get('parent_snapshots', True):
+            return load_function(**kwargs)
+        with span('parent snapshot key'):
+            load_kwargs = dict(load_function=load_function.__qualname__,
+                               modelname=modelname, **kwargs)
+            # MODFLOW 6 parent models are loaded from the simulation namefile
+            namefile = kwargs.get('f', 'mfsim.nam')
+            key = get_model_snapshot_key(parent_model_ws, namefile,
+                                         load_kwargs=load_kwargs)
+        name = modelname or os.path.splitext(os.path.split(kwargs['f'])[1])[0]
+        snapshot_file = Path(self.model_ws, '.mfsetup-cache', f'parent_{name}.pkl')
+        with span('load parent snapshot'):
+            parent = load_model_snapshot(snapshot_file, key)
+        if parent is not None:
+            print(f'(from snapshot {snapshot_file})')
+        else:
+            parent = load_function(**kwargs)
+            save_model_snapshot(snapshot_file, key, parent)
+        self._parent_snapshot = (snapshot_file, key,
+                                 set(getattr(parent, 'deferred_packages', ())))
+        return parent
+
+    def update_parent_snapshot(self):
+        """Rewrite the parent model snapshot if packages of a lazily loaded
+        parent model (see ``lazy_parent``) were read since the snapshot
+        was written, so that subsequent builds don't have to read them again.
+        """
+        if self._parent_snapshot is None:
+            return
+        snapshot_file, key, deferred = self._parent_snapshot
+        current = set(getattr(self._parent, 'deferred_packages', ()))
+        if current != deferred:
+            with span('update parent snapshot'):
+                save_model_snapshot(snapshot_file, key, self._parent)
+            self._parent_snapshot = (snapshot_file, key, current)
+
     def _set_parent(self):
         """Set attributes related to a parent or source model
         if one is specified.
@@ -1112,14 +1213,26 @@ class MFsetupMixin():
                         sim_kwargs['sim_name'] = kwargs.get('simulation', 'mfsim')
                     if 'sim_ws' not in kwargs:
                         sim_kwargs['sim_ws'] = sim_kwargs.get('model_ws', '.')
+                    # only read package data when they are accessed
+                    if self.cfg['mfsetup_options'].get('lazy_parent', True):
+                        sim_kwargs['lazy_io'] = sim_kwargs.get('lazy_io', True)
                     sim_kwargs = get_input_arguments(sim_kwargs, mf6.MFSimulation.load, warn=False)
-                    parent_sim = mf6.MFSimulation.load(**sim_kwargs)
                     modelname, _ = os.path.splitext(kwargs['namefile'])
-                    self._parent = parent_sim.get_model(modelname)
+
+                    def load_parent(**sim_kwargs):
+                        parent_sim = mf6.MFSimulation.load(**sim_kwargs)
+                        return parent_sim.get_model(modelname)
+
+                    self._parent = self._load_parent_model(load_parent, sim_kwargs['sim_ws'],
+                                                           modelname=modelname, **sim_kwargs)
                 else:
                     kwargs['f'] = kwargs.pop('namefile')
                     kwargs = get_input_arguments(kwargs, fm.Modflow.load, warn=False)
-                    self._parent = fm.Modflow.load(**kwargs)
+                    load_function = fm.Modflow.load
+                    if self.cfg['mfsetup_options'].get('lazy_parent', True):
+                        load_function = LazyModflow.load
+                    self._parent = self._load_parent_model(load_function, kwargs['model_ws'],
+                                                           **kwargs)
                 print("finished in {:.2f}s\n".format(time.time() - t0))
 
             # set parent model units in config if not entered
@@ -1248,11 +1361,11 @@ class MFsetupMixin():
                            source_model=source_model, source_package=source_package,
                            **kwargs)
 
+    @timed('setup_basic_stress_package', verbose=True)
     def _setup_basic_stress_package(self, package, flopy_package_class,
                                     variable_columns, rivdata=None,
                                     **kwargs):
         print(f'\nSetting up {package.upper()} package...')
-        t0 = time.time()
 
         # possible future support to
         # handle filenames of multiple packages
@@ -1333,20 +1446,36 @@ class MFsetupMixin():
             return
         else:
             df = pd.concat(dfs, axis=0)
+        add_counts(rows=len(df))
 
         # option to write stress_period_data to external files
         if self.version == 'mf6':
             external_files = self.cfg[package]['mfsetup_options'].get('external_files', True)
+            # option to write the external files as binary list input
+            binary = external_files and self.cfg[package]['mfsetup_options'].get('binary', False)
         else:
             # external list or tabular type files not supported for MODFLOW-NWT
             # adding support for this may require changes to Flopy
             external_files = False
+            binary = False
+        if binary:
+            # MODFLOW 6 binary list input doesn't support boundnames
+            if 'boundname' in df.columns:
+                warnings.warn(f"{package.upper()} Package: boundnames (and observations "
+                              "based on them) are not supported with binary "
+                              "external files; dropping them.")
+                df = df.drop('boundname', axis=1)
+            # (flopy treats any boundnames option value other than None as True)
+            self.cfg[package]['options']['boundnames'] = None
         external_filename_fmt = self.cfg[package]['mfsetup_options']['external_filename_fmt']
         spd = setup_flopy_stress_period_data(self, package, df,
                                                  flopy_package_class=flopy_package_class,
                                                  variable_columns=variable_columns,
                                                  external_files=external_files,
-                                                 external_filename_fmt=external_filename_fmt)
+                                                 external_filename_fmt=external_filename_fmt,
+                                                 binary=binary,
+                                                 deduplicate_periods=self.cfg[package]['mfsetup_options'].get(
+                                                     'deduplicate_periods', True))
 
         kwargs = self.cfg[package]
         if isinstance(self.cfg[package]['options'], dict):
@@ -1356,7 +1485,7 @@ class MFsetupMixin():
         # and any user input with a boundname col
         obslist = []
         obsfile = f'{self.name}.{package}.obs.output.csv'
-        if 'perimeter_boundary' in kwargs:
+        if 'perimeter_boundary' in kwargs and not binary:
             perimeter_btype = f"perimeter-{perimeter_cfg['boundary_type']}"
             obslist.append((perimeter_btype, package, perimeter_btype))
         if 'boundname' in df.columns:
@@ -1369,7 +1498,6 @@ class MFsetupMixin():
         if not external_files:
             kwargs['stress_period_data'] = spd
         pckg = flopy_package_class(self, **kwargs)
-        print("finished in {:.2f}s\n".format(time.time() - t0))
         return pckg
 
     def setup_grid(self):
@@ -1408,6 +1536,14 @@ class MFsetupMixin():
             self.parent.modelgrid.angrot != 0:
                 cfg['rotation'] = self.parent.modelgrid.angrot
 
+        # option to build a coarsened preview version of the model
+        # (only coarsen the grid on the initial build; subsequent
+        # calls rebuild from the already coarsened grid configuration)
+        if self.preview is not None and cfg is self.cfg['setup_grid']:
+            if self.lgr or self._is_lgr or 'lgr' in self.cfg['setup_grid']:
+                raise NotImplementedError('Preview builds of LGR models')
+            cfg['coarsen_factor'] = self.preview['coarsen_factor']
+
         if os.path.exists(cfg['grid_file']) and self._load:
             print('Loading model grid definition from {}'.format(cfg['grid_file']))
             cfg.update(load(cfg['grid_file']))
@@ -1432,6 +1568,14 @@ class MFsetupMixin():
             else:
                 self.cfg['dis']['nrow'] = self.cfg['grid']['nrow']
                 self.cfg['dis']['ncol'] = self.cfg['grid']['ncol']
+            # coarsened (preview) grid spacings supercede any DIS package input
+            if cfg.get('coarsen_factor', 1) > 1:
+                dis_griddata = self.cfg['dis']
+                if self.version == 'mf6':
+                    dis_griddata = self.cfg['dis']['griddata']
+                for param in 'delr', 'delc':
+                    if param in dis_griddata:
+                        dis_griddata[param] = self.cfg['grid'][param]
 
         self._reset_bc_arrays()
 
@@ -1456,10 +1600,16 @@ class MFsetupMixin():
         print('Loading model grid information from {}'.format(gridfile))
         self.cfg['grid'] = load(gridfile)
 
+    @timed('setup_sfr', verbose=True)
     def setup_sfr(self, **kwargs):
         package = 'sfr'
         print('\nSetting up {} package...'.format(package.upper()))
-        t0 = time.time()
+        import sfrmaker
+        from sfrmaker import Lines
+        from sfrmaker.utils import assign_layers
+        if version.parse(sfrmaker.__version__) < version.parse('0.6'):
+            warnings.warn('sfr: sfrmaker_options: add_outlet functionality requires sfrmaker >= 0.6'
+                          '\nPlease pip install --upgrade sfrmaker')
 
         # input
         flowlines = self.cfg['sfr'].get('source_data', {}).get('flowlines')
@@ -1474,6 +1624,7 @@ class MFsetupMixin():
                     return
 
                 # create an sfrmaker.lines instance
+                from gisutils import project
                 bbox_filter = project(self.bbox, self.modelgrid.crs, 'epsg:4269').bounds
                 lines = Lines.from_nhdplus_v2(NHDPlus_paths=nhdplus_paths,
                                             bbox_filter=bbox_filter)
@@ -1501,6 +1652,7 @@ class MFsetupMixin():
 
                         bbox_filter = self.bbox.bounds
                         if shapefile_crs != self.modelgrid.crs:
+                            from gisutils import project
                             bbox_filter = project(self.bbox, self.modelgrid.crs, shapefile_crs).bounds
                         kwargs['bbox_filter'] = bbox_filter
                         # create an sfrmaker.lines instance
@@ -1725,12 +1877,12 @@ class MFsetupMixin():
 
         # attach the sfrmaker.sfrdata instance as an attribute
         self.sfrdata = sfr
+        add_counts(reaches=len(sfr.reach_data))
 
         # reset dependent arrays
         self._reset_bc_arrays()
         if self.version == 'mf6':
             self._set_idomain()
-        print("finished in {:.2f}s\n".format(time.time() - t0))
         return sfr_package
 
     def setup_solver(self):
@@ -1757,7 +1909,8 @@ class MFsetupMixin():
                 package_setup = getattr(MFsetupMixin, 'setup_{}'.format(pkg.strip('6')))
             # avoid multiple package instances for now, except for obs
             if self.version != 'mf6' or pkg == 'obs' or not hasattr(self, pkg):
-                package_setup(**self.cfg[pkg], **self.cfg[pkg]['mfsetup_options'])
+                with span(pkg.upper(), model=self.name):
+                    package_setup(**self.cfg[pkg], **self.cfg[pkg]['mfsetup_options'])
 
 
     @classmethod
@@ -1813,30 +1966,69 @@ class MFsetupMixin():
         if len(cfg_filename) > 0:
             msg += f" from configuration in {cfg_filename}"
         print(msg)
-        t0 = time.time()
-
-        m = cls(cfg=cfg) #, **kwargs)
-
-        # make a grid if one isn't already specified
-        if 'grid' not in m.cfg.keys():
-            m.setup_grid()
-
-        # establish time discretization, including TDIS setup for MODFLOW-6
-        m.setup_tdis()
-
-        # set up the solver
-        m.setup_solver()
-
-        # set up all of the packages specified in the config file
-        m.setup_packages(reset_existing=False)
-
-        # LGR inset model(s)
-        if m.inset is not None:
-            for k, v in m.inset.items():
-                if v._is_lgr:
-                    v.setup_packages()
-            m.setup_lgr_exchanges()
 
-        print('finished setting up model in {:.2f}s'.format(time.time() - t0))
+        # time the setup stages
+        # (unless this model is being set up within another model)
+        top_level = profiler.current is None
+        if top_level:
+            profiler.reset()
+        try:
+            with span('setup_from_cfg', model=cfg['model']['modelname']) as setup_span:
+
+                with span('load model'):
+                    m = cls(cfg=cfg) #, **kwargs)
+                # configuration before any packages are set up
+                # (for remaking packages with different input;
+                # see mfsetup.ensemble)
+                m._initial_cfg = copy.deepcopy(m.cfg)
+
+                # optional memory accounting and budget
+                if top_level:
+                    profiler.memory_budget = parse_memory_size(
+                        m.cfg['mfsetup_options'].get('memory_budget'))
+                    if m.cfg['mfsetup_options'].get('track_memory', False):
+                        profiler.start_memory_tracking()
+
+                # make a grid if one isn't already specified
+                if 'grid' not in m.cfg.keys():
+                    with span('setup_grid'):
+                        m.setup_grid()
+
+                # establish time discretization, including TDIS setup for MODFLOW-6
+                with span('setup_tdis'):
+                    m.setup_tdis()
+
+                # set up the solver
+                with span('setup_solver'):
+                    m.setup_solver()
+
+                # set up all of the packages specified in the config file
+                m.setup_packages(reset_existing=False)
+
+                # LGR inset model(s)
+                if m.inset is not None:
+                    for k, v in m.inset.items():
+                        if v._is_lgr:
+                            v.setup_packages()
+                    with span('setup_lgr_exchanges'):
+                        m.setup_lgr_exchanges()
+
+                # save any parent model packages read during setup
+                m.update_parent_snapshot()
+        finally:
+            if top_level:
+                profiler.stop_memory_tracking()
+                profiler.memory_budget = None
+
+        print('finished setting up model in {:.2f}s'.format(setup_span.wall))
         print('\n{}'.format(m))
+        if top_level:
+            heading = '\nModel setup timing (seconds)'
+            if m.cfg['mfsetup_options'].get('track_memory', False):
+                heading += ' and memory use (MB)'
+            print(heading + ':')
+            print(profiler.format_summary() + '\n')
+            if m.cfg['mfsetup_options'].get('write_profile', True):
+                profile_file = Path(m.model_ws, f'{m.name}_setup_profile.json')
+                profiler.write_trace(profile_file)
         return m
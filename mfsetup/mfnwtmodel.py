@@ -17,12 +17,14 @@ from mfsetup.discretization import (
     make_ibound,
 )
 from mfsetup.fileio import (
+    LazyModflow,
     add_version_to_fileheader,
     flopy_mf2005_load,
     load,
     load_cfg,
     save_array,
 )
+from mfsetup.grid import intersect_points
 from mfsetup.ic import setup_strt
 from mfsetup.lakes import (
     make_bdlknc2d,
@@ -32,7 +34,7 @@ from mfsetup.lakes import (
     setup_lake_tablefiles,
 )
 from mfsetup.mfmodel import MFsetupMixin
-from mfsetup.obs import setup_head_observations
+from mfsetup.obs import get_gage_package_data, setup_head_observations
 from mfsetup.oc import parse_oc_period_input
 from mfsetup.tdis import (
     get_parent_stress_periods,
@@ -41,6 +43,7 @@ from mfsetup.tdis import (
 )
 from mfsetup.units import convert_length_units, itmuni_text, lenuni_text
 from mfsetup.utils import get_input_arguments, get_packages
+from mfsetup.wells import FastModflowMnw2
 
 
 class MFnwtModel(MFsetupMixin, Modflow):
@@ -80,7 +83,7 @@ class MFnwtModel(MFsetupMixin, Modflow):
                                      'gag', 'hyd']
         # set up the model configuration dictionary
         # start with the defaults
-        self.cfg = load(self.source_path / self.default_file)  # 'mf6_defaults.yml')
+        self.cfg = load(self.source_path / self.default_file, cache=True)  # 'mf6_defaults.yml')
         self.relative_external_paths = self.cfg.get('model', {}).get('relative_external_paths', True)
         # set the model workspace and change working directory to there
         self.model_ws = self._get_model_ws(cfg=cfg)
@@ -152,6 +155,7 @@ class MFnwtModel(MFsetupMixin, Modflow):
                     nper=nper, steady=steady, time_units=self.time_units,
                     parent_model=self.parent,
                     parent_stress_periods=parent_stress_periods,
+                    max_nper=(self.preview or {}).get('nper'),
                     )
             self._perioddata = perioddata
             # reset nper property so that it will reference perioddata table
@@ -242,7 +246,11 @@ class MFnwtModel(MFsetupMixin, Modflow):
             print('loading parent model {}...'.format(os.path.join(kwargs['model_ws'],
                                                                    kwargs['f'])))
             t0 = time.time()
-            self._parent = fm.Modflow.load(**kwargs)
+            load_function = fm.Modflow.load
+            if self.cfg['mfsetup_options'].get('lazy_parent', True):
+                load_function = LazyModflow.load
+            self._parent = self._load_parent_model(load_function, kwargs['model_ws'],
+                                                   **kwargs)
             print("finished in {:.2f}s\n".format(time.time() - t0))
 
             # parent model units
@@ -504,10 +512,10 @@ class MFnwtModel(MFsetupMixin, Modflow):
             zpump = None
 
             wells = aw.groupby('comments').first()
-            periods = aw
             if 'x' in wells.columns and 'y' in wells.columns:
-                wells['i'], wells['j'] = self.modelgrid.intersect(wells['x'].values,
-                                                     wells['y'].values)
+                wells['i'], wells['j'] = intersect_points(self.modelgrid,
+                                                          wells['x'].values,
+                                                          wells['y'].values)
             if 'depth' in wells.columns:
                 wellhead_elevations = self.dis.top.array[wells.i, wells.j]
                 ztop = wellhead_elevations - (5*.3048) # 5 ft casing
@@ -539,24 +547,22 @@ class MFnwtModel(MFsetupMixin, Modflow):
             if zpump is not None:
                 nd['zpump'] = zpump
 
-            spd = {}
-            for per, group in periods.groupby('per'):
-                spd_per = fm.ModflowMnw2.get_empty_stress_period_data(len(group))
-                spd_per['wellid'] = group.comments
-                spd_per['qdes'] = group.flux
-                spd[per] = spd_per
-            itmp = []
-            for per in range(self.nper):
-                if per in spd.keys():
-                    itmp.append(len(spd[per]))
-                else:
-                    itmp.append(0)
-
-            mnw = fm.ModflowMnw2(self, mnwmax=len(wells), ipakcb=self.ipakcb,
-                                 mnwprnt=1,
-                                 node_data=nd, stress_period_data=spd,
-                                 itmp=itmp
-                                 )
+            # stress period data for all periods in one table,
+            # split into contiguous blocks by period
+            periods = aw.sort_values(by='per', kind='stable')
+            per = periods['per'].values.astype(int)
+            spd_all = fm.ModflowMnw2.get_empty_stress_period_data(len(periods))
+            spd_all['wellid'] = periods['comments']
+            spd_all['qdes'] = periods['flux']
+            pers, start = np.unique(per, return_index=True)
+            spd = dict(zip(pers.tolist(), np.split(spd_all, start[1:])))
+            itmp = np.bincount(per, minlength=self.nper)[:self.nper].tolist()
+
+            mnw = FastModflowMnw2(self, mnwmax=len(wells), ipakcb=self.ipakcb,
+                                  mnwprnt=1,
+                                  node_data=nd, stress_period_data=spd,
+                                  itmp=itmp
+                                  )
             print("finished in {:.2f}s\n".format(time.time() - t0))
             return mnw
         else:
@@ -748,84 +754,44 @@ class MFnwtModel(MFsetupMixin, Modflow):
 
         print('setting up GAGE package...')
         t0 = time.time()
-        # setup gage package output for all included lakes
-        ngages = 0
-        nlak_gages = 0
-        starting_unit_number = self.cfg['gag']['starting_unit_number']
-        if self.get_package('lak') is not None:
-            nlak_gages = self.lak.nlakes
-        if nlak_gages > 0:
-            ngages += nlak_gages
-            lak_gagelocs = list(np.arange(1, nlak_gages+1) * -1)
-            lak_gagerch = [0] * nlak_gages # dummy list to maintain index position
-            lak_outtype = [self.cfg['gag']['lak_outtype']] * nlak_gages
-            # need minus sign to tell MF to read outtype
-            lake_unit = list(-np.arange(starting_unit_number,
-                                        starting_unit_number + nlak_gages, dtype=int))
+        # gage package output for all included lakes
+        lake_ids = None
+        if self.get_package('lak') is not None and self.lak.nlakes > 0:
             # TODO: make private attribute to facilitate keeping track of lake IDs
-            lak_files = ['lak{}_{}.ggo'.format(i+1, hydroid)
-                         for i, hydroid in enumerate(self.cfg['lak']['source_data']['lakes_shapefile']['include_ids'])]
-            # update the starting unit number of avoid collisions with other gage packages
-            starting_unit_number = np.max(np.abs(lake_unit)) + 1
-
-        # need to add streams at some point
-        nstream_gages = 0
-        stream_gageseg = []
-        stream_gagerch = []
-        stream_unit = []
-        stream_outtype = []
-        stream_files = []
+            lake_ids = self.cfg['lak']['source_data']['lakes_shapefile']['include_ids']
+        # stream gages
+        sfr_observations = None
         if self.get_package('sfr') is not None:
-            #observations_input = self.cfg['sfr'].get('source_data', {}).get('observations')
-            #obs_info_files = self.cfg['gag'].get('observation_data')
-            #if obs_info_files is not None:
-            #    # get obs_info_files into dictionary format
-            #    # filename: dict of column names mappings
-            #    if isinstance(obs_info_files, str):
-            #        obs_info_files = [obs_info_files]
-            #    if isinstance(obs_info_files, list):
-            #        obs_info_files = {f: self.cfg['gag']['default_columns']
-            #                          for f in obs_info_files}
-            #    elif isinstance(obs_info_files, dict):
-            #        for k, v in obs_info_files.items():
-            #            if v is None:
-            #                obs_info_files[k] = self.cfg['gag']['default_columns']
-#
-            #    print('Reading observation files...')
-            #    check_source_files(obs_info_files.keys())
-            #    dfs = []
-            #    for f, column_info in obs_info_files.items():
-            #        print(f)
-            #        df = read_observation_data(f,
-            #                                   column_info,
-            #                                   column_mappings=self.cfg['hyd'].get('column_mappings'))
-            #        dfs.append(df) # cull to cols that are needed
-            #    df = pd.concat(dfs, axis=0)
-            df = self.sfrdata.observations
-            nstream_gages = len(df)
-            stream_files = ['{}.ggo'.format(site_no) for site_no in df.obsname]
-            stream_gageseg = df.iseg.tolist()
-            stream_gagerch = df.ireach.tolist()
-            stream_unit = list(np.arange(starting_unit_number,
-                                         starting_unit_number + nstream_gages, dtype=int))
-            stream_outtype = [self.cfg['gag']['sfr_outtype']] * nstream_gages
-        ngages += nstream_gages
-
-        if ngages == 0:
+            sfr_observations = self.sfrdata.observations
+        cfg = self.cfg['gag']
+        df = get_gage_package_data(lake_ids=lake_ids,
+                                   sfr_observations=sfr_observations,
+                                   starting_unit_number=cfg['starting_unit_number'],
+                                   lak_outtype=cfg['lak_outtype'],
+                                   sfr_outtype=cfg['sfr_outtype'],
+                                   stream_gages_per_file=cfg.get('stream_gages_per_file', 1),
+                                   combined_filename_fmt=cfg.get('combined_filename_fmt',
+                                                                 'sfr_gages_{:03d}.ggo'))
+        if len(df) == 0:
             print('No gage package input.')
             return
 
+        # write table of gage names, units and output files
+        lookup_file = cfg.get('output_files', {}).get('lookup_file')
+        if lookup_file is not None:
+            lookup_file = Path(self._tables_path) / Path(lookup_file.format(self.name)).name
+            df.to_csv(lookup_file, index=False)
+            cfg['output_files']['lookup_file'] = str(lookup_file)
+
         # create flopy gage package object
-        gage_data = fm.ModflowGage.get_empty(ncells=ngages)
-        gage_data['gageloc'] = lak_gagelocs + stream_gageseg
-        gage_data['gagerch'] = lak_gagerch + stream_gagerch
-        gage_data['unit'] = lake_unit + stream_unit
-        gage_data['outtype'] = lak_outtype + stream_outtype
-        if len(self.cfg['gag'].get('ggo_files', {})) == 0:
-            self.cfg['gag']['ggo_files'] = lak_files + stream_files
+        gage_data = fm.ModflowGage.get_empty(ncells=len(df))
+        for col in 'gageloc', 'gagerch', 'unit', 'outtype':
+            gage_data[col] = df[col].values
+        if len(cfg.get('ggo_files', {})) == 0:
+            cfg['ggo_files'] = df['file'].tolist()
         gag = fm.ModflowGage(self, numgage=len(gage_data),
                              gage_data=gage_data,
-                             files=self.cfg['gag']['ggo_files'],
+                             files=cfg['ggo_files'],
                              )
         print("finished in {:.2f}s\n".format(time.time() - t0))
         return gag
@@ -3,9 +3,44 @@ Get connections between packages to keep 'er movin'
 """
 import numpy as np
 import pandas as pd
-from scipy.spatial.distance import cdist
-from sfrmaker.routing import find_path
-from shapely.geometry import Point
+import shapely
+from scipy.spatial import cKDTree
+
+
+def get_connection_table(from_features, to_features, distance_threshold=250):
+    """Given two sequences of shapely geometries, return a table
+    of the (index positions of the) pairs of elements in from_features
+    and to_features with centroids that are less than distance_threshold apart.
+    Only the pairs within distance_threshold are computed (using a pair
+    of KD-trees), so memory use scales with the number of connections,
+    not the product of the number of features.
+
+    Parameters
+    ----------
+    from_features : sequence of shapely geometries
+    to_features : sequence of shapely geometries
+    distance_threshold : float
+
+    Returns
+    -------
+    connections : DataFrame
+        Table with 'from', 'to' and 'distance' columns,
+        sorted by 'from' and then 'distance'.
+    """
+    points1 = get_centroids(from_features)
+    points2 = get_centroids(to_features)
+    columns = ['from', 'to', 'distance']
+    if len(points1) == 0 or len(points2) == 0:
+        return pd.DataFrame(columns=columns)
+    pairs = cKDTree(points1).sparse_distance_matrix(
+        cKDTree(points2), distance_threshold, output_type='ndarray')
+    connections = pd.DataFrame({'from': pairs['i'],
+                                'to': pairs['j'],
+                                'distance': pairs['v']})
+    connections = connections.loc[connections['distance'] < distance_threshold]
+    connections.sort_values(by=['from', 'distance'], inplace=True)
+    connections.reset_index(drop=True, inplace=True)
+    return connections[columns]
 
 
 def get_connections(from_features, to_features, distance_threshold=250):
@@ -24,18 +59,74 @@ def get_connections(from_features, to_features, distance_threshold=250):
     connections : dict
         {index in from_features : index in to_features}
 
+    See Also
+    --------
+    get_connection_table
     """
-    x1, y1 = zip(*[g.centroid.coords[0] for g in from_features])
-    x2, y2 = zip(*[g.centroid.coords[0] for g in to_features])
-    points1 = np.array([x1, y1]).transpose()
-    points2 = np.array([x2, y2]).transpose()
-    # compute a matrix of distances between all points in vectors points1 and points2
-    distances = cdist(points1, points2)
+    connections = get_connection_table(from_features, to_features,
+                                       distance_threshold=distance_threshold)
     # for each point in points1, get the closest point in points2
-    # by getting the row, column locs where the distances are within the threshold
-    # and then making a dictionary of row keys (points1) and column values (points2)
-    connections = dict(np.transpose(np.where(distances < distance_threshold)))
-    return connections
+    closest = connections.groupby('from')['to'].first()
+    return dict(zip(closest.index.tolist(), closest.tolist()))
+
+
+def get_centroids(features):
+    """Get the centroids of a sequence of shapely geometries,
+    as an (n, 2) array of x, y coordinates."""
+    centroids = shapely.centroid(np.asarray(features, dtype=object).ravel())
+    return shapely.get_coordinates(centroids).reshape(-1, 2)
+
+
+def get_nearest_reach_starts(reach_data, other_reach_data, distance_threshold):
+    """For the end of each reach in reach_data, find the reach in
+    other_reach_data with the closest starting point, if it is
+    less than distance_threshold away.
+
+    Returns
+    -------
+    next_reach : ndarray
+        Reach number ('rno') in other_reach_data for each reach
+        in reach_data, or -1 if there is no reach start within distance_threshold
+        (reach numbers may be zero-based).
+    """
+    next_reach = np.full(len(reach_data), -1, dtype=int)
+    if len(reach_data) == 0 or len(other_reach_data) == 0:
+        return next_reach
+    reach_ends = shapely.get_coordinates(
+        shapely.get_point(reach_data['geometry'].values, -1))
+    reach_starts = shapely.get_coordinates(
+        shapely.get_point(other_reach_data['geometry'].values, 0))
+    distances, loc = cKDTree(reach_starts).query(
+        reach_ends, distance_upper_bound=distance_threshold)
+    connected = distances < distance_threshold
+    next_reach[connected] = other_reach_data['rno'].values[loc[connected]]
+    return next_reach
+
+
+def get_exchange_ij(exchangedata, model_number):
+    """Get the row, column location of each exchange cell in model 1 or 2
+    (from 'cellidm<model_number>' (k, i, j) tuples in flopy exchangedata,
+    or 'i<model_number>' and 'j<model_number>' columns, as returned by
+    :func:`mfsetup.discretization.get_lgr_exchange_data`),
+    as an (n connections, 2) integer array.
+    """
+    if f'cellidm{model_number}' in exchangedata.columns:
+        return np.array(exchangedata[f'cellidm{model_number}'].tolist(),
+                        dtype=int).reshape(-1, 3)[:, 1:]
+    return exchangedata[[f'i{model_number}', f'j{model_number}']].values.\
+        astype(int).reshape(-1, 2)
+
+
+def get_reach_ij(reach_data):
+    """Get the row, column location of each reach in reach_data
+    (from 'i' and 'j' columns, or otherwise from a 'cellid' column of
+    (k, i, j) tuples), as an (n reaches, 2) integer array.
+    """
+    if 'cellid' not in reach_data.columns and\
+        {'i', 'j'}.issubset(reach_data.columns):
+        return reach_data[['i', 'j']].values.astype(int).reshape(-1, 2)
+    return np.array(reach_data['cellid'].tolist(),
+                    dtype=int).reshape(-1, 3)[:, 1:]
 
 
 def get_sfr_package_connections(gwfgwf_exchangedata,
@@ -47,7 +138,9 @@ def get_sfr_package_connections(gwfgwf_exchangedata,
     ----------
     gwfgwf_exchangedata : flopy recarray or pandas DataFrame
         Exchange data from the GWFGWF package
-        (listing cell connections between two groundwater flow models).
+        (listing cell connections between two groundwater flow models),
+        or a DataFrame returned by
+        :func:`mfsetup.discretization.get_lgr_exchange_data`.
     reach_data1 : DataFrame, similar to sfrmaker.SFRData.reach_data
         SFR reach information for model 1 in gwfgwf_exchangedata.
         Must contain reach numbers and 'geometry' column of shapely geometries
@@ -66,90 +159,74 @@ def get_sfr_package_connections(gwfgwf_exchangedata,
     connections2 : dictionary of connections from package 2 to package 1
     """
     gwfgwf_exchangedata = pd.DataFrame(gwfgwf_exchangedata)
-    all_reach_data1 = reach_data1.copy()
-    all_reach_data2 = reach_data2.copy()
 
-    # add cellids to connect reaches with GWFGWF exchanges
+    # (i, j) locations of the exchange cells and reaches
     # ignore layers in case there are any mismatches
     # due to pinchouts at the different model resolutions
     # or different layer assignments by SFRmaker
     # and because we only expect one SFR reach at each i, j location
-    gwfgwf_exchangedata['cellidm1_2d'] =\
-        [(i, j) for k, i, j in gwfgwf_exchangedata['cellidm1']]
-    gwfgwf_exchangedata['cellidm2_2d'] =\
-        [(i, j) for k, i, j in gwfgwf_exchangedata['cellidm2']]
-    for df in all_reach_data1, all_reach_data2:
-        if 'cellid' not in df.columns and\
-            {'k', 'i', 'j'}.intersection(df.columns):
-                df['cellid_2d'] =\
-                    list(df[['i', 'j']].itertuples(index=False, name=None))
-        else:
-            df['cellid_2d'] = [(i, j) for k, i, j in df['cellid']]
-    reach_data1 = all_reach_data1.loc[all_reach_data1['cellid_2d'].isin(
-        gwfgwf_exchangedata['cellidm1_2d'])]
-    reach_data2 = all_reach_data2.loc[all_reach_data2['cellid_2d'].isin(
-        gwfgwf_exchangedata['cellidm2_2d'])]
-
-    # starting locations of each reach along the parent/inset interface
-    reach_data1['reach_start'] = [Point(g.coords[0]) for g in reach_data1['geometry']]
-    reach_data2['reach_start'] = [Point(g.coords[0]) for g in reach_data2['geometry']]
-
-    # neighboring cells (in a structured grid)
-    def neighbors(i, j):
-        return {(i-1, j-1), (i-1, j), (i-1, j+1),
-                (i, j+1), (i+1, j+1), (i+1, j),
-                (i+1, j-1), (i, j-1)}
-
-    # make the connections
-    parent_to_inset = dict()
-    inset_to_parent = dict()
-    for _, r in reach_data1.iterrows():
-        # check for connections to the other model
-        # if the next reach is in another cell
-        # along the parent/inset model interface,
-        # or if the curret reach is an outlet
-        if r['outreach'] in reach_data1['rno'].values or r['outreach'] == 0:
-            # if the outreach is in a neighboring cell,
-            # assume it is correct
-            # (that the next reach is not in the other model)
-            out_reach = reach_data1.loc[reach_data1['rno'] == r['outreach']]
-            if r['outreach'] != 0 and\
-                out_reach['cellid_2d'].iloc[0] in neighbors(*r['cellid_2d']):
-                continue
-            # if the distance to the next reach is greater than 1 cell
-            # consider this each to be an outlet
-            reach_end = Point(r['geometry'].coords[-1])
-            distances = reach_end.distance(reach_data2['reach_start'])
-            if np.min(distances) < distance_threshold:
-                next_reach = reach_data2.iloc[np.argmin(distances)]
-                parent_to_inset[r['rno']] = next_reach['rno']
-        # next reach is somewhere else in the parent model
-        else:
-            continue
-    # repeat for inset to parent connections
-    for i, r in reach_data2.iterrows():
+    exchange_ij1 = get_exchange_ij(gwfgwf_exchangedata, 1)
+    exchange_ij2 = get_exchange_ij(gwfgwf_exchangedata, 2)
+    reach_ij1 = get_reach_ij(reach_data1)
+    reach_ij2 = get_reach_ij(reach_data2)
+
+    # encode the (i, j) locations as integer node numbers
+    # in a grid padded by one cell on each side,
+    # so that the neighbor offsets below can't wrap between rows
+    ncol = max([ij[:, 1].max(initial=0) for ij in
+                (exchange_ij1, exchange_ij2, reach_ij1, reach_ij2)]) + 3
+
+    def get_node(ij):
+        return (ij[:, 0] + 1) * ncol + ij[:, 1] + 1
+
+    # node number offsets to the 8 neighboring cells (in a structured grid)
+    neighbor_offsets = np.array([-ncol - 1, -ncol, -ncol + 1, -1,
+                                 1, ncol - 1, ncol, ncol + 1])
+
+    # only consider reaches along the parent/inset interface
+    nodes1 = get_node(reach_ij1)
+    nodes2 = get_node(reach_ij2)
+    along_interface1 = np.isin(nodes1, get_node(exchange_ij1))
+    along_interface2 = np.isin(nodes2, get_node(exchange_ij2))
+    reach_data1 = reach_data1.loc[along_interface1]
+    reach_data2 = reach_data2.loc[along_interface2]
+    nodes1 = nodes1[along_interface1]
+    nodes2 = nodes2[along_interface2]
+
+    # closest reach start in the other model
+    # to the end of each reach along the parent/inset interface
+    next_reach1 = get_nearest_reach_starts(reach_data1, reach_data2,
+                                           distance_threshold)
+    next_reach2 = get_nearest_reach_starts(reach_data2, reach_data1,
+                                           distance_threshold)
+
+    def get_connections_to_other_model(reach_data, nodes, next_reach):
+        rno = reach_data['rno'].values
+        outreach = reach_data['outreach'].values
         # check for connections to the other model
         # if the next reach is in another cell
         # along the parent/inset model interface,
-        # or if the curret reach is an outlet
-        if r['outreach'] in reach_data2['rno'].values or r['outreach'] == 0:
-            # if the outreach is in a neighboring cell,
-            # assume it is correct
-            # (that the next reach is not in the other model)
-            out_reach = reach_data2.loc[reach_data2['rno'] == r['outreach']]
-            if r['outreach'] != 0 and\
-                out_reach['cellid_2d'].iloc[0] in neighbors(*r['cellid_2d']):
-                continue
-            # if the distance to the next reach is greater than 1 cell
-            # consider this each to be an outlet
-            reach_end = Point(r['geometry'].coords[-1])
-            distances = reach_end.distance(reach_data1['reach_start'])
-            if np.min(distances) < distance_threshold:
-                next_reach = reach_data1.iloc[np.argmin(distances)]
-                inset_to_parent[r['rno']] = next_reach['rno']
-        # next reach is somewhere else in this model
-        else:
-            continue
+        # or if the current reach is an outlet
+        # (otherwise, the next reach is somewhere else in this model)
+        candidates = np.isin(outreach, rno) | (outreach == 0)
+        # if the outreach is in a neighboring cell,
+        # assume it is correct
+        # (that the next reach is not in the other model)
+        node_lookup = pd.Series(nodes, index=rno)
+        node_lookup = node_lookup.loc[~node_lookup.index.duplicated()]
+        outreach_nodes = node_lookup.reindex(outreach, fill_value=-1).values
+        in_neighboring_cell = (outreach != 0) & np.any(
+            (nodes[:, None] + neighbor_offsets) == outreach_nodes[:, None],
+            axis=1)
+        # if the distance to the next reach is greater than
+        # distance_threshold, consider this reach to be an outlet
+        connected = candidates & ~in_neighboring_cell & (next_reach >= 0)
+        return dict(zip(rno[connected], next_reach[connected]))
+
+    parent_to_inset = get_connections_to_other_model(
+        reach_data1, nodes1, next_reach1)
+    inset_to_parent = get_connections_to_other_model(
+        reach_data2, nodes2, next_reach2)
     return parent_to_inset, inset_to_parent
 
 
@@ -166,40 +243,30 @@ def get_mover_sfr_package_input(parent, inset, gwfgwf_exchangedata):
         """
 
     grid_spacing = parent.dis.delc.array[0]
-    connections = []
     # use 2x grid spacing for distance threshold
     # because reaches could be small fragments in opposite corners of two adjacent cells
     to_inset, to_parent = get_sfr_package_connections(gwfgwf_exchangedata,
                                                       parent.sfrdata.reach_data,
                                                       inset.sfrdata.reach_data,
                                                       distance_threshold=2*grid_spacing)
-    # convert to zero-based if reach_data aren't
-    # corrections are quantities to subtract off
-    parent_rno_correction = parent.sfrdata.reach_data.rno.min()
-    inset_rno_correction = inset.sfrdata.reach_data.rno.min()
-
-    for parent_reach, inset_reach in to_inset.items():
-        rec = {'mname1': parent.name,
-               'pname1': parent.sfr.package_name,
-               'id1': parent_reach - parent_rno_correction,
-               'mname2': inset.name,
-               'pname2': inset.sfr.package_name,
-               'id2': inset_reach - inset_rno_correction,
-               'mvrtype': 'factor',  # see MF-6 IO documentation
-               'value': 1.0  # move 100% of the water from parent_reach to inset_reach
-               }
-        connections.append(rec.copy())
-
-    for inset_reach, parent_reach in to_parent.items():
-        rec = {'mname1': inset.name,
-               'pname1': inset.sfr.package_name,
-               'id1': inset_reach - inset_rno_correction,
-               'mname2': parent.name,
-               'pname2': parent.sfr.package_name,
-               'id2': parent_reach - parent_rno_correction,
-               'mvrtype': 'factor',  # see MF-6 IO documentation
-               'value': 1.0  # move 100% of the water from parent_reach to inset_reach
-               }
-        connections.append(rec.copy())
-    packagedata = pd.DataFrame(connections)
+
+    def get_packagedata(model1, model2, reach_connections):
+        # convert to zero-based if reach_data aren't
+        # corrections are quantities to subtract off
+        rno_correction1 = model1.sfrdata.reach_data.rno.min()
+        rno_correction2 = model2.sfrdata.reach_data.rno.min()
+        return pd.DataFrame({
+            'mname1': model1.name,
+            'pname1': model1.sfr.package_name,
+            'id1': np.array(list(reach_connections.keys()), dtype=int) - rno_correction1,
+            'mname2': model2.name,
+            'pname2': model2.sfr.package_name,
+            'id2': np.array(list(reach_connections.values()), dtype=int) - rno_correction2,
+            'mvrtype': 'factor',  # see MF-6 IO documentation
+            'value': 1.0  # move 100% of the water from the model1 reach to the model2 reach
+            })
+
+    packagedata = pd.concat([get_packagedata(parent, inset, to_inset),
+                             get_packagedata(inset, parent, to_parent)],
+                            ignore_index=True)
     return packagedata
@@ -3,7 +3,7 @@ import pandas as pd
 from shapely.geometry import Point, box
 
 from mfsetup.fileio import check_source_files
-from mfsetup.grid import get_ij
+from mfsetup.grid import get_ij, points_within
 
 
 def read_observation_data(f=None, column_info=None,
@@ -124,11 +124,11 @@ def setup_head_observations(model, filenames=None,
     df = pd.concat(dfs, axis=0)
 
     print('\nCulling observations to model area...')
-    df['geometry'] = [Point(x, y) for x, y in zip(df.x, df.y)]
     l, r, t, b = model.modelgrid.extent
     bbox = box(l, b, r, t)
-    within = [g.within(bbox) for g in df.geometry]
+    within = points_within(df.x, df.y, bbox)
     df = df.loc[within].copy()
+    df['geometry'] = [Point(x, y) for x, y in zip(df.x, df.y)]
 
     # make unique observation names for each model layer; applying the character limit
     # preserve end of obsname, truncating initial characters as needed
@@ -233,3 +233,81 @@ def remove_inactive_obs(obs_package_instance):
         is_active = idomain[k, i, j] > 0
         # update the flopy dataset
         obs_package_instance.continuous.set_data({obsfile: recarray[is_active]})
+
+
+def get_gage_package_data(lake_ids=None, sfr_observations=None,
+                          starting_unit_number=250, lak_outtype=1, sfr_outtype=0,
+                          stream_gages_per_file=1,
+                          combined_filename_fmt='sfr_gages_{:03d}.ggo'):
+    """Make input for the MODFLOW-2005 Gage Package.
+
+    Parameters
+    ----------
+    lake_ids : sequence, optional
+        Lake identifiers (e.g. feature IDs in the lakes shapefile),
+        in the order of the lake numbers (1, 2, 3...) in the Lake Package.
+        A gage is added for each lake.
+    sfr_observations : DataFrame, optional
+        Stream gage locations, with 'obsname', 'iseg' and 'ireach' columns
+        (e.g. the observations attribute of an sfrmaker.SFRData instance).
+    starting_unit_number : int
+        Unit number for the first gage output file. By default, 250.
+    lak_outtype : int
+        Output type for lake gages (see Gage Package Data Set 2a). By default, 1.
+    sfr_outtype : int
+        Output type for stream gages (see Gage Package Data Set 2b). By default, 0.
+    stream_gages_per_file : int
+        Number of stream gages written to each output file. With the default of 1,
+        each stream gage is written to a file named after the observation.
+        Otherwise, consecutive stream gages share an output file (and unit)
+        named with combined_filename_fmt, to limit the number of files
+        open during the model run. MODFLOW writes the records for gages
+        that share a file in gage order at each time step.
+    combined_filename_fmt : str
+        Format string for combined stream gage output files,
+        with a placeholder for the file number.
+        By default, 'sfr_gages_{:03d}.ggo'.
+
+    Returns
+    -------
+    gage_data : DataFrame
+        One row per gage, with 'gageloc', 'gagerch', 'unit' and 'outtype'
+        columns (Gage Package Data Set 2), as well as the gage 'name'
+        and output 'file'.
+    """
+    columns = ['name', 'gageloc', 'gagerch', 'unit', 'outtype', 'file']
+    dfs = []
+    unit = starting_unit_number
+    if lake_ids is not None and len(lake_ids) > 0:
+        lak_numbers = np.arange(1, len(lake_ids) + 1)
+        df = pd.DataFrame({
+            'name': [f'lak{i}_{lake_id}' for i, lake_id in zip(lak_numbers, lake_ids)],
+            # lake gages are specified with negative lake numbers
+            'gageloc': -lak_numbers,
+            'gagerch': 0,  # dummy value to maintain index position
+            # need minus sign to tell MF to read outtype
+            'unit': -(unit + lak_numbers - 1),
+            'outtype': lak_outtype,
+        })
+        df['file'] = df['name'] + '.ggo'
+        dfs.append(df)
+        # update the starting unit number to avoid collisions with other gages
+        unit += len(df)
+    if sfr_observations is not None and len(sfr_observations) > 0:
+        stream_gages_per_file = max(int(stream_gages_per_file), 1)
+        file_numbers = np.arange(len(sfr_observations)) // stream_gages_per_file
+        df = pd.DataFrame({
+            'name': sfr_observations['obsname'].astype(str).values,
+            'gageloc': sfr_observations['iseg'].values,
+            'gagerch': sfr_observations['ireach'].values,
+            'unit': unit + file_numbers,
+            'outtype': sfr_outtype,
+        })
+        if stream_gages_per_file > 1:
+            df['file'] = [combined_filename_fmt.format(n) for n in file_numbers]
+        else:
+            df['file'] = df['name'] + '.ggo'
+        dfs.append(df)
+    if len(dfs) == 0:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(dfs, ignore_index=True)[columns]
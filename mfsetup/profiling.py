@@ -0,0 +1,437 @@
+"""
+Lightweight, span-based timing of the model setup stages.
+
+Stages of model setup are wrapped in nested spans
+(with the :func:`span` context manager or the :func:`timed` decorator),
+which record wall and CPU time, along with any counts
+(e.g. number of cells or rows) attached to them. At the end of
+:meth:`~mfsetup.mfmodel.MFsetupMixin.setup_from_cfg`, a summary table
+is printed, and the spans can be written to a JSON file in the
+`Chrome Trace Event format <https://docs.google.com/document/d/1CvAClvFfyA5R-PhYUmn5OOQtYMH4h6I0nSsKchNAySU>`_,
+which can be viewed with `Perfetto <https://ui.perfetto.dev>`_ or chrome://tracing.
+
+Optionally, the peak memory allocated within each span (via :mod:`tracemalloc`)
+and the resident set size (RSS) of the process at the end of each span
+can also be recorded. A memory budget can be set so that memory-intensive
+stages can check their estimated allocations beforehand
+(see :func:`within_memory_budget` and :func:`check_memory_budget`),
+and either fall back to a less memory-intensive approach or fail early.
+"""
+import functools
+import json
+import os
+import re
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import pandas as pd
+
+
+class MemoryBudgetError(MemoryError):
+    """Raised before a setup stage allocates more memory
+    than the configured memory budget allows."""
+
+
+def get_rss():
+    """Get the current resident set size (RSS)
+    of the Python process, in bytes.
+
+    Uses :mod:`psutil` if it is installed, otherwise /proc/self/statm
+    (Linux only). Returns None if the RSS can't be determined.
+    """
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open('/proc/self/statm') as src:
+            return int(src.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError, IndexError):
+        return None
+
+
+def parse_memory_size(size):
+    """Convert a memory size to bytes.
+
+    Parameters
+    ----------
+    size : int, float or str
+        Number of bytes, or a string with a number
+        and units (e.g. '8 GB', '500MB', '1.5 gb').
+        Units are decimal (1 GB = 1e9 bytes).
+
+    Returns
+    -------
+    nbytes : int
+    """
+    if size is None:
+        return None
+    if isinstance(size, (int, float)):
+        return int(size)
+    units = {'': 1, 'b': 1, 'kb': 1e3, 'mb': 1e6, 'gb': 1e9, 'tb': 1e12}
+    match = re.match(r'^\s*([0-9.eE+-]+)\s*([a-zA-Z]*)\s*$', str(size))
+    if match is None or match.group(2).lower() not in units:
+        raise ValueError(f"Invalid memory size: {size}; "
+                         "specify a number of bytes or a string like '8 GB'")
+    return int(float(match.group(1)) * units[match.group(2).lower()])
+
+
+class Span:
+    """A timed stage of model setup.
+
+    Parameters
+    ----------
+    name : str
+        Name of the stage (e.g. 'setup_array').
+    parent : Span instance, optional
+        Enclosing span, if any.
+    **counts : keyword arguments
+        Initial counts or other attributes for the span
+        (e.g. ``cells=1000``, ``package='wel'``).
+    """
+    def __init__(self, name, parent=None, **counts):
+        self.name = name
+        self.parent = parent
+        self.depth = 0 if parent is None else parent.depth + 1
+        self.counts = dict(counts)
+        self.start = None
+        self.wall = None
+        self.cpu = None
+        # memory tracking (if enabled)
+        self.peak_mem = None
+        self.rss = None
+        self._mem_start = None
+        self._mem_peak = 0
+
+    def __repr__(self):
+        return f"Span({self.name}, wall={self.wall}, cpu={self.cpu})"
+
+    @property
+    def elapsed(self):
+        """Wall time (seconds) since the span started,
+        or the total wall time if the span has finished."""
+        if self.wall is not None:
+            return self.wall
+        return time.perf_counter() - self.start
+
+    def add_counts(self, **counts):
+        """Add to the counts attached to the span.
+        Numeric counts are summed with any existing values;
+        other values are replaced.
+        """
+        for k, v in counts.items():
+            current = self.counts.get(k)
+            if isinstance(v, (int, float)) and isinstance(current, (int, float)):
+                self.counts[k] = current + v
+            else:
+                self.counts[k] = v
+
+
+class Profiler:
+    """Collects nested :class:`Span` instances
+    for the stages of model setup.
+    """
+    def __init__(self):
+        self.spans = []
+        self._stack = []
+        self._t0 = time.perf_counter()
+        self.track_memory = False
+        self.memory_budget = None
+        self._started_tracemalloc = False
+
+    @property
+    def current(self):
+        """The innermost open span, or None."""
+        if len(self._stack) > 0:
+            return self._stack[-1]
+
+    def reset(self):
+        """Clear any recorded spans."""
+        self.spans = []
+        self._stack = []
+        self._t0 = time.perf_counter()
+
+    def start_memory_tracking(self):
+        """Record the memory use in subsequent spans
+        (starting :mod:`tracemalloc` if needed).
+        Note that tracemalloc adds some overhead to
+        memory allocations."""
+        self.track_memory = True
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+
+    def stop_memory_tracking(self):
+        """Stop recording memory use (and stop :mod:`tracemalloc`
+        if it was started by :meth:`start_memory_tracking`)."""
+        self.track_memory = False
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    def _start_span_memory(self, s):
+        # tracemalloc only tracks a single (global) peak,
+        # so fold the peak so far into the enclosing span
+        # before resetting it for the new span
+        current, peak = tracemalloc.get_traced_memory()
+        if s.parent is not None and s.parent._mem_start is not None:
+            s.parent._mem_peak = max(s.parent._mem_peak, peak)
+        tracemalloc.reset_peak()
+        s._mem_start = current
+        s._mem_peak = current
+
+    def _end_span_memory(self, s):
+        current, peak = tracemalloc.get_traced_memory()
+        s._mem_peak = max(s._mem_peak, peak)
+        s.peak_mem = s._mem_peak - s._mem_start
+        s.rss = get_rss()
+        if s.parent is not None and s.parent._mem_start is not None:
+            s.parent._mem_peak = max(s.parent._mem_peak, s._mem_peak)
+        tracemalloc.reset_peak()
+
+    @contextmanager
+    def span(self, name, verbose=False, **counts):
+        """Time a block of code.
+
+        Parameters
+        ----------
+        name : str
+            Name of the stage.
+        verbose : bool
+            If True, print the elapsed time when the block exits,
+            in the same style as the rest of the modflow-setup output.
+        **counts : keyword arguments
+            Initial counts or other attributes for the span.
+
+        Yields
+        ------
+        span : Span instance
+            Counts can be added to the span within the block
+            with :meth:`Span.add_counts`.
+        """
+        s = Span(name, parent=self.current, **counts)
+        self.spans.append(s)
+        self._stack.append(s)
+        track_memory = self.track_memory and tracemalloc.is_tracing()
+        if track_memory:
+            self._start_span_memory(s)
+        s.start = time.perf_counter()
+        cpu0 = time.process_time()
+        try:
+            yield s
+        finally:
+            s.wall = time.perf_counter() - s.start
+            s.cpu = time.process_time() - cpu0
+            if track_memory:
+                self._end_span_memory(s)
+            self._stack.remove(s)
+            if verbose:
+                print("finished in {:.2f}s\n".format(s.wall))
+
+    def timed(self, name=None, verbose=False):
+        """Decorator to time each call to a function.
+
+        Parameters
+        ----------
+        name : str, optional
+            Span name; by default, the function's qualified name.
+        verbose : bool
+            If True, print the elapsed time after each call.
+        """
+        def decorator(func):
+            span_name = name if name is not None else func.__qualname__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(span_name, verbose=verbose):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def add_counts(self, **counts):
+        """Add counts to the innermost open span (if any)."""
+        if self.current is not None:
+            self.current.add_counts(**counts)
+
+    def elapsed(self):
+        """Wall time (seconds) since the innermost open span started."""
+        return self.current.elapsed
+
+    def within_memory_budget(self, nbytes):
+        """Check whether an allocation of approximately `nbytes`,
+        on top of the current process RSS, fits in the memory budget.
+        Always True if no budget is set."""
+        if self.memory_budget is None:
+            return True
+        rss = get_rss() or 0
+        return (rss + nbytes) <= self.memory_budget
+
+    def check_memory_budget(self, nbytes, stage):
+        """Fail early if an allocation of approximately `nbytes`
+        would exceed the memory budget.
+
+        Parameters
+        ----------
+        nbytes : int
+            Estimated size of the allocation, in bytes.
+        stage : str
+            Description of the setup stage, for the error message.
+
+        Raises
+        ------
+        MemoryBudgetError
+        """
+        if not self.within_memory_budget(nbytes):
+            rss = get_rss() or 0
+            raise MemoryBudgetError(
+                f"{stage} would need approximately {nbytes / 1e6:,.0f} MB "
+                f"(in addition to the {rss / 1e6:,.0f} MB currently in use), "
+                f"exceeding the memory budget of {self.memory_budget / 1e6:,.0f} MB "
+                "(mfsetup_options: memory_budget). Consider reducing the "
+                "size of the problem (e.g. a smaller inset model area, "
+                "or fewer parent model layers or stress periods), "
+                "or increasing the memory budget.")
+
+    def to_dataframe(self):
+        """Recorded spans as a DataFrame, in the order
+        that they were started, with one row per span."""
+        records = []
+        for s in self.spans:
+            rec = {'name': s.name,
+                   'depth': s.depth,
+                   'parent': s.parent.name if s.parent is not None else None,
+                   'start': s.start - self._t0,
+                   'wall': s.wall,
+                   'cpu': s.cpu}
+            if s.peak_mem is not None:
+                rec['peak_mb'] = s.peak_mem / 1e6
+            if s.rss is not None:
+                rec['rss_mb'] = s.rss / 1e6
+            rec.update(s.counts)
+            records.append(rec)
+        return pd.DataFrame(records)
+
+    def summary(self):
+        """Summarize the recorded spans by name.
+
+        Returns
+        -------
+        summary : DataFrame
+            Number of calls, total wall and CPU time (seconds),
+            maximum peak memory allocated within a span and
+            process RSS (MB; if memory was tracked),
+            and totals for any numeric counts (as integers), for each span name,
+            in the order that the names first occurred.
+        """
+        df = self.to_dataframe()
+        if len(df) == 0:
+            return pd.DataFrame(columns=['calls', 'wall', 'cpu'])
+        order = df['name'].unique()
+        memory_cols = [c for c in ['peak_mb', 'rss_mb'] if c in df.columns]
+        count_cols = [c for c in df.columns
+                      if c not in {'name', 'depth', 'parent', 'start', 'wall', 'cpu',
+                                   *memory_cols}
+                      and pd.api.types.is_numeric_dtype(df[c])]
+        grouped = df.groupby('name')
+        summary = pd.DataFrame({'depth': grouped['depth'].min(),
+                                'calls': grouped.size(),
+                                'wall': grouped['wall'].sum(),
+                                'cpu': grouped['cpu'].sum()})
+        for c in memory_cols:
+            summary[c] = grouped[c].max()
+        for c in count_cols:
+            summary[c] = grouped[c].sum(min_count=1).round().astype('Int64')
+        return summary.loc[order]
+
+    def format_summary(self):
+        """Summary table (see :meth:`summary`) as a string,
+        with span names indented by nesting depth."""
+        summary = self.summary()
+        if len(summary) == 0:
+            return ''
+        summary.index = ['  ' * int(depth) + name for name, depth
+                         in zip(summary.index, summary['depth'])]
+        summary.index.name = 'stage'
+        summary = summary.drop('depth', axis=1)
+        # leave counts that don't apply to a span blank
+        for c in summary.columns.drop(['calls', 'wall', 'cpu', 'peak_mb', 'rss_mb'],
+                                      errors='ignore'):
+            summary[c] = summary[c].astype(object).where(summary[c].notna(), '')
+        return summary.to_string(float_format='{:.2f}'.format, na_rep='')
+
+    def write_trace(self, filename, pid=None):
+        """Write the recorded spans to a JSON file in the
+        Chrome Trace Event format.
+
+        Parameters
+        ----------
+        filename : str or pathlike
+        pid : int, optional
+            Process id for the trace events; by default, the
+            id of the current process.
+        """
+        if pid is None:
+            pid = os.getpid()
+        events = []
+        for s in self.spans:
+            if s.wall is None:
+                continue
+            args = {k: v if isinstance(v, (int, float, str, bool)) else str(v)
+                    for k, v in s.counts.items()}
+            args['cpu_s'] = s.cpu
+            if s.peak_mem is not None:
+                args['peak_mb'] = s.peak_mem / 1e6
+            if s.rss is not None:
+                args['rss_mb'] = s.rss / 1e6
+            events.append({'name': s.name,
+                           'ph': 'X',
+                           'ts': (s.start - self._t0) * 1e6,
+                           'dur': s.wall * 1e6,
+                           'pid': pid,
+                           'tid': 0,
+                           'args': args})
+        with open(filename, 'w') as dest:
+            json.dump({'traceEvents': events,
+                       'displayTimeUnit': 'ms'}, dest, indent=1)
+        print('wrote {}'.format(filename))
+
+
+# default profiler for model setup
+profiler = Profiler()
+
+
+def span(name, verbose=False, **counts):
+    """Time a block of code with the default profiler.
+    See :meth:`Profiler.span`."""
+    return profiler.span(name, verbose=verbose, **counts)
+
+
+def timed(name=None, verbose=False):
+    """Decorator to time a function with the default profiler.
+    See :meth:`Profiler.timed`."""
+    return profiler.timed(name=name, verbose=verbose)
+
+
+def add_counts(**counts):
+    """Add counts to the innermost open span of the default profiler."""
+    profiler.add_counts(**counts)
+
+
+def elapsed():
+    """Wall time (seconds) since the innermost open span
+    of the default profiler started."""
+    return profiler.elapsed()
+
+
+def within_memory_budget(nbytes):
+    """Check an allocation against the memory budget of the
+    default profiler. See :meth:`Profiler.within_memory_budget`."""
+    return profiler.within_memory_budget(nbytes)
+
+
+def check_memory_budget(nbytes, stage):
+    """Fail early if an allocation would exceed the memory budget
+    of the default profiler. See :meth:`Profiler.check_memory_budget`."""
+    profiler.check_memory_budget(nbytes, stage)
@@ -1,3 +1,5 @@
+import glob
+import importlib.util
 import numbers
 import os
 import shutil
@@ -7,12 +9,11 @@ from pathlib import Path
 import numpy as np
 import pandas as pd
 import pyproj
+import shapely
 from flopy.utils import binaryfile as bf
-from gisutils import get_values_at_points, project, shp2df
-from scipy.interpolate import griddata
+from scipy.spatial import cKDTree
 from shapely.geometry import Point
 
-import xarray as xr
 from mfsetup.discretization import (
     fill_cells_vertically,
     fill_empty_layers,
@@ -22,8 +23,9 @@ from mfsetup.discretization import (
     verify_minimum_layer_thickness,
     weighted_average_between_layers,
 )
+from mfsetup.evaporation import grid_latitude, hamon_evaporation_by_period
 from mfsetup.fileio import save_array, setup_external_filepaths
-from mfsetup.grid import get_ij, rasterize
+from mfsetup.grid import get_ij, points_within, rasterize
 from mfsetup.interpolate import (
     get_source_dest_model_xys,
     interp_weights,
@@ -32,9 +34,10 @@ from mfsetup.interpolate import (
     regrid3d,
 )
 from mfsetup.mf5to6 import get_variable_name, get_variable_package_name
+from mfsetup.profiling import add_counts, check_memory_budget, span, timed
 from mfsetup.tdis import (
-    aggregate_dataframe_to_stress_period,
-    aggregate_xarray_to_stress_period,
+    aggregate_dataframe_to_stress_periods,
+    aggregate_xarray_to_stress_periods,
 )
 from mfsetup.units import convert_length_units, convert_time_units, convert_volume_units
 from mfsetup.utils import get_input_arguments
@@ -380,9 +383,18 @@ class ArraySourceData(SourceData):
             source_xy, dest_xy = get_source_dest_model_xys(self.source_modelgrid,
                                                            self.dest_model,
                                                            source_mask=self._source_grid_mask)
-            self._interp_weights = interp_weights(source_xy, dest_xy)
+            self._interp_weights = interp_weights(source_xy, dest_xy,
+                                                  dtype=self._interp_dtype)
         return self._interp_weights
 
+    @property
+    def _interp_dtype(self):
+        """Floating point precision for intermediate (interpolated)
+        arrays, from the destination model ``float_dtype``;
+        None for non-floating point (e.g. integer) data."""
+        if np.issubdtype(self.dtype, np.floating):
+            return getattr(self.dest_model, 'float_dtype', None)
+
     @property
     def _source_grid_mask(self):
         """Boolean array indicating window in parent model grid (subset of cells)
@@ -429,14 +441,15 @@ class ArraySourceData(SourceData):
         if mask is not None:
             return regrid(source_array, self.source_modelgrid, self.dest_modelgrid,
                           mask1=mask,
-                          method=method)
+                          method=method, dtype=self._interp_dtype)
         if method == 'linear':
             parent_values = source_array.flatten()[self._source_grid_mask.flatten()]
             regridded = interpolate(parent_values,
-                                    *self.interp_weights)
+                                    *self.interp_weights,
+                                    dtype=self._interp_dtype)
         elif method == 'nearest':
             regridded = regrid(source_array, self.source_modelgrid, self.dest_modelgrid,
-                               method='nearest')
+                               method='nearest', dtype=self._interp_dtype)
         regridded = np.reshape(regridded, (self.dest_modelgrid.nrow,
                                            self.dest_modelgrid.ncol))
         return regridded
@@ -449,6 +462,7 @@ class ArraySourceData(SourceData):
             # sample "source_data" that may not be on same grid
             # TODO: add bilinear and zonal statistics methods
             if any([f.lower().endswith(i) for i in ['asc', 'tif', 'tiff', 'geotiff', 'gtiff', 'vrt']]):
+                from gisutils import get_values_at_points
                 arr = get_values_at_points(f,
                                            self.dest_model.modelgrid.xcellcenters.ravel(),
                                            self.dest_model.modelgrid.ycellcenters.ravel(),
@@ -563,7 +577,8 @@ class ArraySourceData(SourceData):
                 valid = (self.source_array > self.vmin) & (self.source_array < self.vmax)
                 mask = valid & in_window
                 heads = regrid3d(self.source_array, self.source_modelgrid, self.dest_modelgrid,
-                                 mask1=mask, method='linear')
+                                 mask1=mask, method='linear',
+                                 dtype=self._interp_dtype)
                 data = {k: heads2d for k, heads2d in enumerate(heads)}
 
         # no files or source array provided
@@ -604,12 +619,13 @@ class TransientArraySourceData(ArraySourceData, TransientSourceDataMixin):
             source_data = []
             for i, f in self.filenames.items():
                 source_data.append(self._read_array_from_file(f))
-            source_data = np.array(source_data)
+            source_data = np.array(source_data, dtype=self._interp_dtype)
             regrid = False  # data already regridded by _read_array_from_file
 
         # regrid source data from another model
         elif self.source_array is not None:
-            source_data = self.source_array * self.unit_conversion * self.mult
+            source_data = np.asarray(self.source_array * self.unit_conversion * self.mult,
+                                     dtype=self._interp_dtype)
             regrid = True
 
         # cast data to an xarray DataArray for time-sliceing
@@ -638,9 +654,19 @@ class NetCDFSourceData(ArraySourceData, TransientSourceDataMixin):
                  length_units='unknown', time_units='days', crs=None,
                  dest_model=None, source_modelgrid=None,
                  from_source_model_layers=None, datatype='transient2d',
-                 resample_method='nearest', vmin=-1e30, vmax=1e30
+                 resample_method='nearest', vmin=-1e30, vmax=1e30,
+                 evaporation_method=None
                  ):
 
+        # variable is daily air temperature in Celsius;
+        # evaporation is computed in inches per day
+        if evaporation_method is not None:
+            if evaporation_method.lower() != 'hamon':
+                raise ValueError(f"Unsupported evaporation_method: {evaporation_method}; "
+                                 "only 'hamon' is supported")
+            evaporation_method = 'hamon'
+            length_units = 'inches'
+            time_units = 'days'
         ArraySourceData.__init__(self, variable=None,
                                  length_units=length_units, time_units=time_units,
                                  dest_model=dest_model, source_modelgrid=source_modelgrid,
@@ -649,38 +675,58 @@ class NetCDFSourceData(ArraySourceData, TransientSourceDataMixin):
                                  resample_method=resample_method, vmin=vmin, vmax=vmax)
         TransientSourceDataMixin.__init__(self, period_stats=period_stats, dest_model=dest_model)
 
+        # multiple files (e.g. one per year) are combined along the time axis
         if isinstance(filenames, dict):
             filenames = list(filenames.values())
-        if isinstance(filenames, list):
-            if len(filenames) > 1:
-                raise NotImplementedError("Multiple NetCDF files not supported.")
-            self.filename = filenames[0]
-        else:
-            self.filename = filenames
+        elif not isinstance(filenames, list):
+            filenames = [filenames]
+        expanded = []
+        for f in filenames:
+            if glob.has_magic(str(f)):
+                expanded += sorted(glob.glob(str(f)))
+            else:
+                expanded.append(f)
+        if len(expanded) == 0:
+            raise ValueError(f"No NetCDF files found for {filenames}")
+        self.filenames = dict(enumerate(expanded))
+        self.filename = expanded[0]
         self.variable = variable
         self.resample_method = resample_method
         self.dest_model = dest_model
         self.time_col = 'time'
+        self.evaporation_method = evaporation_method
 
         self._crs = None
         self._specified_crs = crs
+        self._nearest_indices = None
 
         # set xy value arrays for source and dest. grids
-        with xr.open_dataset(self.filename) as ds:
-            x1, y1 = np.meshgrid(ds.x.values, ds.y.values)
-            x1 = x1.ravel()
-            y1 = y1.ravel()
-            # reproject the netcdf coords
-            # to the model CRS
-            if self.crs is not None:
-                if self.crs != self.dest_model.modelgrid.crs:
-                    x1, y1 = project((x1, y1),
-                                     self.crs,
-                                     self.dest_model.modelgrid.crs)
-            self.source_grid_xy = np.array([x1, y1]).transpose()
         x2 = self.dest_model.modelgrid.xcellcenters.ravel()
         y2 = self.dest_model.modelgrid.ycellcenters.ravel()
         self.dest_grid_xy = np.array([x2, y2]).transpose()
+        import xarray as xr
+        with xr.open_dataset(self.filename) as ds:
+            x1, y1 = np.meshgrid(ds.x.values, ds.y.values)
+        source_grid_shape = x1.shape
+        x1 = x1.ravel()
+        y1 = y1.ravel()
+        # reproject the netcdf coords
+        # to the model CRS
+        if self.crs is not None:
+            if self.crs != self.dest_model.modelgrid.crs:
+                from gisutils import project
+                x1, y1 = project((x1, y1),
+                                 self.crs,
+                                 self.dest_model.modelgrid.crs)
+        x1 = np.reshape(x1, source_grid_shape)
+        y1 = np.reshape(y1, source_grid_shape)
+        # only read the part of the source grid covering the model
+        # (plus two source cells on each side, for interpolation)
+        self.source_window = self.get_source_window(x1, y1)
+        x1 = x1[self.source_window['y'], self.source_window['x']]
+        y1 = y1[self.source_window['y'], self.source_window['x']]
+        self.source_grid_shape = x1.shape
+        self.source_grid_xy = np.array([x1.ravel(), y1.ravel()]).transpose()
 
     @property
     def interp_weights(self):
@@ -688,9 +734,82 @@ class NetCDFSourceData(ArraySourceData, TransientSourceDataMixin):
         once to speed up re-gridding of arrays to pfl_nwt."""
         if self._interp_weights is None:
             self._interp_weights = interp_weights(self.source_grid_xy,
-                                                  self.dest_grid_xy)
+                                                  self.dest_grid_xy,
+                                                  dtype=self._interp_dtype)
         return self._interp_weights
 
+    @property
+    def nearest_indices(self):
+        """Index of the nearest source grid point to each
+        destination model cell center (in the flattened source grid),
+        for nearest neighbor resampling. Only calculated once."""
+        if self._nearest_indices is None:
+            tree = cKDTree(self.source_grid_xy)
+            _, self._nearest_indices = tree.query(self.dest_grid_xy)
+        return self._nearest_indices
+
+    def get_source_window(self, x, y, pad_cells=2):
+        """Get the rows and columns of the source grid that cover
+        the destination model, so that only those are read.
+
+        Parameters
+        ----------
+        x, y : 2D ndarrays
+            Source grid cell center coordinates, in the model CRS.
+        pad_cells : int
+            Number of source cells to include beyond the model area,
+            so that values can be interpolated to cells near the model edge.
+            By default, 2.
+
+        Returns
+        -------
+        window : dict
+            Slices for the 'y' and 'x' dimensions
+            (e.g. for :meth:`xarray.DataArray.isel`).
+        """
+        window = {'y': slice(None), 'x': slice(None)}
+        spacing = [np.nanmax(np.hypot(np.diff(x, axis=axis), np.diff(y, axis=axis)))
+                   for axis in (0, 1) if x.shape[axis] > 1]
+        pad = pad_cells * max(spacing, default=0)
+        xmin, ymin = self.dest_grid_xy.min(axis=0) - pad
+        xmax, ymax = self.dest_grid_xy.max(axis=0) + pad
+        covers_model = (x >= xmin) & (x <= xmax) & (y >= ymin) & (y <= ymax)
+        if covers_model.any():
+            rows = np.where(covers_model.any(axis=1))[0]
+            cols = np.where(covers_model.any(axis=0))[0]
+            window = {'y': slice(rows[0], rows[-1] + 1),
+                      'x': slice(cols[0], cols[-1] + 1)}
+        return window
+
+    def open_data(self):
+        """Lazily open the variable in the NetCDF file(s),
+        subset to the source window. Multiple files
+        are opened with :func:`xarray.open_mfdataset`, with one dask chunk
+        per file, if dask is installed. Otherwise, the windowed data
+        from each file are read into memory and combined.
+
+        Returns
+        -------
+        data : xarray.DataArray
+        """
+        import xarray as xr
+        filenames = list(self.filenames.values())
+        if len(filenames) == 1:
+            ds = xr.open_dataset(self.filename)
+            return ds[self.variable].isel(self.source_window)
+        if importlib.util.find_spec('dask') is not None:
+            ds = xr.open_mfdataset(filenames, combine='by_coords',
+                                   data_vars='minimal', coords='minimal',
+                                   compat='override')
+            return ds[self.variable].isel(self.source_window)
+        datasets = [xr.open_dataset(f)[[self.variable]].isel(self.source_window)
+                    for f in filenames]
+        check_memory_budget(sum(ds.nbytes for ds in datasets),
+                            f'Reading {self.variable} from {len(filenames)} '
+                            'NetCDF files (without dask)')
+        ds = xr.combine_by_coords(datasets)
+        return ds[self.variable]
+
     @property
     def crs(self):
         """Try to make a valid pyproj.CRS instance from
@@ -705,6 +824,7 @@ class NetCDFSourceData(ArraySourceData, TransientSourceDataMixin):
             specified_crs = pyproj.CRS(self._specified_crs)
             self._specified_crs = specified_crs
         if self._crs is None:
+            import xarray as xr
             with xr.open_dataset(self.filename) as ds:
                 crs_da = getattr(ds, 'crs', None)
             if crs_da is not None:
@@ -737,41 +857,57 @@ class NetCDFSourceData(ArraySourceData, TransientSourceDataMixin):
         source_array : ndarray
             Values from source model to be interpolated to destination grid.
             1 or 2-D numpy array of same sizes as a
-            layer of the source model.
+            layer of the source model, or a 3-D stack of
+            these (e.g. one for each stress period).
         method : str ('linear', 'nearest')
             Interpolation method.
+
+        Returns
+        -------
+        regridded : ndarray
+            2-D array of the model grid shape, or a 3-D
+            stack of them if source_array was a stack.
         """
-        values = source_array.flatten()
+        values = np.asarray(source_array, dtype=self._interp_dtype)
+        nsource = len(self.source_grid_xy)
+        stacked = values.reshape(-1, nsource)
         if method == 'linear':
-            regridded = interpolate(values,
-                                    *self.interp_weights)
+            regridded = np.array([interpolate(layer_values,
+                                              *self.interp_weights,
+                                              dtype=self._interp_dtype)
+                                  for layer_values in stacked])
         elif method == 'nearest':
-            regridded = griddata(self.source_grid_xy, values, self.dest_grid_xy, method=method)
-        regridded = np.reshape(regridded, (self.dest_model.nrow,
-                                           self.dest_model.ncol))
-        return regridded
+            regridded = stacked[:, self.nearest_indices]
+        shape = (self.dest_model.nrow, self.dest_model.ncol)
+        if values.size > nsource:
+            shape = (len(stacked),) + shape
+        return np.reshape(regridded, shape)
 
     def get_data(self):
 
         # create an xarray dataset instance
-        ds = xr.open_dataset(self.filename)
-        data = ds[self.variable]
+        data = self.open_data()
 
         # sample values to model stress periods
+        if self.evaporation_method == 'hamon':
+            # latitudes of the NetCDF cell centers
+            x, y = [np.reshape(values, self.source_grid_shape)
+                    for values in self.source_grid_xy.transpose()]
+            latitude = grid_latitude(x, y, crs=self.dest_model.modelgrid.crs)
+            aggregated_by_period = dict(hamon_evaporation_by_period(
+                data, latitude, self.period_stats,
+                datetime_coords_name=self.time_col))
+        else:
+            aggregated_by_period = aggregate_xarray_to_stress_periods(
+                data, self.period_stats, datetime_coords_name=self.time_col)
         results = {}
-        for kper, period_stat in self.period_stats.items():
-            if period_stat is None:
-                continue
-            aggregated = aggregate_xarray_to_stress_period(data,
-                                                           datetime_coords_name=self.time_col,
-                                                           **period_stat)
-            # sample the data onto the model grid
-            resampled = self.regrid_from_source(aggregated,
+        if len(aggregated_by_period) > 0:
+            # sample the data for all periods onto the model grid at once
+            resampled = self.regrid_from_source(np.stack(list(aggregated_by_period.values())),
                                                 method=self.resample_method)
-            # reshape results to model grid
-            period_mean2d = resampled.reshape(self.dest_model.nrow,
-                                              self.dest_model.ncol)
-            results[kper] = period_mean2d * self.unit_conversion
+            resampled = resampled.reshape(-1, self.dest_model.nrow, self.dest_model.ncol)
+            for kper, period_mean2d in zip(aggregated_by_period.keys(), resampled):
+                results[kper] = period_mean2d * self.unit_conversion
         self.data = results
         return results
 
@@ -920,7 +1056,8 @@ class MFBinaryArraySourceData(ArraySourceData):
             valid = (self.source_array > self.vmin) & (self.source_array < self.vmax)
             mask = valid & in_window
             heads = regrid3d(self.source_array, self.source_modelgrid, self.dest_modelgrid,
-                             mask1=mask, method='linear')
+                             mask1=mask, method='linear',
+                             dtype=self._interp_dtype)
             data = {k: heads2d for k, heads2d in enumerate(heads)}
 
         self.data = data
@@ -1021,6 +1158,7 @@ class TabularSourceData(SourceData):
             if f.endswith('.shp') or f.endswith('.dbf'):
                 # implement automatic reprojection in gis-utils
                 # maintaining backwards compatibility
+                from gisutils import shp2df
                 kwargs = {'dest_crs': self.dest_model.modelgrid.crs}
                 kwargs = get_input_arguments(kwargs, shp2df)
                 df = shp2df(f, **kwargs)
@@ -1087,6 +1225,7 @@ class TransientTabularSourceData(SourceData, TransientSourceDataMixin):
             if str(f).endswith('.shp') or str(f).endswith('.dbf'):
                 # implement automatic reprojection in gis-utils
                 # maintaining backwards compatibility
+                from gisutils import shp2df
                 kwargs = {'dest_crs': self.dest_model.modelgrid.crs}
                 kwargs = get_input_arguments(kwargs, shp2df)
                 df = shp2df(f, **kwargs)
@@ -1110,12 +1249,19 @@ class TransientTabularSourceData(SourceData, TransientSourceDataMixin):
         has_locations = False
         if 'geometry' not in df.columns or isinstance(df.geometry.iloc[0], str):
             if self.x_col in df.columns and self.y_col in df.columns:
-                df['geometry'] = [Point(x, y) for x, y in zip(df[self.x_col], df[self.y_col])]
                 has_locations = True
+                within = points_within(df[self.x_col], df[self.y_col],
+                                       self.dest_model.bbox)
+                df = df.loc[within].copy()
+                df['geometry'] = [Point(x, y) for x, y in zip(df[self.x_col], df[self.y_col])]
         else:
             has_locations = True
-        if has_locations:
-            within = [g.within(self.dest_model.bbox) for g in df.geometry]
+            geoms = np.asarray(df.geometry.values, dtype=object)
+            if np.all(shapely.get_type_id(geoms) == shapely.GeometryType.POINT):
+                within = points_within(shapely.get_x(geoms), shapely.get_y(geoms),
+                                       self.dest_model.bbox)
+            else:
+                within = shapely.within(geoms, self.dest_model.bbox)
             df = df.loc[within]
         if self.end_datetime_column is None:
             msg = '\n'.join(self.filenames.values()) + ':\n'
@@ -1124,20 +1270,13 @@ class TransientTabularSourceData(SourceData, TransientSourceDataMixin):
                     'upsampled correctly, as dates in the datetime_column are used for '
                     'intersection with model stress periods.')
             warnings.warn(msg)
-        period_data = []
-        for kper, period_stat in self.period_stats.items():
-            if period_stat is None:
-                continue
-            aggregated = aggregate_dataframe_to_stress_period(df, id_column=self.id_column,
-                                                              datetime_column=self.datetime_column,
-                                                              end_datetime_column=self.end_datetime_column,
-                                                              data_column=self.data_columns,
-                                                              category_column=self.category_column,
-                                                              resolve_duplicates_with=self.resolve_duplicates_with,
-                                                              **period_stat)
-            aggregated['per'] = kper
-            period_data.append(aggregated)
-        dfm = pd.concat(period_data)
+        dfm = aggregate_dataframe_to_stress_periods(df, id_column=self.id_column,
+                                                    datetime_column=self.datetime_column,
+                                                    end_datetime_column=self.end_datetime_column,
+                                                    data_column=self.data_columns,
+                                                    category_column=self.category_column,
+                                                    resolve_duplicates_with=self.resolve_duplicates_with,
+                                                    period_stats=self.period_stats)
 
         if self.data_columns is not None:
             for col in self.data_columns:
@@ -1157,6 +1296,28 @@ class TransientTabularSourceData(SourceData, TransientSourceDataMixin):
         return dfm
 
 
+def to_float64(data):
+    """Cast any reduced-precision floating point arrays
+    in a dictionary of source data (produced with
+    ``mfsetup_options: dtype: float32``) back to double precision,
+    so that model input is always written as float64.
+
+    Parameters
+    ----------
+    data : dict
+        Dictionary of arrays (e.g. by layer or stress period),
+        as returned by a SourceData ``get_data()`` method.
+
+    Returns
+    -------
+    data : dict
+    """
+    return {k: v.astype(np.float64) if isinstance(v, np.ndarray)
+            and np.issubdtype(v.dtype, np.floating) else v
+            for k, v in data.items()}
+
+
+@timed('setup_array')
 def setup_array(model, package, var, data=None,
                 vmin=-1e30, vmax=1e30, datatype=None,
                 source_model=None, source_package=None,
@@ -1376,7 +1537,10 @@ def setup_array(model, package, var, data=None,
         print('No data were specified for {} package, variable {}'.format(package, var))
         return
 
-    data = sd.get_data()
+    # record the time and memory used by each source data instance
+    with span(f'{type(sd).__name__}.get_data', variable=var):
+        data = to_float64(sd.get_data())
+    add_counts(cells=int(sum(np.size(arr) for arr in data.values())))
 
     # special handling of some variables
     # (for lakes)
@@ -1635,6 +1799,7 @@ def get_source_data_file_ext(cfg_data, package, var):
 
 
 def transient2d_to_xarray(data, x=None, y=None, time=None):
+    import xarray as xr
     if x is None:
         x = np.arange(data.shape[2])
     if y is None:
@@ -419,6 +419,7 @@ def setup_perioddata(model,
                      steady=None, time_units='days',
                      oc_saverecord=None, parent_model=None,
                      parent_stress_periods=None,
+                     max_nper=None,
                      ):
     """Sets up the perioddata DataFrame that is used to reference model
     stress period start and end times to real date time.
@@ -458,6 +459,10 @@ def setup_perioddata(model,
         Parent model stress periods to apply to the inset model
         (read from the parent: copy_stress_periods: item in the
         configuration file).
+    max_nper : int, optional
+        Option to only include the first ``max_nper`` stress periods
+        (for example, in a preview build of the model).
+        By default, None (include all stress periods).
 
     Returns
     -------
@@ -558,6 +563,11 @@ def setup_perioddata(model,
 
         # add corresponding stress periods in parent model if there are any
         perioddata['parent_sp'] = parent_sp
+
+    if max_nper is not None and len(perioddata) > max_nper:
+        print(f'limiting the simulation to the first {max_nper} stress periods '
+              f'(of {len(perioddata)})...')
+        perioddata = perioddata.iloc[:max_nper].copy()
     assert np.array_equal(perioddata['per'].values, np.arange(len(perioddata)))
     return perioddata
 
@@ -766,10 +776,240 @@ def aggregate_dataframe_to_stress_period(data, id_column, data_column, datetime_
     return aggregated
 
 
-def aggregate_xarray_to_stress_period(data, datetime_coords_name='time',
-                                      start_datetime=None, end_datetime=None,
-                                      period_stat='mean'):
+def aggregate_dataframe_to_stress_periods(data, id_column, data_column, period_stats,
+                                          datetime_column='datetime',
+                                          end_datetime_column=None, category_column=None,
+                                          resolve_duplicates_with='raise error'):
+    """Aggregate time-series data in a DataFrame to multiple stress periods at once.
+    Equivalent to calling :func:`aggregate_dataframe_to_stress_period` for each
+    period and concatenating the results, but the data are only copied and sorted once.
+    Periods defined by a start and end time (the default) are joined to the data
+    with :func:`numpy.searchsorted`, and the statistics for all of these
+    periods are computed in one groupby. Periods defined by a month or
+    other pandas date string (see ``period_stat`` in
+    :func:`aggregate_dataframe_to_stress_period`) are aggregated individually.
+
+    Parameters
+    ----------
+    data : DataFrame
+        Must have an id_column, data_column, datetime_column, and optionally,
+        an end_datetime_column.
+    id_column : str
+        Column in data with location identifier (e.g. node or well id).
+    data_column : str or list
+        Column(s) in data with values to aggregate.
+    period_stats : dict
+        Aggregation input for each stress period, keyed by period,
+        with the keyword arguments to :func:`aggregate_dataframe_to_stress_period`
+        (``period_stat``, ``start_datetime`` and ``end_datetime``),
+        as produced by :meth:`mfsetup.sourcedata.SourceData.get_period_stats`.
+        Periods with input of None are skipped.
+    datetime_column : str
+    end_datetime_column : str
+    category_column : str
+    resolve_duplicates_with : {'sum', 'mean', 'first', 'raise error'}
+        See :func:`aggregate_dataframe_to_stress_period`.
+
+    Returns
+    -------
+    aggregated : DataFrame
+        Aggregated values for each stress period, with the period number
+        in a 'per' column.
+    """
+    if isinstance(data_column, str):
+        data_columns = [data_column]
+    else:
+        data_columns = list(data_column)
+
+    # periods defined by start and end times
+    interval_periods = {}
+    other_results = []
+    for kper, period_stat in period_stats.items():
+        if period_stat is None:
+            continue
+        stat = period_stat.get('period_stat')
+        if stat is None or isinstance(stat, str) or len(stat) == 1:
+            interval_periods[kper] = period_stat
+        else:
+            aggregated = aggregate_dataframe_to_stress_period(
+                data, id_column=id_column, data_column=data_column,
+                datetime_column=datetime_column,
+                end_datetime_column=end_datetime_column,
+                category_column=category_column,
+                resolve_duplicates_with=resolve_duplicates_with,
+                **period_stat)
+            aggregated['per'] = kper
+            other_results.append(aggregated)
+    if len(interval_periods) == 0:
+        return pd.concat(other_results).reset_index(drop=True)
+
+    assert datetime_column in data.columns, \
+        "datetime_column needed for " \
+        "resampling irregular data to model stress periods"
+    data = data.reset_index(drop=True)
+    starts = pd.to_datetime(data[datetime_column])
+    order = np.argsort(starts.values, kind='stable')
+    data = data.iloc[order].reset_index(drop=True)
+    data[datetime_column] = starts.values[order]
+    starts = data[datetime_column].values
+    has_end_times = end_datetime_column in data.columns
+    if has_end_times:
+        data[end_datetime_column] = pd.to_datetime(data[end_datetime_column])
+        ends = data[end_datetime_column].values
+        missing_ends = np.isnat(ends)
+
+    # period start, end and statistic
+    # (by default, the start and end of the data)
+    kpers = np.array(list(interval_periods.keys()))
+    period_starts = pd.to_datetime(
+        [starts[0] if ps.get('start_datetime') is None else ps['start_datetime']
+         for ps in interval_periods.values()]).values
+    period_ends = pd.to_datetime(
+        [starts[-1] if ps.get('end_datetime') is None else ps['end_datetime']
+         for ps in interval_periods.values()]).values
+    period_stat_names = []
+    for ps in interval_periods.values():
+        stat = ps.get('period_stat')
+        if stat is None:
+            stat = 'mean'
+        elif not isinstance(stat, str):
+            stat = stat[0]
+        period_stat_names.append(stat)
+
+    # split the periods into chains with increasing start and end times,
+    # so that the periods overlapping each record are a contiguous slice
+    chains = []
+    for p in np.lexsort((period_ends, period_starts)):
+        for chain in chains:
+            if period_ends[chain[-1]] <= period_ends[p]:
+                chain.append(p)
+                break
+        else:
+            chains.append([p])
+
+    # join the records to the periods they overlap
+    rows = []
+    periods = []
+    for chain in chains:
+        chain = np.array(chain)
+        chain_starts = period_starts[chain]
+        chain_ends = period_ends[chain]
+        if not has_end_times:
+            # records with start_datetime <= time < end_datetime
+            first = np.searchsorted(chain_ends, starts, side='right')
+            last = np.searchsorted(chain_starts, starts, side='right')
+        # if some end times are missing, records without one
+        # are assumed to extend through the period
+        elif missing_ends.any():
+            first = np.searchsorted(chain_ends, starts, side='right')
+            last = np.searchsorted(chain_starts, ends, side='right')
+            if end_datetime_column == 'end_datetime':
+                last[missing_ends] = len(chain)
+            else:
+                last[missing_ends] = 0
+        # otherwise, records that overlap in time with the period
+        else:
+            first = np.searchsorted(chain_ends, starts, side='right')
+            last = np.searchsorted(chain_starts, ends, side='left')
+        counts = np.maximum(last - first, 0)
+        chain_rows = np.repeat(np.arange(len(data)), counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        rows.append(chain_rows)
+        periods.append(chain[np.repeat(first, counts) + offsets])
+    rows = np.concatenate(rows)
+    periods = np.concatenate(periods)
+    # keep the records in time order within each period
+    sort = np.lexsort((rows, periods))
+    rows, periods = rows[sort], periods[sort]
+    period_data = data.iloc[rows].reset_index(drop=True)
+    period_data['per'] = kpers[periods]
+    if has_end_times and missing_ends.any() and end_datetime_column == 'end_datetime':
+        period_data.loc[missing_ends[rows], 'end_datetime'] = period_ends[periods][missing_ends[rows]]
+
+    # create category column if there is none, to conform to logic below
+    categories = False
+    if category_column is None:
+        category_column = 'category'
+        period_data[category_column] = 'measured'
+    elif category_column not in period_data.columns:
+        raise KeyError('category_column: {} not in data'.format(category_column))
+    else:
+        categories = True
+
+    # check for duplicates with same time, id, and category (measured vs estimated)
+    # in each period
+    duplicated = period_data.duplicated(subset=['per', datetime_column,
+                                                id_column, category_column])
+    aggregated = period_data.groupby(['per', id_column]).first()
+    if duplicated.any():
+        if resolve_duplicates_with == 'raise error':
+            duplicate_info = period_data.loc[duplicated.values]
+            msg = 'The following locations are duplicates which need to be resolved:\n{}'.format(duplicate_info.__str__())
+            raise ValueError(msg)
+        by_time = period_data.groupby(['per', id_column, datetime_column])
+        resolved = by_time.first().reset_index()
+        resolved[data_columns] = getattr(by_time[data_columns], resolve_duplicates_with)().values
+        period_data = resolved
+    # compute the statistic for all periods with the same statistic at once
+    stat_per_period = dict(zip(kpers, period_stat_names))
+    period_data_stats = period_data['per'].map(stat_per_period)
+    if len(period_data) > 0:
+        agg_groupedby = pd.concat(
+            [getattr(stat_data.groupby(['per', id_column])[data_columns], stat)()
+             for stat, stat_data in period_data.groupby(period_data_stats)])
+        aggregated[data_columns] = agg_groupedby.reindex(aggregated.index)
+    # if category column was argued, get counts of measured vs estimated
+    # for each measurement location, for each stress period
+    if categories:
+        counts = period_data.groupby(['per', id_column, category_column]).size().unstack(fill_value=0)
+        for col in 'measured', 'estimated':
+            if col not in counts.columns:
+                counts[col] = 0
+            aggregated['n_{}'.format(col)] = counts[col]
+    aggregated.reset_index(inplace=True)
+
+    # periods are represented by their start dates
+    per = aggregated.pop('per')
+    aggregated['start_datetime'] = per.map(dict(zip(kpers, period_starts)))
+    for col in 'start_datetime', 'end_datetime':
+        if col in aggregated.columns:
+            aggregated[col] = aggregated[col].astype('datetime64[ns]')
+    drop_cols = [datetime_column]
+    if not categories:  # drop category column if it was created
+        drop_cols.append(category_column)
+    aggregated.drop(drop_cols, axis=1, inplace=True)
+    aggregated['per'] = per
+    results = [aggregated] + other_results
+    return pd.concat(results).reset_index(drop=True)
+
+
+def select_xarray_period(data, datetime_coords_name='time',
+                         start_datetime=None, end_datetime=None,
+                         period_stat='mean'):
+    """Select the times in an xarray DataArray that are
+    aggregated to a stress period. The selection is not
+    loaded into memory, so that lazily loaded or dask-backed
+    data can be aggregated in blocks.
+
+    Parameters
+    ----------
+    data : xarray.DataArray
+    datetime_coords_name : str
+        Name of the time coordinate in data.
+    start_datetime, end_datetime : str or pandas.Timestamp
+        Start and end times of the stress period; only used if
+        an aggregation period is not specified in period_stat.
+    period_stat : str, list, or NoneType
+        Method for aggregating data. See
+        :func:`aggregate_dataframe_to_stress_period`.
 
+    Returns
+    -------
+    stat : str
+        Name of the numpy method for aggregating the selection (e.g. 'mean')
+    selected : xarray.DataArray
+        data for the times in the aggregation period
+    """
     period_stat = copy.copy(period_stat)
     if isinstance(start_datetime, pd.Timestamp):
         start_datetime = start_datetime.strftime('%Y-%m-%d')
@@ -786,18 +1026,18 @@ def aggregate_xarray_to_stress_period(data, datetime_coords_name='time',
         # stat for specified period
         if len(period_stat) == 2:
             start, end = period_stat
-            arr = data.loc[start:end].values
+            selected = data.loc[start:end]
 
         # stat specified by single item
         elif len(period_stat) == 1:
             period = period_stat.pop()
             # stat for a specified month
             if period in months.keys() or period in months.values():
-                arr = data.loc[data[datetime_coords_name].dt.month == months.get(period, period)].values
+                selected = data.loc[data[datetime_coords_name].dt.month == months.get(period, period)]
 
             # stat for a period specified by single string (e.g. '2014', '2014-01', etc.)
             else:
-                arr = data.loc[period].values
+                selected = data.loc[period]
 
         # no period specified; use start/end of current period
         elif len(period_stat) == 0:
@@ -819,17 +1059,127 @@ def aggregate_xarray_to_stress_period(data, datetime_coords_name='time',
             # for tabular data (pandas)
             # assume that xarray data does not have an end_datetime column
             # (infer the end datetimes)
-            arr = data.loc[start_datetime:end_datetime].values
+            selected = data.loc[start_datetime:end_datetime]
 
         else:
             raise Exception("")
 
+    return stat, selected
+
+
+def aggregate_xarray_to_stress_period(data, datetime_coords_name='time',
+                                      start_datetime=None, end_datetime=None,
+                                      period_stat='mean'):
+
+    stat, selected = select_xarray_period(data,
+                                          datetime_coords_name=datetime_coords_name,
+                                          start_datetime=start_datetime,
+                                          end_datetime=end_datetime,
+                                          period_stat=period_stat)
+    arr = selected.values
+
     # compute statistic on data
     aggregated = getattr(arr, stat)(axis=0)
 
     return aggregated
 
 
+def aggregate_xarray_to_stress_periods(data, period_stats, datetime_coords_name='time'):
+    """Aggregate an xarray DataArray to multiple stress periods at once.
+    Equivalent to calling :func:`aggregate_xarray_to_stress_period`
+    for each period, but periods that are contiguous time slices
+    (defined by a start and end time) are labeled and reduced together
+    in one groupby, so that lazily loaded or dask-backed data are only
+    read once. Repeated time slices are only aggregated once.
+    Periods that select by month or other pandas date strings
+    (or that don't include any times) are aggregated individually.
+
+    Parameters
+    ----------
+    data : xarray.DataArray
+        Data with a time dimension first (e.g. time, y, x).
+    period_stats : dict
+        Aggregation input by stress period, as keyword arguments
+        to :func:`select_xarray_period`
+        (for example, ``TransientSourceDataMixin.period_stats``).
+        Periods with input of None are skipped.
+    datetime_coords_name : str
+        Name of the time coordinate in data. By default, 'time'.
+
+    Returns
+    -------
+    aggregated : dict
+        Aggregated values (ndarrays) by stress period.
+    """
+    times = data.indexes[datetime_coords_name]
+    # time slices for each statistic {stat: {(start, stop): [kper, ...]}}
+    slices = {}
+    other_periods = {}
+    for kper, period_stat in period_stats.items():
+        if period_stat is None:
+            continue
+        stat_input = period_stat.get('period_stat')
+        if stat_input is None:
+            stat_input = ['mean']
+        elif isinstance(stat_input, str):
+            stat_input = [stat_input]
+        stat, *period = stat_input
+        # start and end of the current model period
+        if len(period) == 0:
+            start = period_stat.get('start_datetime')
+            end = period_stat.get('end_datetime')
+            if isinstance(start, pd.Timestamp):
+                start = start.strftime('%Y-%m-%d')
+            if isinstance(end, pd.Timestamp):
+                end = end.strftime('%Y-%m-%d')
+            if start is None:
+                start = times[0]
+            if end is None:
+                end = times[-1]
+        # specified start and end dates
+        elif len(period) == 2:
+            start, end = period
+        else:
+            start = end = None
+        if start is not None and times.is_monotonic_increasing:
+            selection = times.slice_indexer(start, end)
+            if selection.stop - selection.start > 0:
+                key = (selection.start, selection.stop)
+                slices.setdefault(stat, {}).setdefault(key, []).append(kper)
+                continue
+        other_periods[kper] = period_stat
+
+    results = {}
+    for stat, stat_slices in slices.items():
+        # split the slices into sets that don't overlap,
+        # so that each time is in at most one group
+        chains = []
+        for key in sorted(stat_slices):
+            for chain in chains:
+                if chain[-1][1] <= key[0]:
+                    chain.append(key)
+                    break
+            else:
+                chains.append([key])
+        for chain in chains:
+            labels = np.full(len(times), -1)
+            for group, (start, stop) in enumerate(chain):
+                labels[start:stop] = group
+            in_chain = labels >= 0
+            selected = data.isel({datetime_coords_name: in_chain})
+            groups = selected[datetime_coords_name].copy(data=labels[in_chain])
+            aggregated = selected.groupby(groups.rename('period')).reduce(
+                lambda arr, axis: getattr(arr, stat)(axis=axis),
+                dim=datetime_coords_name).values
+            for key, values in zip(chain, aggregated):
+                for kper in stat_slices[key]:
+                    results[kper] = values
+    for kper, period_stat in other_periods.items():
+        results[kper] = aggregate_xarray_to_stress_period(
+            data, datetime_coords_name=datetime_coords_name, **period_stat)
+    return {kper: results[kper] for kper in sorted(results)}
+
+
 def add_date_comments_to_tdis(tdis_file, start_dates, end_dates=None):
     """Add stress period start and end dates to a tdis file as comments;
     add modflow-setup version info to tdis file header.
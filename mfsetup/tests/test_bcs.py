@@ -1,8 +1,17 @@
 import os
 
+import flopy
 import numpy as np
-
-from mfsetup.bcs import get_bc_package_cells, remove_inactive_bcs
+import pandas as pd
+import pytest
+
+from mfsetup.bcs import (
+    get_bc_package_cells,
+    get_period_hashes,
+    mftransientlist_to_dataframe,
+    remove_inactive_bcs,
+    setup_flopy_stress_period_data,
+)
 from mfsetup.fileio import read_mf6_block
 from mfsetup.testing import dtypeisinteger
 
@@ -133,3 +142,95 @@ def test_remove_inactive_bcs(basic_model_instance):
         perioddata = read_mf6_block(m.chd.filename, 'period')
         for per, data in perioddata.items():
             assert data[0].split()[0].strip() == 'open/close'
+
+
+def test_binary_stress_period_data(get_pleasant_mf6_with_dis):
+    m = get_pleasant_mf6_with_dis
+    m.cfg['chd']['mfsetup_options']['binary'] = True
+    with pytest.warns(UserWarning, match='boundnames'):
+        m.setup_chd(**m.cfg['chd'], **m.cfg['chd']['mfsetup_options'])
+    external_files = m.cfg['chd']['stress_period_data']
+    assert all(f['binary'] for f in external_files.values())
+    # one-based k, i, j and the head in each record
+    dtype = [('k', np.int32), ('i', np.int32), ('j', np.int32),
+             ('head', np.float64)]
+    records = np.fromfile(external_files[0]['filename'], dtype=dtype)
+    spd = m.chd.stress_period_data.data[0]
+    assert np.array_equal(records['k'] - 1, [cellid[0] for cellid in spd['cellid']])
+    assert np.allclose(records['head'], spd['head'])
+
+    remove_inactive_bcs(m.chd, external_files=external_files)
+    m.chd.write()
+    perioddata = read_mf6_block(m.chd.filename, 'period')
+    for per, data in perioddata.items():
+        assert data[0].split()[0].strip() == 'open/close'
+        assert data[0].split()[-1].strip() == '(binary)'
+
+
+@pytest.fixture
+def repeated_period_data():
+    """Stress period data where periods 1, 3 and 4 repeat period 0,
+    with period 4 in a different order."""
+    period_a = pd.DataFrame({'k': [0, 0, 1], 'i': [5, 6, 7], 'j': [10, 11, 12],
+                             'head': [300., 301., 302.]})
+    period_b = period_a.assign(head=period_a['head'] + 1)
+    dfs = []
+    for per, period_data in enumerate([period_a, period_a, period_b,
+                                       period_a, period_a.iloc[::-1]]):
+        dfs.append(period_data.assign(per=per))
+    return pd.concat(dfs, ignore_index=True)
+
+
+def test_get_period_hashes(repeated_period_data):
+    hashes = get_period_hashes(repeated_period_data)
+    assert list(hashes.keys()) == [0, 1, 2, 3, 4]
+    assert hashes[0] == hashes[1] == hashes[3] == hashes[4]
+    assert hashes[2] != hashes[0]
+
+
+def test_setup_flopy_stress_period_data_deduplication(get_pleasant_mf6_with_dis,
+                                                      repeated_period_data):
+    m = get_pleasant_mf6_with_dis
+    setup_flopy_stress_period_data(m, 'chd', repeated_period_data,
+                                   flopy_package_class=flopy.mf6.ModflowGwfchd,
+                                   variable_columns=['head'],
+                                   external_filename_fmt='chd_{:03d}.dat')
+    external_files = m.cfg['chd']['stress_period_data']
+    # period 1 and 4 repeat the previous period; period 3 repeats period 0
+    assert list(external_files.keys()) == [0, 2, 3]
+    assert external_files[3]['filename'] == external_files[0]['filename']
+    assert m.cfg['external_files']['chd_stress_period_data'] == \
+        {per: f['filename'] for per, f in external_files.items()}
+
+    spd = setup_flopy_stress_period_data(m, 'chd', repeated_period_data,
+                                         flopy_package_class=flopy.mf6.ModflowGwfchd,
+                                         variable_columns=['head'],
+                                         external_files=False)
+    assert list(spd.keys()) == [0, 2, 3]
+
+
+def test_mftransientlist_to_dataframe(tmpdir):
+    sim = flopy.mf6.MFSimulation(sim_ws=str(tmpdir))
+    flopy.mf6.ModflowTdis(sim, nper=3)
+    gwf = flopy.mf6.ModflowGwf(sim, modelname='model')
+    flopy.mf6.ModflowGwfdis(gwf, nlay=2, nrow=12, ncol=12)
+    # two wells in cell (1, 10, 2) in periods 0 and 1
+    spd = {0: [((0, 0, 1), -1.), ((1, 10, 2), -2.), ((1, 10, 2), -3.)],
+           2: [((0, 0, 1), -4.)]}
+    spd[1] = spd[0]
+    wel = flopy.mf6.ModflowGwfwel(gwf, stress_period_data=spd)
+
+    df = mftransientlist_to_dataframe(wel.stress_period_data, squeeze=False)
+    assert df.columns.tolist() == ['cellid', 'k', 'i', 'j', 'q0', 'q1', 'q2']
+    assert df['cellid'].tolist() == [(0, 0, 1), (1, 10, 2)]
+    for col in 'k', 'i', 'j':
+        assert dtypeisinteger(df[col].dtype)
+    assert np.allclose(df['q0'], [-1, -5])
+    assert np.allclose(df['q1'], [-1, -5])
+    assert df['q2'].values[0] == -4
+    assert np.isnan(df['q2'].values[1])
+
+    # only periods where the data change
+    df = mftransientlist_to_dataframe(wel.stress_period_data, squeeze=True)
+    assert df.columns.tolist() == ['cellid', 'k', 'i', 'j', 'q0', 'q2']
+    assert np.allclose(df['q2'], [-4, 0])
@@ -1,6 +1,7 @@
 import numpy as np
 import pandas as pd
 import pytest
+from flopy.utils.lgrutil import Lgr
 
 from mfsetup.discretization import (
     create_vertical_pass_through_cells,
@@ -10,6 +11,7 @@ from mfsetup.discretization import (
     find_remove_isolated_cells,
     fix_model_layer_conflicts,
     get_layer_thicknesses,
+    get_lgr_exchange_data,
     make_ibound,
     make_idomain,
     make_irch,
@@ -365,3 +367,30 @@ def test_make_irch(shellmound_model_with_dis):
     idm_argmax = np.argmax(m.idomain, axis=0)
     assert np.allclose(written_irch, irch)
     assert np.allclose(written_irch, idm_argmax + 1)
+
+
+@pytest.mark.parametrize('ncpp,ncppl', ((3, [1, 1, 0]),
+                                        (5, [2, 1, 3]),
+                                        ))
+def test_get_lgr_exchange_data(ncpp, ncppl):
+    rng = np.random.default_rng(0)
+    nlay, nrow, ncol = 3, 8, 10
+    idomain = np.ones((nlay, nrow, ncol), dtype=int)
+    idomain[:np.sum(np.array(ncppl) > 0), 2:6, 3:8] = 0
+    top = 100 + rng.random((nrow, ncol))
+    botm = np.stack([top - 10 * (k + 1) - rng.random((nrow, ncol))
+                     for k in range(nlay)])
+    delr = rng.uniform(50, 150, ncol)
+    delc = rng.uniform(50, 150, nrow)
+    lgr = Lgr(nlay, nrow, ncol, delr, delc, top, botm, idomain, ncpp, ncppl)
+
+    expected = lgr.get_exchange_data(angldegx=True, cdist=True)
+    results = get_lgr_exchange_data(lgr)
+    assert len(results) == len(expected)
+    assert np.array_equal(results[['k1', 'i1', 'j1']].values,
+                          [exg[0] for exg in expected])
+    assert np.array_equal(results[['k2', 'i2', 'j2']].values,
+                          [exg[1] for exg in expected])
+    assert np.allclose(results[['ihc', 'cl1', 'cl2', 'hwva',
+                                'angldegx', 'cdist']].values,
+                       [exg[2:] for exg in expected])
@@ -0,0 +1,126 @@
+"""
+Tests for the ensemble module
+"""
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from mfsetup.ensemble import _link_workspace, set_cfg_value, setup_ensemble
+from mfsetup.fileio import load_cfg
+from mfsetup.mfnwtmodel import MFnwtModel
+
+
+def test_set_cfg_value():
+    cfg = {'npf': {'source_data': {'k': {'filenames': {0: 'k0.tif'}}}},
+           'oc': {'period_input': {}}}
+    set_cfg_value(cfg, 'npf.source_data.k.mult', 2.)
+    assert cfg['npf']['source_data']['k']['mult'] == 2.
+    # integer keys
+    set_cfg_value(cfg, 'npf.source_data.k.filenames.0', 'k0b.tif')
+    assert cfg['npf']['source_data']['k']['filenames'] == {0: 'k0b.tif'}
+    set_cfg_value(cfg, 'npf.source_data.k.filenames.1', 'k1.tif')
+    assert cfg['npf']['source_data']['k']['filenames'][1] == 'k1.tif'
+    # new blocks
+    set_cfg_value(cfg, 'rch.source_data.recharge.mult', 0.5)
+    assert cfg['rch'] == {'source_data': {'recharge': {'mult': 0.5}}}
+
+
+@pytest.mark.parametrize('link', (True, False))
+def test_link_workspace(tmpdir, link):
+    base_ws = Path(tmpdir, 'link_workspace/base')
+    scratch_ws = Path(tmpdir, 'link_workspace/scratch')
+    variant_ws = Path(tmpdir, f'link_workspace/variant_{link}')
+    for ws in base_ws, scratch_ws:
+        (ws / 'external').mkdir(parents=True, exist_ok=True)
+        (ws / 'model.dis').write_text('dis\n')
+        (ws / 'external/k.dat').write_text('1.0\n')
+        (ws / 'model.hds').write_text('base heads\n')
+    (scratch_ws / 'external/k.dat').write_text('2.0\n')
+    nlinked, nwritten = _link_workspace(base_ws, scratch_ws, variant_ws,
+                                        changed={Path('external/k.dat')}, link=link)
+    assert (nlinked, nwritten) == (1, 1)
+    assert os.path.samefile(base_ws / 'model.dis', variant_ws / 'model.dis') == link
+    assert (variant_ws / 'external/k.dat').read_text() == '2.0\n'
+    # base model output isn't shared;
+    # running the variant doesn't change the base model results
+    assert not (variant_ws / 'model.hds').exists()
+    with open(variant_ws / 'model.hds', 'w') as dest:
+        dest.write('variant heads\n')
+    assert (base_ws / 'model.hds').read_text() == 'base heads\n'
+    # editing a variant file in place
+    # only leaves the base model untouched if it was copied
+    with open(variant_ws / 'model.dis', 'w') as dest:
+        dest.write('edited\n')
+    assert ((base_ws / 'model.dis').read_text() == 'dis\n') != link
+
+
+@pytest.fixture(scope='module')
+def pfl_ensemble(pfl_nwt_test_cfg_path, project_root_path):
+    cfg = load_cfg(pfl_nwt_test_cfg_path, default_file=MFnwtModel.default_file)
+    cfg['mfsetup_options'] = {'write_profile': False}
+    ensemble_ws = project_root_path / 'mfsetup/tests/tmp/pfl_ensemble'
+    overrides = pd.DataFrame({'rch.source_data.rech.mult': [2., 2., np.nan],
+                              # variant with a change to a package
+                              # that can't be remade
+                              'nwt.headtol': [np.nan, 0.01, np.nan],
+                              'upw.hk': [np.nan, np.nan, 5.]},
+                             index=['rch2', 'rch2_rebuilt', 'hk2'])
+    summary = setup_ensemble(cfg, overrides, ensemble_ws=ensemble_ws, n_jobs=2)
+    return summary, ensemble_ws, cfg
+
+
+def test_setup_ensemble(pfl_ensemble):
+    summary, ensemble_ws, cfg = pfl_ensemble
+    # the recharge multiplier in the base configuration is replaced
+    rech_mult = 2. / cfg['rch']['source_data']['rech']['mult']
+    base_ws = ensemble_ws / 'base'
+    assert summary.loc[['rch2', 'hk2'], 'method'].tolist() == ['remade', 'remade']
+    assert summary.loc['rch2_rebuilt', 'method'] == 'rebuilt'
+    assert summary.loc['rch2', 'packages'] == 'rch'
+
+    base_files = {os.path.relpath(os.path.join(root, f), base_ws)
+                  for root, dirs, files in os.walk(base_ws) for f in files}
+    for variant in summary.index:
+        variant_ws = ensemble_ws / variant
+        variant_files = {os.path.relpath(os.path.join(root, f), variant_ws)
+                         for root, dirs, files in os.walk(variant_ws) for f in files}
+        assert base_files.issubset(variant_files)
+
+    # recharge arrays were changed for the rch2 variants;
+    # the other external files are links to the base model files
+    for variant in 'rch2', 'rch2_rebuilt':
+        for f in base_files:
+            base_file = base_ws / f
+            variant_file = ensemble_ws / variant / f
+            if f.startswith('external/finf'):
+                base_rech = np.loadtxt(base_file)
+                variant_rech = np.loadtxt(variant_file)
+                # (excluding lake cells, which have fixed values)
+                ratio = variant_rech[base_rech > 0] / base_rech[base_rech > 0]
+                assert np.allclose(np.median(ratio), rech_mult, rtol=1e-4)
+                assert not os.path.samefile(base_file, variant_file)
+            elif f.startswith('external'):
+                assert os.path.samefile(base_file, variant_file)
+    # remaking only the RCH package gives the same result
+    # as setting up the model from scratch
+    for f in base_files:
+        if f.endswith('.rch') or f.startswith('external/finf'):
+            remade = (ensemble_ws / 'rch2' / f).read_text().split('\n')
+            rebuilt = (ensemble_ws / 'rch2_rebuilt' / f).read_text().split('\n')
+            assert [line for line in remade if not line.startswith('#')] == \
+                [line for line in rebuilt if not line.startswith('#')]
+    # only the hk variant has different hk arrays
+    hk_files = [f for f in base_files if f.startswith('external/hk')]
+    assert any(hk_files)
+    for f in hk_files:
+        assert os.path.samefile(base_ws / f, ensemble_ws / 'rch2' / f)
+        assert not os.path.samefile(base_ws / f, ensemble_ws / 'hk2' / f)
+        # (lake cells have the high-K lake value)
+        assert np.median(np.loadtxt(ensemble_ws / 'hk2' / f)) == 5.
+    # the hk variant has the original recharge
+    for f in base_files:
+        if f.startswith('external/finf'):
+            assert os.path.samefile(base_ws / f, ensemble_ws / 'hk2' / f)
@@ -1,10 +1,23 @@
 import copy
+from types import SimpleNamespace
 
+import flopy.mf6 as mf6
+import flopy.modflow as fm
+import numpy as np
+import pytest
 from flopy.datbase import DataInterface
 from flopy.mf6.data.mfdatalist import MFList as MF6List
 from flopy.utils.util_list import MfList
 
-from mfsetup.equality import list_eq, model_eq, package_eq
+import mfsetup.equality
+from mfsetup.equality import (
+    get_fingerprint,
+    get_package_fingerprint,
+    list_differences,
+    list_eq,
+    model_eq,
+    package_eq,
+)
 
 
 def test_model_equality(shellmound_model_with_dis):
@@ -37,3 +50,142 @@ def test_list_equality(pleasant_model):
                 if arr is not None:
                     if isinstance(v1, MF6List) or isinstance(v1, MfList):
                         assert list_eq(v1, v2)
+
+
+@pytest.fixture(scope='module')
+def shellmound_parent_models(test_data_path):
+    models = []
+    for i in range(2):
+        sim = mf6.MFSimulation.load('mfsim', sim_ws=test_data_path / 'shellmound/tmr_parent',
+                                    load_only=['dis', 'tdis', 'npf', 'rch', 'wel'],
+                                    verbosity_level=0)
+        models.append(sim.get_model('shellmound'))
+    return models
+
+
+def test_get_fingerprint(shellmound_parent_models):
+    m1, m2 = shellmound_parent_models
+    # arrays in external files are fingerprinted by the file contents
+    fingerprint = get_fingerprint(m1.npf.k)
+    assert fingerprint.startswith('files:')
+    assert fingerprint == get_fingerprint(m2.npf.k)
+    assert get_fingerprint(m1.rch.recharge) == get_fingerprint(m2.rch.recharge)
+    assert get_fingerprint(m1.wel.stress_period_data) == \
+        get_fingerprint(m2.wel.stress_period_data)
+    assert get_fingerprint(m1.npf.k) != get_fingerprint(m1.npf.k33)
+    assert model_eq(m1, m2)
+
+
+def test_get_package_fingerprint(shellmound_parent_models, monkeypatch):
+    hashed = []
+
+    def hash_array(array):
+        hashed.append(array.shape)
+        return hash_array_(array)
+    hash_array_ = mfsetup.equality.hash_array
+    monkeypatch.setattr(mfsetup.equality, 'hash_array', hash_array)
+
+    m = copy.deepcopy(shellmound_parent_models[0])
+    m.npf.k.store_internal()
+    k = m.npf.k.array
+    fingerprint = get_package_fingerprint(m.npf, 'k', m.npf.k)
+    assert fingerprint == get_fingerprint(m.npf.k)
+    hashed.clear()
+    # fingerprints of in-memory data are cached on the package
+    assert get_package_fingerprint(m.npf, 'k', m.npf.k) == fingerprint
+    assert not hashed
+    # until the data are set
+    m.npf.k = k * 2
+    assert get_package_fingerprint(m.npf, 'k', m.npf.k) != fingerprint
+    assert len(hashed) == 1
+    m.npf.k = k
+    assert get_package_fingerprint(m.npf, 'k', m.npf.k) == fingerprint
+    # arrays in external files are fingerprinted by the file contents
+    hashed.clear()
+    fingerprint = get_package_fingerprint(m.npf, 'k33', m.npf.k33)
+    assert fingerprint.startswith('files:')
+    assert not hashed
+
+    # MODFLOW-2005 style packages
+    nwt = fm.Modflow(version='mfnwt')
+    fm.ModflowDis(nwt, nlay=2, nrow=10, ncol=10)
+    upw = fm.ModflowUpw(nwt, hk=np.ones((2, 10, 10)))
+    fingerprint = get_package_fingerprint(upw, 'hk', upw.hk)
+    hashed.clear()
+    assert get_package_fingerprint(upw, 'hk', upw.hk) == fingerprint
+    assert not hashed
+    upw.hk = np.ones((2, 10, 10)) * 2
+    assert get_package_fingerprint(upw, 'hk', upw.hk) != fingerprint
+    # package comparisons use the cached fingerprints
+    upw2 = copy.deepcopy(upw)
+    assert package_eq(upw, upw2)
+    hashed.clear()
+    assert package_eq(upw, upw2)
+    assert not hashed
+
+
+def test_model_differences(shellmound_parent_models):
+    m1, m2 = [copy.deepcopy(m) for m in shellmound_parent_models]
+    # store the array internally, so that the external files aren't modified
+    k = m2.npf.k.array.copy()
+    k[2] *= 2
+    m2.npf.k.store_internal()
+    m2.npf.k = k
+    spd = m2.wel.stress_period_data.get_data()
+    spd[3]['q'][0] *= 2
+    m2.wel.stress_period_data = spd
+    assert not model_eq(m1, m2)
+    differences = []
+    assert not model_eq(m1, m2, differences=differences)
+    assert differences == ['npf.k (layers [2])',
+                           'wel_0.stress_period_data (periods [3]; '
+                           'first difference in period 3, row 0)']
+
+
+def test_list_differences():
+    dtype = [('k', int), ('i', int), ('j', int), ('q', float), ('boundname', object)]
+    nrows = 1000
+    data1 = {}
+    for per in range(10):
+        ra = np.zeros(nrows, dtype=dtype).view(np.recarray)
+        ra['i'] = np.arange(nrows)
+        ra['q'] = -per
+        ra['q'][::7] = np.nan
+        ra['boundname'] = [f'well{i}' for i in range(nrows)]
+        data1[per] = ra
+    m = fm.Modflow()
+    fm.ModflowDis(m, nrow=nrows, nper=10)
+    wel = fm.ModflowWel(m)
+    list1 = MfList(wel, data=data1, dtype=dtype)
+    list2 = MfList(wel, data=copy.deepcopy(data1), dtype=dtype)
+    assert list_eq(list1, list2)
+    assert list_differences(list1, list2) == ([], None)
+
+    data2 = copy.deepcopy(data1)
+    data2[1]['q'][1] = np.nan
+    data2[4]['q'][500] = 1.
+    data2[6]['boundname'][10] = 'other'
+    data2[8] = data2[8][:-1]
+    del data2[9]
+    list2 = MfList(wel, data=data2, dtype=dtype)
+    assert not list_eq(list1, list2)
+    periods, first_difference = list_differences(list1, list2)
+    assert periods == [1, 4, 6, 8, 9]
+    assert first_difference == (1, 1)
+    # NaNs are treated as zeros
+    data2[1]['q'][1] = data1[1]['q'][1]
+    data2[0]['q'][1] = np.nan
+    data2[2]['q'][0] = 0.
+    list2 = MfList(wel, data=data2, dtype=dtype)
+    assert list_differences(list1, list2)[1] == (4, 500)
+
+    # periods with different fields
+    # (lists with a data attribute of recarrays by period)
+    data3 = copy.deepcopy(data1)
+    data3[5] = np.zeros(nrows, dtype=dtype[:4]).view(np.recarray)
+    data4 = copy.deepcopy(data3)
+    assert list_differences(SimpleNamespace(data=data3),
+                            SimpleNamespace(data=data4)) == ([], None)
+    data4[5]['q'][3] = 1.
+    assert list_differences(SimpleNamespace(data=data3),
+                            SimpleNamespace(data=data4)) == ([5], (5, 3))
@@ -1,8 +1,11 @@
 import numpy as np
+import pandas as pd
 import pytest
 
 from mfsetup.evaporation import (
+    grid_latitude,
     hamon_evaporation,
+    hamon_evaporation_by_period,
     max_daylight_hours,
     solar_declination,
     sunset_hour_angle,
@@ -33,3 +36,61 @@ def test_hamon_evaporation(jday_tavg_lat_expected):
     evap_inches_daily = hamon_evaporation(day_of_year, tmean_c, lat)
     assert np.allclose(evap_inches_daily, expected_evap_inches,
                        rtol=0.01)
+
+
+@pytest.fixture
+def daily_temperatures():
+    xr = pytest.importorskip('xarray')
+    times = pd.date_range('2003-12-01', '2005-01-31', freq='D')
+    x = np.arange(4) * 1000.
+    y = np.array([30., 35., 40.])
+    seasonal = 15 - 12 * np.cos(2 * np.pi * times.dayofyear.values / 365)
+    values = seasonal[:, None, None] - y[None, :, None] / 5 + x[None, None, :] / 1000
+    return xr.DataArray(values, coords={'time': times, 'y': y, 'x': x},
+                        dims=('time', 'y', 'x'))
+
+
+@pytest.mark.parametrize('period_stat', ['mean', 'sum', 'max'])
+def test_hamon_evaporation_by_period(daily_temperatures, period_stat):
+    tmean_c = daily_temperatures
+    latitude = grid_latitude(tmean_c.x.values, tmean_c.y.values)
+    assert latitude.shape == (3, 4)
+    period_stats = {0: {'period_stat': [period_stat, '2004-01-01', '2004-12-31']},
+                    1: None,
+                    2: {'period_stat': period_stat,
+                        'start_datetime': pd.Timestamp('2005-01-01'),
+                        'end_datetime': pd.Timestamp('2005-01-31')}
+                    }
+    results = dict(hamon_evaporation_by_period(tmean_c, latitude, period_stats,
+                                               dest_length_units='meters',
+                                               blocksize=50))
+    assert set(results.keys()) == {0, 2}
+
+    # compare to the scalar calculation for each day, for one cell
+    i, j = 2, 1
+    for per, start, end in (0, '2004-01-01', '2004-12-31'), (2, '2005-01-01', '2005-01-31'):
+        values = tmean_c.loc[start:end].isel(y=i, x=j)
+        expected = [hamon_evaporation(t.dayofyear, temp, latitude[i, j],
+                                      dest_length_units='meters')
+                    for t, temp in zip(pd.DatetimeIndex(values.time.values), values.values)]
+        expected = getattr(np, period_stat)(expected)
+        assert results[per].shape == (3, 4)
+        assert np.allclose(results[per][i, j], expected)
+
+    # broadcasting directly with xarray DataArrays
+    latitude_da = tmean_c.y.broadcast_like(tmean_c.isel(time=0))
+    evaporation = hamon_evaporation(tmean_c.time.dt.dayofyear, tmean_c, latitude_da,
+                                    dest_length_units='meters')
+    evaporation = evaporation.transpose('time', 'y', 'x')
+    expected = getattr(evaporation.loc['2004-01-01':'2004-12-31'], period_stat)('time')
+    assert np.allclose(results[0], expected.values)
+
+
+def test_grid_latitude():
+    # projected coordinates (UTM zone 15)
+    x = np.array([500000., 501000.])
+    y = np.array([4429000., 4428000.])
+    latitude = grid_latitude(x, y, crs=26915)
+    assert latitude.shape == (2, 2)
+    assert np.allclose(latitude[:, 0], [40.01, 40.00], atol=0.01)
+    assert latitude[0, 0] > latitude[1, 0]
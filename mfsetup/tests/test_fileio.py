@@ -1,9 +1,14 @@
 import io
 import os
+import pickle
 import platform
+import re
+import shutil
 from pathlib import Path
 
+import flopy
 import numpy as np
+import pandas as pd
 import pytest
 import yaml
 
@@ -13,16 +18,25 @@ try:
 except ImportError:
     from yaml import Loader, Dumper
 
+from mfsetup import fileio
 from mfsetup.fileio import (
+    LazyModflow,
     add_version_to_fileheader,
+    clear_config_cache,
     dump_yml,
     exe_exists,
+    get_model_input_files,
+    get_model_snapshot_key,
     load,
     load_array,
     load_cfg,
+    load_model_snapshot,
     load_modelgrid,
     load_yml,
+    save_model_snapshot,
+    link_or_copy,
     which,
+    write_list_file,
 )
 from mfsetup.grid import MFsetupGrid
 
@@ -104,6 +118,162 @@ def test_load_cfg(pfl_nwt_test_cfg_path):
     assert p1 == p2
 
 
+def test_load_cfg_cache(pfl_nwt_test_cfg_path, tmpdir):
+    # copy the configuration file so that it can be modified
+    cfg_file = Path(pfl_nwt_test_cfg_path)
+    cfg_copy = cfg_file.parent / f'{cfg_file.stem}_cache_test.yml'
+    cfg_copy.write_text(cfg_file.read_text())
+    cache_dir = Path(tmpdir, 'config_cache')
+    try:
+        clear_config_cache()
+        cfg = load_cfg(cfg_copy, default_file='mfnwt_defaults.yml',
+                       cache_dir=cache_dir)
+        assert len(list(cache_dir.glob('*.pkl'))) == 1
+        # results should be the same as without the cache,
+        # and each a separate copy
+        cfg2 = load_cfg(cfg_copy, default_file='mfnwt_defaults.yml',
+                        cache_dir=cache_dir)
+        cfg3 = load_cfg(cfg_copy, default_file='mfnwt_defaults.yml', cache=False)
+        assert cfg2 == cfg3 == cfg
+        cfg2['model']['modelname'] = 'changed'
+        assert cfg['model']['modelname'] != 'changed'
+
+        # cache on disk should be used by other processes
+        # (simulated here by clearing the memory cache)
+        clear_config_cache()
+        cfg4 = load_cfg(cfg_copy, default_file='mfnwt_defaults.yml',
+                        cache_dir=cache_dir)
+        assert len(fileio._config_cache) == 1
+        assert cfg4 == cfg
+
+        # changes to the configuration file should invalidate the cache
+        cfg_copy.write_text(re.sub(r'modelname: .*', 'modelname: changed',
+                                   cfg_file.read_text(), count=1))
+        cfg5 = load_cfg(cfg_copy, default_file='mfnwt_defaults.yml',
+                        cache_dir=cache_dir)
+        assert cfg5['model']['modelname'] == 'changed'
+        assert len(list(cache_dir.glob('*.pkl'))) == 2
+        clear_config_cache(cache_dir)
+        assert not any(cache_dir.glob('*.pkl'))
+    finally:
+        cfg_copy.unlink()
+
+
+def test_config_cache_size(monkeypatch):
+    monkeypatch.setattr(fileio, 'config_cache_size', 3)
+    clear_config_cache()
+    for key in 'abc':
+        fileio._cache(key, {'key': key})
+    # using an entry makes it the most recently used
+    assert fileio._load_cached('a') == {'key': 'a'}
+    fileio._cache('d', {'key': 'd'})
+    # the least recently used entry is dropped
+    assert list(fileio._config_cache) == ['c', 'a', 'd']
+    assert fileio._load_cached('b') is None
+    clear_config_cache()
+
+
+def test_model_snapshot(test_data_path, tmpdir):
+    # copy the model so that the files can be modified
+    model_ws = Path(tmpdir, 'pfl_snapshot_test')
+    if model_ws.exists():
+        shutil.rmtree(model_ws)
+    model_ws.mkdir()
+    for f in Path(test_data_path, 'plainfieldlakes').glob('pfl.*'):
+        shutil.copy2(f, model_ws)
+    shutil.copytree(Path(test_data_path, 'plainfieldlakes/external'),
+                    model_ws / 'external')
+    load_kwargs = {'f': 'pfl.nam', 'model_ws': str(model_ws),
+                   'load_only': ['dis', 'bas6', 'upw', 'wel']}
+    snapshot_file = Path(tmpdir, 'pfl_snapshot_test.pkl')
+    if snapshot_file.exists():
+        snapshot_file.unlink()
+
+    key = get_model_snapshot_key(model_ws, 'pfl.nam', load_kwargs)
+    assert load_model_snapshot(snapshot_file, key) is None
+    m = flopy.modflow.Modflow.load(**load_kwargs)
+    save_model_snapshot(snapshot_file, key, m)
+    # model output, and the order of packages loaded, don't affect the key
+    (model_ws / 'pfl.hds').write_bytes(b'0')
+    load_kwargs['load_only'] = ['wel', 'upw', 'bas6', 'dis']
+    assert get_model_snapshot_key(model_ws, 'pfl.nam', load_kwargs) == key
+    m2 = load_model_snapshot(snapshot_file, key)
+    assert m2.get_package_list() == m.get_package_list()
+    assert np.array_equal(m2.upw.hk.array, m.upw.hk.array)
+    assert np.array_equal(m2.dis.botm.array, m.dis.botm.array)
+    assert np.array_equal(m2.wel.stress_period_data[0], m.wel.stress_period_data[0])
+
+    # only the file contents matter, not the modification times
+    os.utime(model_ws / 'pfl.upw', ns=(0, 0))
+    assert get_model_snapshot_key(model_ws, 'pfl.nam', load_kwargs) == key
+
+    # changes to the model input should change the key
+    with open(model_ws / 'pfl.upw', 'a') as dest:
+        dest.write('\n')
+    key2 = get_model_snapshot_key(model_ws, 'pfl.nam', load_kwargs)
+    assert key2 != key
+    assert load_model_snapshot(snapshot_file, key2) is None
+
+
+
+def test_model_snapshot_key_input_files(tmpdir, test_data_path):
+    """The snapshot key should cover the model input files,
+    wherever they are, and only those files."""
+    project_folder = Path(tmpdir, 'pfl_snapshot_key_test')
+    if project_folder.exists():
+        shutil.rmtree(project_folder)
+    model_ws = project_folder / 'parent'
+    model_ws.mkdir(parents=True)
+    for f in Path(test_data_path, 'plainfieldlakes').glob('pfl.*'):
+        shutil.copy2(f, model_ws)
+    shutil.copytree(Path(test_data_path, 'plainfieldlakes/external'),
+                    model_ws / 'external')
+    # move an external array outside of the model workspace
+    shared_folder = project_folder / 'shared'
+    shared_folder.mkdir()
+    shutil.move(model_ws / 'external/hk0.dat', shared_folder / 'hk0.dat')
+    upw_file = model_ws / 'pfl.upw'
+    upw_file.write_text(upw_file.read_text().replace('external/hk0.dat',
+                                                     '../shared/hk0.dat'))
+    input_files = get_model_input_files(model_ws, 'pfl.nam')
+    assert (shared_folder / 'hk0.dat').absolute() in input_files
+    key = get_model_snapshot_key(model_ws, 'pfl.nam')
+
+    # files that aren't model input don't affect the key
+    (model_ws / 'source_data').mkdir()
+    (model_ws / 'source_data/dem.tif').write_bytes(b'0')
+    (model_ws / 'inset').mkdir()
+    (model_ws / 'inset/inset.dis').write_text('0')
+    assert get_model_snapshot_key(model_ws, 'pfl.nam') == key
+
+    # changes to an external array outside of the model workspace do
+    with open(shared_folder / 'hk0.dat', 'a') as dest:
+        dest.write('\n')
+    assert get_model_snapshot_key(model_ws, 'pfl.nam') != key
+
+
+def test_lazy_modflow(test_data_path):
+    load_kwargs = {'f': 'pfl.nam', 'model_ws': str(test_data_path / 'plainfieldlakes'),
+                   'load_only': ['dis', 'bas6', 'upw', 'wel', 'rch'], 'check': False}
+    m = flopy.modflow.Modflow.load(**load_kwargs)
+    lazy = LazyModflow.load(**load_kwargs)
+    assert lazy.deferred_packages == {'BAS6', 'UPW', 'WEL', 'RCH'}
+    assert set(lazy.get_package_list()) == set(m.get_package_list())
+    # packages are loaded on first access
+    assert np.array_equal(lazy.upw.hk.array, m.upw.hk.array)
+    assert np.array_equal(lazy.get_package('wel').stress_period_data[0],
+                          m.wel.stress_period_data[0])
+    assert lazy.deferred_packages == {'BAS6', 'RCH'}
+    # packages not in load_only aren't loaded
+    assert lazy.nwt is None
+    # deferred loading works after pickling (e.g. in a parent model snapshot)
+    lazy2 = pickle.loads(pickle.dumps(lazy))
+    assert np.array_equal(lazy2.rch.rech.array, m.rch.rech.array)
+    lazy2.load_deferred_packages()
+    assert not any(lazy2.deferred_packages)
+    assert sorted(lazy2.get_package_list()) == sorted(m.get_package_list())
+
+
 def test_which():
     badexe = which('junk')
     assert badexe is None
@@ -154,3 +324,89 @@ def test_add_version_to_fileheader(models_with_dis, model_info):
         headerline = next(src)
         assert 'modflow-setup' in headerline
         assert 'version' in headerline
+
+
+def test_write_list_file(tmpdir):
+    rng = np.random.default_rng(0)
+    n = 1000
+    df = pd.DataFrame({'#k': rng.integers(1, 5, n),
+                       'i': rng.integers(1, 500, n),
+                       'j': rng.integers(1, 500, n),
+                       'head': rng.random(n) * 1000,
+                       'boundname': rng.choice(['chd', 'chd 2'], n)})
+    # missing values are written as blanks
+    df.loc[::10, 'head'] = np.nan
+    expected_file = os.path.join(tmpdir, 'expected.dat')
+    df.to_csv(expected_file, index=False, sep=' ', float_format='%g')
+    with open(expected_file) as src:
+        expected = src.read()
+    for data in df, df.to_records(index=False):
+        outfile = os.path.join(tmpdir, 'chd_000.dat')
+        write_list_file(outfile, data)
+        with open(outfile) as src:
+            assert src.read() == expected
+
+    # binary output (without the text column)
+    data = df.drop('boundname', axis=1).fillna(0.)
+    write_list_file(outfile, data, binary=True)
+    records = np.fromfile(outfile, dtype=[('k', np.int32), ('i', np.int32),
+                                          ('j', np.int32), ('head', np.float64)])
+    assert np.array_equal(records['i'], data['i'])
+    assert np.array_equal(records['head'], data['head'])
+    with pytest.raises(ValueError):
+        write_list_file(outfile, df, binary=True)
+
+    # integer-valued data columns (e.g. cond: 1000 in the configuration file)
+    # are written as doubles, as MODFLOW 6 expects
+    data = df[['#k', 'i', 'j']].copy()
+    data['cond'] = 1000
+    data['q'] = rng.integers(-100, 0, n)
+    write_list_file(outfile, data, binary=True)
+    assert os.path.getsize(outfile) == n * (3 * 4 + 2 * 8)
+    records = np.fromfile(outfile, dtype=[('k', np.int32), ('i', np.int32),
+                                          ('j', np.int32), ('cond', np.float64),
+                                          ('q', np.float64)])
+    assert np.array_equal(records['k'], data['#k'])
+    assert np.array_equal(records['j'], data['j'])
+    assert np.all(records['cond'] == 1000.)
+    assert np.array_equal(records['q'], data['q'])
+
+
+def test_write_list_file_text_columns(tmpdir):
+    # partly filled boundnames (e.g. perimeter boundaries
+    # combined with source_data boundaries that have none),
+    # and names that need quoting
+    df = pd.DataFrame({'#k': [1, 1, 2, 2, 3],
+                       'i': [1, 2, 3, 4, 5],
+                       'j': [1, 2, 3, 4, 5],
+                       'head': [1., 2., np.nan, 4., 5.],
+                       'boundname': ['a b', np.nan, None, 'he said "x"', 'c']})
+    expected_file = os.path.join(tmpdir, 'expected.dat')
+    df.to_csv(expected_file, index=False, sep=' ', float_format='%g')
+    outfile = os.path.join(tmpdir, 'chd_000.dat')
+    write_list_file(outfile, df)
+    with open(expected_file) as src:
+        expected = src.read()
+    with open(outfile) as src:
+        assert src.read() == expected
+
+
+def test_link_or_copy(tmpdir):
+    src = os.path.join(tmpdir, 'chd_000.dat')
+    dest_folder = os.path.join(tmpdir, 'intermediate')
+    os.makedirs(dest_folder)
+    with open(src, 'w') as dest:
+        dest.write('version 1')
+    dst = link_or_copy(src, dest_folder)
+    assert dst == Path(dest_folder, 'chd_000.dat')
+    assert dst.read_text() == 'version 1'
+    # linking again replaces the existing file
+    assert link_or_copy(src, dest_folder) == dst
+    # rewriting the source with write_list_file
+    # leaves the linked copy unchanged
+    write_list_file(src, pd.DataFrame({'#k': [1], 'q': [0.5]}))
+    assert dst.read_text() == 'version 1'
+    # copies, to new folders
+    dst2 = link_or_copy(src, Path(dest_folder, 'copies/chd_000.dat'), link=False)
+    assert dst2.read_text() == Path(src).read_text()
+    assert not os.path.samefile(src, dst2)
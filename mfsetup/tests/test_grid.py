@@ -11,15 +11,19 @@ from flopy.utils import binaryfile as bf
 from flopy.utils.geometry import rotate
 from flopy.utils.mfreadnam import attribs_from_namfile_header
 from gisutils import get_authority_crs, shp2df
+from shapely.geometry import MultiPolygon, Point, box
 
 from mfsetup import MF6model
 from mfsetup.fileio import dump, load, load_modelgrid
 from mfsetup.grid import (
     MFsetupGrid,
+    coarsen_spacing,
     get_cellface_midpoint,
     get_ij,
     get_nearest_point_on_grid,
     get_point_on_national_hydrogeologic_grid,
+    intersect_points,
+    points_within,
     rasterize,
 )
 from mfsetup.testing import point_is_on_nhg
@@ -155,6 +159,55 @@ def test_get_ij(rotation):
     assert pj0 == pj[0]
 
 
+@pytest.mark.parametrize('rotation', (0, 18,))
+def test_intersect_points(rotation):
+    modelgrid = MFsetupGrid(delc=np.ones(20) * 1000,
+                            delr=np.ones(25) * 1000,
+                            xoff=509405.0, yoff=1175835.0,
+                            angrot=rotation,
+                            crs=5070,
+                            )
+    # random points, cell edges and corners
+    rng = np.random.default_rng(0)
+    xl = np.concatenate([rng.uniform(1, 24999, 100),
+                         modelgrid.xyedges[0][1:21], [10000, 0, 25000]])
+    yl = np.concatenate([rng.uniform(1, 19999, 100),
+                         modelgrid.xyedges[1][:-1], [20000, 0, 20000]])
+    x, y = modelgrid.get_coords(xl, yl)
+    expected_i, expected_j = zip(*[modelgrid.intersect(xx, yy, forgive=True)
+                                   for xx, yy in zip(x, y)])
+    i, j = intersect_points(modelgrid, x, y, forgive=True)
+    assert np.allclose(i, expected_i, equal_nan=True)
+    assert np.allclose(j, expected_j, equal_nan=True)
+    i, j = intersect_points(modelgrid, xl[:100], yl[:100], local=True)
+    assert i.dtype == int
+    assert np.array_equal(i, expected_i[:100])
+    assert np.array_equal(j, expected_j[:100])
+    with pytest.raises(ValueError):
+        intersect_points(modelgrid, x, y)
+
+
+@pytest.mark.parametrize('features', (
+    box(0, 0, 100, 100),
+    MultiPolygon([Point(30, 30).buffer(20), Point(70, 70).buffer(25)]),
+    [Point(30, 30).buffer(20), box(60, 60, 90, 90)],
+))
+def test_points_within(features):
+    rng = np.random.default_rng(0)
+    x = rng.uniform(-10, 110, 10000)
+    y = rng.uniform(-10, 110, 10000)
+    # points on the boundary, and with no location
+    x[:4] = [0, 50, 100, np.nan]
+    y[:4] = [50, 0, 100, 5]
+    within = points_within(x, y, features)
+    if isinstance(features, list):
+        features = MultiPolygon(features)
+    expected = [Point(xx, yy).within(features) for xx, yy in zip(x, y)]
+    assert np.array_equal(within, expected)
+    assert not np.any(within[:4])
+    assert len(points_within([], [], features)) == 0
+
+
 @pytest.mark.parametrize('model_units', ('meters', 'feet'))
 @pytest.mark.parametrize('crs,expected_crs_units', ((3696, 'feet'),
                                                     (3070, 'meters'),
@@ -305,6 +358,35 @@ def test_grid_corners_sm_tmr(shellmound_tmr_cfg, snap_to_parent):
     check_grid(m)
 
 
+@pytest.mark.parametrize('spacing,coarsen_factor,expected', (
+    (500., 3, 1500.),
+    ([1, 2, 3, 4, 5], 2, [3, 7, 5]),
+    ([10, 10, 10, 10], 4, [40])
+))
+def test_coarsen_spacing(spacing, coarsen_factor, expected):
+    results = coarsen_spacing(spacing, coarsen_factor)
+    assert np.allclose(results, expected)
+
+
+@pytest.mark.parametrize('coarsen_factor', (2, 4))
+def test_preview_grid(shellmound_cfg, coarsen_factor):
+    """Test the coarsened grid and limited stress periods
+    of a preview build."""
+    cfg = copy.deepcopy(shellmound_cfg)
+    cfg['preview'] = {'coarsen_factor': coarsen_factor}
+    nrow = cfg['dis']['dimensions']['nrow']
+    ncol = cfg['dis']['dimensions']['ncol']
+    m = MF6model(cfg=cfg)
+    m.setup_grid()
+    assert m.modelgrid.nrow == np.ceil(nrow / coarsen_factor)
+    assert m.modelgrid.ncol == np.ceil(ncol / coarsen_factor)
+    assert np.allclose(m.modelgrid.delr, 1000. * coarsen_factor)
+    assert m.cfg['dis']['dimensions']['nrow'] == m.modelgrid.nrow
+    assert np.allclose(m.cfg['dis']['griddata']['delr'], m.modelgrid.delr)
+    m.setup_tdis()
+    assert m.nper == m.preview['nper'] == 3
+
+
 def test_get_cellface_midpoint():
     delc = [10, 10]
     delr = [10, 10]
@@ -0,0 +1,82 @@
+"""
+Tests for the time it takes to import modflow-setup
+and the dependencies that are loaded on import.
+"""
+import os
+import subprocess
+import sys
+
+import pytest
+
+import mfsetup
+
+# optional maximum cumulative time to "import mfsetup", in seconds
+# (timings depend on the machine, so this is only checked if set)
+import_time_budget = os.environ.get('MFSETUP_IMPORT_TIME_BUDGET')
+
+# dependencies that should only be imported
+# when the functionality that needs them is used
+lazy_dependencies = ['gisutils', 'netCDF4', 'rasterio', 'rasterstats',
+                     'sfrmaker', 'xarray']
+
+# dependencies that are slow to import,
+# and shouldn't be imported by "import mfsetup" alone
+heavy_dependencies = ['flopy', 'geopandas', 'scipy', 'xarray']
+
+
+def get_import_time(statement):
+    """Run an import statement in a new interpreter with
+    python -X importtime; return the cumulative time
+    for each top-level module, in seconds.
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement],
+                            capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.split('\n'):
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        # only include top-level imports (not indented)
+        if not name.startswith('  '):
+            times[name.strip()] = int(cumulative_us) / 1e6
+    return times
+
+
+def get_imported(statement, modules):
+    """Run a statement in a new interpreter;
+    return the modules in a list that were imported."""
+    code = (f"import sys; {statement}; "
+            f"print(','.join(m for m in {modules} if m in sys.modules))")
+    result = subprocess.run([sys.executable, '-W', 'ignore', '-c', code],
+                            capture_output=True, text=True, check=True)
+    return [m for m in result.stdout.strip().split(',') if m]
+
+
+def test_import_heavy_dependencies():
+    assert not any(get_imported('import mfsetup', heavy_dependencies))
+
+
+@pytest.mark.skipif(import_time_budget is None,
+                    reason='MFSETUP_IMPORT_TIME_BUDGET (seconds) not set')
+def test_import_time():
+    times = get_import_time('import mfsetup')
+    assert times['mfsetup'] < float(import_time_budget)
+
+
+@pytest.mark.parametrize('statement', ['import mfsetup',
+                                       'from mfsetup import MF6model, MFnwtModel'])
+def test_lazy_dependencies(statement):
+    assert not any(get_imported(statement, lazy_dependencies))
+
+
+def test_lazy_attributes():
+    from mfsetup.fileio import load_modelgrid
+    from mfsetup.mf6model import MF6model
+    from mfsetup.mfnwtmodel import MFnwtModel
+    assert mfsetup.MF6model is MF6model
+    assert mfsetup.MFnwtModel is MFnwtModel
+    assert mfsetup.load_modelgrid is load_modelgrid
+    assert mfsetup.interpolate is sys.modules['mfsetup.interpolate']
+    assert 'MF6model' in dir(mfsetup)
+    with pytest.raises(AttributeError):
+        mfsetup.not_an_attribute
@@ -172,3 +172,63 @@ def test_regrid_nearest(pfl_nwt_with_grid):
     rg1 = m.regrid_from_parent(arr, method='nearest')
     rg2 = regrid(arr, m.parent.modelgrid, m.modelgrid, method='nearest')
     np.testing.assert_allclose(rg1, rg2)
+
+
+def test_interpolator_float32(dem_DataArray, modelgrid):
+    """Interpolation with float32 intermediate arrays
+    should agree with float64 to within single precision."""
+    da = dem_DataArray
+    mg = modelgrid
+    X, Y = np.meshgrid(da.x.values, da.y.values)
+    xyz = np.array([X.ravel(), Y.ravel()]).transpose()
+    uvw = np.array([mg.xcellcenters.ravel(), mg.ycellcenters.ravel()]).transpose()
+    values = da.values.ravel()
+
+    results64 = Interpolator(xyz, uvw, d=2).interpolate(values)
+    interp32 = Interpolator(xyz, uvw, d=2, dtype=np.float32)
+    results32 = interp32.interpolate(values)
+    assert interp32.interp_weights[1].dtype == np.float32
+    assert results32.dtype == np.float32
+    valid = ~np.isnan(results64)
+    assert np.array_equal(valid, ~np.isnan(results32))
+    # float32 has ~7 significant digits;
+    # dem elevations are O(100-1000)
+    np.testing.assert_allclose(results32[valid], results64[valid],
+                               rtol=1e-5, atol=1e-3)
+
+
+def test_regrid_float32(pfl_nwt_with_grid):
+
+    from mfsetup.interpolate import regrid
+    m = pfl_nwt_with_grid
+    arr = m.parent.dis.top.array
+    for method in 'linear', 'nearest':
+        rg64 = regrid(arr, m.parent.modelgrid, m.modelgrid, method=method)
+        rg32 = regrid(arr, m.parent.modelgrid, m.modelgrid, method=method,
+                      dtype=np.float32)
+        assert rg32.dtype == np.float32
+        np.testing.assert_allclose(rg32, rg64, rtol=1e-6, atol=1e-3)
+
+
+def test_model_float_dtype(pfl_nwt_with_grid):
+    m = pfl_nwt_with_grid
+    arr = m.parent.dis.top.array
+    assert m.float_dtype == np.float64
+    rg64 = m.regrid_from_parent(arr, method='linear')
+
+    m.cfg['mfsetup_options']['dtype'] = 'float32'
+    m._interp_weights = None
+    assert m.float_dtype == np.float32
+    rg32 = m.regrid_from_parent(arr, method='linear')
+    assert rg32.dtype == np.float32
+    np.testing.assert_allclose(rg32, rg64, rtol=1e-6, atol=1e-3)
+    # integer arrays keep their type
+    ibound = m.parent.bas6.ibound.array[0]
+    assert np.issubdtype(ibound.dtype, np.integer)
+    rg_int = m.regrid_from_parent(ibound, method='nearest')
+    assert rg_int.dtype == ibound.dtype
+    assert set(np.unique(rg_int)).issubset(np.unique(ibound))
+
+    m.cfg['mfsetup_options']['dtype'] = 'int32'
+    with pytest.raises(ValueError):
+        m.float_dtype
@@ -396,6 +396,10 @@ def test_meandering_sfr_connections(shellmound_cfg, project_root_path, tmpdir):
             v.setup_dis()
             v.setup_sfr()
     gwfgwf = m.setup_lgr_exchanges()
+    # the exchange data file is copied to the intermediate data folder
+    for f in m.cfg['external_files']['gwfgwf_exchangedata']:
+        assert Path(m.cfg['intermediate_data']['output_folder'],
+                    Path(f).name).exists()
 
     # just test the connections for period 0
     exchangedata = pd.DataFrame(m.simulation.mvr.perioddata.array[0])
@@ -555,6 +559,15 @@ def test_lgr_model_setup(pleasant_lgr_setup_from_yaml, tmpdir):
             continue
         assert m.name in f or 'plsnt_lgr_inset' in f
 
+    # the exchange data are written to an external file,
+    # listed with the other external files
+    exchangedata_files = m.cfg['external_files']['gwfgwf_exchangedata']
+    assert len(exchangedata_files) == 1
+    exchangedata_file = Path(exchangedata_files[0])
+    assert exchangedata_file.name == f'{m.name}_plsnt_lgr_inset_exchangedata.dat'
+    assert exchangedata_file.exists()
+    assert len(m.simulation.gwfgwf.exchangedata.array) == m.simulation.gwfgwf.nexg.array
+
     binaryfile = m.cfg['ic']['source_data']['strt']['from_parent']['binaryfile']
     kper = m.cfg['ic']['source_data']['strt']['from_parent']['stress_period']
     phds = bf.HeadFile(binaryfile)
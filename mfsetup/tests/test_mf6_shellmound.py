@@ -643,10 +643,11 @@ def test_basic_stress_package_setup(shellmound_model_with_dis, pckg_abbrv,
         include_ids = m.cfg['chd']['source_data']['shapefile']['include_ids']
         in_df = pd.read_csv(m.cfg['chd']['source_data']['csvfile']['filename'])
         in_df = in_df.loc[in_df['comid'].isin(include_ids)]
+        spd = m.chd.stress_period_data.data
+        # repeated periods are omitted (MODFLOW reuses the previous period)
+        assert 0 in spd and set(spd.keys()).issubset(range(m.nper))
         spd_heads = np.array(
-            [ra[0][1] for per, ra in m.chd.stress_period_data.data.items()])
-        # every stress period should have input
-        assert len(m.chd.stress_period_data.data.keys()) == m.nper
+            [spd[max(p for p in spd if p <= per)][0][1] for per in range(m.nper)])
         # heads in CHD package should match the CSV input,
         # after conversion to meters
         assert np.allclose(in_df['head'].values, spd_heads[1:]/.3048)
@@ -659,10 +660,11 @@ def test_basic_stress_package_setup(shellmound_model_with_dis, pckg_abbrv,
     # and conductance values specified via a raster
     if pckg_abbrv == 'ghb':
         in_df = pd.read_csv(m.cfg['ghb']['source_data']['csvfile']['filename'])
+        spd = m.ghb.stress_period_data.data
+        # repeated periods are omitted (MODFLOW reuses the previous period)
+        assert 0 in spd and set(spd.keys()).issubset(range(m.nper))
         spd_heads = np.array(
-            [ra[0][1] for per, ra in m.ghb.stress_period_data.data.items()])
-        # every stress period should have input
-        assert len(m.ghb.stress_period_data.data.keys()) == m.nper
+            [spd[max(p for p in spd if p <= per)][0][1] for per in range(m.nper)])
         # heads in CHD package should match the CSV input,
         # after conversion to meters
         assert np.allclose(in_df['head'].values[-1], spd_heads[1:]/.3048)
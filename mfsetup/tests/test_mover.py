@@ -1,10 +1,18 @@
 from copy import deepcopy
 
+import numpy as np
+import pandas as pd
 import pytest
-from shapely.geometry import Point
+from scipy.spatial.distance import cdist
+from shapely.geometry import LineString, Point
 
 from mfsetup import MF6model
-from mfsetup.mover import get_connections
+from mfsetup.mover import (
+    get_connection_table,
+    get_connections,
+    get_nearest_reach_starts,
+    get_sfr_package_connections,
+)
 
 
 @pytest.mark.parametrize('from_features,to_features,expected_n_connections',
@@ -23,6 +31,80 @@ def test_get_connections(from_features, to_features, expected_n_connections):
     assert len(results) == expected_n_connections
 
 
+def test_get_connection_table():
+    rng = np.random.default_rng(0)
+    xy1 = rng.uniform(0, 10000, (2000, 2))
+    xy2 = rng.uniform(0, 10000, (1500, 2))
+    # lines with the same centroids
+    from_features = [LineString([(x - 10, y), (x + 10, y)]) for x, y in xy1]
+    to_features = [Point(x, y) for x, y in xy2]
+    table = get_connection_table(from_features, to_features,
+                                 distance_threshold=100)
+    distances = cdist(xy1, xy2)
+    expected_from, expected_to = np.where(distances < 100)
+    assert len(table) == len(expected_from)
+    assert set(zip(table['from'], table['to'])) == \
+        set(zip(expected_from, expected_to))
+    assert np.allclose(table['distance'],
+                       distances[table['from'], table['to']])
+    # each connection is to the closest feature
+    connections = get_connections(from_features, to_features,
+                                  distance_threshold=100)
+    assert set(connections.keys()) == set(expected_from)
+    for i, j in connections.items():
+        assert distances[i, j] == distances[i][distances[i] < 100].min()
+
+
+def test_get_nearest_reach_starts():
+    reach_data = pd.DataFrame({'geometry': [LineString([(0, 0), (100, 0)]),
+                                            LineString([(0, 0), (0, 100)])]})
+    # zero-based reach numbers
+    other_reach_data = pd.DataFrame({'rno': [0, 1],
+                                     'geometry': [LineString([(101, 0), (200, 0)]),
+                                                  LineString([(500, 0), (600, 0)])]})
+    next_reach = get_nearest_reach_starts(reach_data, other_reach_data, 10)
+    assert next_reach.tolist() == [0, -1]
+
+
+@pytest.mark.parametrize('inset_rno_start', (11, 0))
+def test_get_sfr_package_connections(inset_rno_start):
+    exchangedata = pd.DataFrame({'cellidm1': [(0, 0, 1), (0, 0, 2)],
+                                 'cellidm2': [(0, 5, 5), (0, 7, 7)]})
+    # parent model reaches with k, i, j locations
+    reach_data1 = pd.DataFrame({
+        'rno': [1, 2, 3, 4],
+        'outreach': [2, 0, 5, 0],
+        'k': 0,
+        'i': [0, 0, 0, 5],
+        'j': [1, 2, 1, 5],
+        'geometry': [
+            # outreach is in a neighboring cell; not connected
+            LineString([(0, 0), (200.5, 0)]),
+            # outlet next to the start of inset reach 11
+            LineString([(100, 0), (200, 0)]),
+            # outreach not along the interface
+            LineString([(300.5, 0), (500.5, 0)]),
+            # not along the interface
+            LineString([(600, 0), (500, 0)]),
+        ]})
+    # inset model reaches with cellids
+    # (one-based, or zero-based)
+    reach_data2 = pd.DataFrame({
+        'rno': [inset_rno_start, inset_rno_start + 1],
+        'outreach': [inset_rno_start + 1, 0],
+        'cellid': [(0, 5, 5), (0, 7, 7)],
+        'geometry': [
+            # outreach is not in a neighboring cell
+            LineString([(201, 0), (300, 0)]),
+            # outlet without a parent reach start nearby
+            LineString([(500, 0), (600, 0)]),
+        ]})
+    to_inset, to_parent = get_sfr_package_connections(
+        exchangedata, reach_data1, reach_data2, distance_threshold=10)
+    assert to_inset == {2: inset_rno_start}
+    assert to_parent == {inset_rno_start: 3}
+
+
 def test_sfr_mover(pleasant_mf6_cfg, project_root_path, tmpdir):
     """Test that 'mover' gets added to the SFR Package input file options block
     when it is specified in the configuration file options block."""
@@ -1,4 +1,7 @@
-from mfsetup.obs import make_obsname, read_observation_data
+import pandas as pd
+import pytest
+
+from mfsetup.obs import get_gage_package_data, make_obsname, read_observation_data
 
 
 def test_make_obsname():
@@ -32,3 +35,28 @@ def test_read_observation_data(test_data_path):
                           column_mappings={'obsname': 'comid'})
     assert results['obsname'].dtype == object
     assert isinstance(results['obsname'].values[0], str)
+
+
+@pytest.mark.parametrize('stream_gages_per_file', (1, 2))
+def test_get_gage_package_data(stream_gages_per_file):
+    sfr_observations = pd.DataFrame({'obsname': ['site1', 'site2', 'site3'],
+                                     'iseg': [1, 22, 2],
+                                     'ireach': [1, 1, 3]})
+    df = get_gage_package_data(lake_ids=[1000], sfr_observations=sfr_observations,
+                               stream_gages_per_file=stream_gages_per_file)
+    assert df['gageloc'].tolist() == [-1, 1, 22, 2]
+    assert df['gagerch'].tolist() == [0, 1, 1, 3]
+    assert df['outtype'].tolist() == [1, 0, 0, 0]
+    if stream_gages_per_file == 1:
+        assert df['unit'].tolist() == [-250, 251, 252, 253]
+        assert df['file'].tolist() == ['lak1_1000.ggo', 'site1.ggo',
+                                       'site2.ggo', 'site3.ggo']
+    else:
+        assert df['unit'].tolist() == [-250, 251, 251, 252]
+        assert df['file'].tolist() == ['lak1_1000.ggo', 'sfr_gages_000.ggo',
+                                       'sfr_gages_000.ggo', 'sfr_gages_001.ggo']
+    # no lakes
+    df = get_gage_package_data(sfr_observations=sfr_observations,
+                               starting_unit_number=300)
+    assert df['unit'].tolist() == [300, 301, 302]
+    assert len(get_gage_package_data()) == 0
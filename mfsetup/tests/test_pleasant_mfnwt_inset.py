@@ -5,6 +5,8 @@ Tests for Pleasant Lake inset case
 * Lake precip and evap specified with PRISM data; evap computed using evaporation.hamon_evaporation
 * transient parent model with initial steady-state; copy unspecified data from parent
 """
+import copy
+import functools
 import os
 
 import flopy
@@ -14,6 +16,7 @@ import pandas as pd
 fm = flopy.modflow
 import pytest
 
+import mfsetup.fileio
 from mfsetup import MFnwtModel
 from mfsetup.discretization import find_remove_isolated_cells
 from mfsetup.fileio import load_array
@@ -26,6 +29,30 @@ def test_perioddata(get_pleasant_nwt):
     assert m.perioddata['start_datetime'][0] == pd.Timestamp(m.cfg['dis']['start_date_time'])
 
 
+def test_parent_snapshot_update(pleasant_nwt_cfg, tmpdir, monkeypatch):
+    cfg = copy.deepcopy(pleasant_nwt_cfg)
+    cfg['model']['model_ws'] = os.path.join(tmpdir, 'pleasant_nwt_snapshot')
+    m = MFnwtModel(cfg=cfg, **cfg['model'])
+    # only the parent discretization is read up front
+    assert m.parent.deferred_packages == {'BAS6', 'UPW', 'RCH'}
+    hk = m.parent.upw.hk.array
+    m.update_parent_snapshot()
+
+    # a second build gets the package read during the first build
+    # from the snapshot, without parsing any parent model input
+    def no_parsing(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            raise AssertionError('parent model input was parsed')
+        return wrapper
+    monkeypatch.setattr(mfsetup.fileio, 'flopy_mf2005_load_package',
+                        no_parsing(mfsetup.fileio.flopy_mf2005_load_package))
+    monkeypatch.setattr(fm.Modflow, 'load', no_parsing(fm.Modflow.load))
+    m2 = MFnwtModel(cfg=copy.deepcopy(cfg), **cfg['model'])
+    assert m2.parent.deferred_packages == {'BAS6', 'RCH'}
+    assert np.array_equal(m2.parent.upw.hk.array, hk)
+
+
 def test_ibound(pleasant_nwt_with_dis):
     m = pleasant_nwt_with_dis
     # use pleasant lake extent as ibound
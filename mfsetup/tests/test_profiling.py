@@ -0,0 +1,158 @@
+import json
+import time
+
+import numpy as np
+import pytest
+
+from mfsetup.interpolate import delaunay_bytes_per_point
+from mfsetup.profiling import MemoryBudgetError, Profiler, get_rss, parse_memory_size
+
+
+@pytest.fixture
+def profiler():
+    return Profiler()
+
+
+def test_span_nesting(profiler):
+
+    with profiler.span('outer', model='test') as outer:
+        for i in range(3):
+            with profiler.span('inner', cells=10) as inner:
+                assert profiler.current is inner
+                assert inner.parent is outer
+                profiler.add_counts(cells=5)
+                time.sleep(0.01)
+        assert profiler.current is outer
+    assert profiler.current is None
+    assert len(profiler.spans) == 4
+    assert outer.depth == 0
+    assert all(s.depth == 1 for s in profiler.spans[1:])
+    assert all(s.counts['cells'] == 15 for s in profiler.spans[1:])
+    assert outer.wall >= sum(s.wall for s in profiler.spans[1:])
+    assert outer.cpu is not None
+
+    summary = profiler.summary()
+    assert summary.index.tolist() == ['outer', 'inner']
+    assert summary.loc['inner', 'calls'] == 3
+    assert summary.loc['inner', 'cells'] == 45
+    assert summary.loc['inner', 'wall'] >= 0.03
+    table = profiler.format_summary()
+    assert '  inner' in table
+
+
+def test_span_exception(profiler):
+    with pytest.raises(ValueError):
+        with profiler.span('fails'):
+            raise ValueError()
+    assert profiler.current is None
+    assert profiler.spans[0].wall is not None
+
+
+def test_timed(profiler):
+
+    @profiler.timed()
+    def add(a, b):
+        profiler.add_counts(rows=1)
+        return a + b
+
+    @profiler.timed('named')
+    def add2(a, b):
+        return add(a, b) + add(a, b)
+
+    assert add2(1, 2) == 6
+    summary = profiler.summary()
+    assert summary.index.tolist() == ['named', 'test_timed.<locals>.add']
+    assert summary['calls'].tolist() == [1, 2]
+    assert summary['rows'].tolist()[-1] == 2
+    # counts outside of any span are ignored
+    profiler.add_counts(rows=1)
+
+
+def test_write_trace(profiler, tmpdir):
+    with profiler.span('setup', model='test'):
+        with profiler.span('package', rows=10):
+            pass
+    outfile = tmpdir / 'profile.json'
+    profiler.write_trace(outfile)
+    with open(outfile) as src:
+        trace = json.load(src)
+    events = trace['traceEvents']
+    assert [e['name'] for e in events] == ['setup', 'package']
+    assert all(e['ph'] == 'X' for e in events)
+    # child event is contained within the parent
+    assert events[1]['ts'] >= events[0]['ts']
+    assert events[1]['ts'] + events[1]['dur'] <= events[0]['ts'] + events[0]['dur']
+    assert events[1]['args']['rows'] == 10
+    assert events[0]['args']['model'] == 'test'
+
+    profiler.reset()
+    assert len(profiler.spans) == 0
+
+
+def test_memory_tracking(profiler):
+    profiler.start_memory_tracking()
+    try:
+        with profiler.span('outer') as outer:
+            with profiler.span('inner') as inner:
+                arr = np.ones(2_000_000)  # 16 MB
+                del arr
+    finally:
+        profiler.stop_memory_tracking()
+    assert inner.peak_mem >= 16e6
+    # peak allocated in the inner span is included in the outer span
+    assert outer.peak_mem >= inner.peak_mem
+    summary = profiler.summary()
+    assert summary.loc['inner', 'peak_mb'] >= 16
+    if get_rss() is not None:
+        assert summary.loc['inner', 'rss_mb'] > 0
+    assert 'peak_mb' in profiler.format_summary()
+
+
+@pytest.mark.parametrize('size,expected', [(1000, 1000),
+                                           ('1000', 1000),
+                                           ('8 GB', 8e9),
+                                           ('500mb', 5e8),
+                                           (None, None),
+                                           ('lots', ValueError)])
+def test_parse_memory_size(size, expected):
+    if expected is ValueError:
+        with pytest.raises(ValueError):
+            parse_memory_size(size)
+    else:
+        assert parse_memory_size(size) == expected
+
+
+def test_memory_budget(profiler):
+    assert profiler.within_memory_budget(1e15)
+    profiler.memory_budget = 1e12
+    assert profiler.within_memory_budget(1e6)
+    assert not profiler.within_memory_budget(2e12)
+    with pytest.raises(MemoryBudgetError, match='memory budget'):
+        profiler.check_memory_budget(2e12, 'a big step')
+
+
+def test_regrid3d_memory_budget(pfl_nwt_with_dis_bas6):
+    """With a memory budget that can't accommodate
+    the whole parent grid, regrid3d should fall back to a window
+    of source points around the destination grid."""
+    from mfsetup.interpolate import regrid3d
+    from mfsetup.profiling import profiler as default_profiler
+
+    m = pfl_nwt_with_dis_bas6
+    arr = m.parent.dis.botm.array
+    rg = regrid3d(arr, m.parent.modelgrid, m.modelgrid)
+    ncells = arr.size + 2 * arr[0].size
+    rss = get_rss()
+    if rss is None:
+        pytest.skip('Process RSS not available')
+    try:
+        default_profiler.memory_budget = rss + 0.5 * ncells * delaunay_bytes_per_point[3]
+        rg_windowed = regrid3d(arr, m.parent.modelgrid, m.modelgrid)
+        # results differ slightly where the triangulation differs
+        np.testing.assert_allclose(rg_windowed, rg, atol=0.1)
+        # too small of a budget for even the windowed points
+        default_profiler.memory_budget = 1
+        with pytest.raises(MemoryBudgetError):
+            regrid3d(arr, m.parent.modelgrid, m.modelgrid)
+    finally:
+        default_profiler.memory_budget = None
@@ -21,6 +21,7 @@ from mfsetup.sourcedata import (
     TransientTabularSourceData,
     transient2d_to_xarray,
 )
+from mfsetup.evaporation import grid_latitude, hamon_evaporation
 from mfsetup.units import convert_length_units, convert_time_units
 
 
@@ -491,3 +492,82 @@ def test_netcdf_source_data(test_data_path, tmpdir, crs,
             assert np.allclose(results1[per].mean(),
                             results3[per].mean(), rtol=0.05)
         j=2
+
+
+def test_netcdf_source_data_multiple_files(test_data_path, tmpdir,
+                                          shellmound_model_with_dis):
+    ncfile = test_data_path / \
+        'shellmound/net_infiltration__2000-01-01_to_2017-12-31__414_by_394.nc'
+    m = shellmound_model_with_dis
+    period_stats = {0: ['mean', '2000-01-01', '2017-12-31'], 1: 'mean', 3: 'max'}
+    sd = NetCDFSourceData(ncfile, 'net_infiltration', period_stats=period_stats,
+                          length_units='inches', time_units='days', dest_model=m)
+    expected = sd.get_data()
+
+    # split the NetCDF file into yearly files
+    with xr.open_dataset(ncfile) as ds:
+        for year, year_ds in ds.groupby('time.year'):
+            year_ds.to_netcdf(Path(tmpdir) / f'net_infiltration_{year}.nc')
+    for filenames in (sorted(Path(tmpdir).glob('net_infiltration_*.nc')),
+                      str(Path(tmpdir) / 'net_infiltration_*.nc')):
+        sd = NetCDFSourceData(filenames, 'net_infiltration', period_stats=period_stats,
+                              length_units='inches', time_units='days', dest_model=m)
+        assert len(sd.filenames) == 18
+        results = sd.get_data()
+        assert results.keys() == expected.keys()
+        for per, values in expected.items():
+            np.testing.assert_allclose(results[per], values, rtol=1e-6)
+
+
+def test_netcdf_source_data_window(test_data_path, shellmound_model_with_dis):
+    ncfile = test_data_path / \
+        'shellmound/net_infiltration__2000-01-01_to_2017-12-31__414_by_394.nc'
+    m = shellmound_model_with_dis
+    sd = NetCDFSourceData(ncfile, 'net_infiltration', period_stats={0: 'mean'},
+                          length_units='inches', time_units='days', dest_model=m)
+    with xr.open_dataset(ncfile) as ds:
+        x, y = np.meshgrid(ds.x.values, ds.y.values)
+    # a model covering only the middle of the source grid
+    sd.dest_grid_xy = np.array([[x[10, 12], y[10, 12]], [x[11, 14], y[11, 14]]])
+    window = sd.get_source_window(x, y)
+    assert window == {'y': slice(8, 14), 'x': slice(10, 17)}
+    # a model outside of the source grid
+    sd.dest_grid_xy = sd.dest_grid_xy + 1e7
+    assert sd.get_source_window(x, y) == {'y': slice(None), 'x': slice(None)}
+
+
+def test_netcdf_source_data_hamon_evaporation(test_data_path, tmpdir,
+                                              shellmound_model_with_dis):
+    ncfile = test_data_path / \
+        'shellmound/net_infiltration__2000-01-01_to_2017-12-31__414_by_394.nc'
+    m = shellmound_model_with_dis
+    # make a daily temperature dataset on the same grid
+    with xr.open_dataset(ncfile) as ds:
+        ds = ds.isel(time=slice(0, 60))
+        times = pd.date_range('2000-01-01', periods=len(ds.time), freq='D')
+        temperature = xr.full_like(ds['net_infiltration'], 10.)
+        temperature = temperature.assign_coords(time=times)
+        temperature.name = 'temperature'
+        temp_ds = temperature.to_dataset()
+        temp_ds['crs'] = ds['crs']
+        temp_ncfile = Path(tmpdir) / 'temperature.nc'
+        temp_ds.to_netcdf(temp_ncfile)
+
+    period_stats = {0: ['mean', '2000-01-01', '2000-01-31']}
+    sd = NetCDFSourceData(temp_ncfile, 'temperature', period_stats=period_stats,
+                          length_units='celsius', evaporation_method='hamon',
+                          dest_model=m)
+    assert sd.length_units == 'inches'
+    results = sd.get_data()
+    # evaporation for 10 C at the model latitude,
+    # converted from inches to model length units
+    latitude = grid_latitude(m.modelgrid.xcellcenters, m.modelgrid.ycellcenters,
+                             crs=m.modelgrid.crs)
+    expected = np.mean([hamon_evaporation(doy, 10., latitude.mean(),
+                                          dest_length_units=m.length_units)
+                        for doy in range(1, 32)])
+    assert np.allclose(results[0][~np.isnan(results[0])].mean(), expected, rtol=0.01)
+
+    with pytest.raises(ValueError):
+        NetCDFSourceData(temp_ncfile, 'temperature', period_stats=period_stats,
+                         evaporation_method='penman', dest_model=m)
@@ -17,6 +17,7 @@ from mfsetup.mf6model import MF6model
 from mfsetup.sourcedata import TransientTabularSourceData
 from mfsetup.tdis import (
     aggregate_dataframe_to_stress_period,
+    aggregate_dataframe_to_stress_periods,
     get_parent_stress_periods,
     setup_perioddata_group,
 )
@@ -305,6 +306,52 @@ def test_aggregate_dataframe_to_stress_period(shellmound_datapath, sourcefile, d
         assert np.allclose(result['flux_m3'].sum(), expected_sum)
 
 
+@pytest.mark.parametrize('end_datetime_column', ('end_datetime', None))
+@pytest.mark.parametrize('sourcefile', ['tables/sp69_pumping_from_meras21_m3.csv',
+                                        'tables/iwum_m3_1M.csv',
+                                        'tables/iwum_m3_6M.csv'])
+def test_aggregate_dataframe_to_stress_periods(shellmound_datapath, sourcefile,
+                                               end_datetime_column):
+    welldata = pd.read_csv(os.path.join(shellmound_datapath, sourcefile))
+    duplicate_well = welldata.groupby('node').get_group(welldata.node.values[0])
+    welldata = pd.concat([welldata, duplicate_well], axis=0)
+    welldata.index = pd.to_datetime(welldata['start_datetime'])
+    # overlapping periods (default of whole data file; start after end)
+    # with different statistics, and a period defined by a date range
+    period_stats = {0: {'period_stat': 'mean'},
+                    1: {'period_stat': 'mean',
+                        'start_datetime': pd.Timestamp('2007-04-01'),
+                        'end_datetime': pd.Timestamp('2007-09-30')},
+                    2: {'period_stat': 'sum',
+                        'start_datetime': pd.Timestamp('2007-10-01'),
+                        'end_datetime': pd.Timestamp('2008-03-31')},
+                    3: None,
+                    4: {'period_stat': ['max', '2007-04-01', '2007-09-30'],
+                        'start_datetime': '2007-04-01',
+                        'end_datetime': '2007-09-30'},
+                    5: {'period_stat': 'mean',
+                        'start_datetime': pd.Timestamp('2007-04-01'),
+                        'end_datetime': pd.Timestamp('2007-03-31')},
+                    }
+    kwargs = {'id_column': 'node', 'data_column': 'flux_m3',
+              'datetime_column': 'start_datetime',
+              'end_datetime_column': end_datetime_column,
+              'resolve_duplicates_with': 'sum'}
+    results = aggregate_dataframe_to_stress_periods(welldata, period_stats=period_stats,
+                                                    **kwargs)
+    expected = []
+    for kper, period_stat in period_stats.items():
+        if period_stat is None:
+            continue
+        aggregated = aggregate_dataframe_to_stress_period(welldata, **kwargs, **period_stat)
+        aggregated['per'] = kper
+        expected.append(aggregated)
+    expected = pd.concat(expected).sort_values(by=['per', 'node']).reset_index(drop=True)
+    results = results.sort_values(by=['per', 'node']).reset_index(drop=True)
+    pd.testing.assert_frame_equal(results[expected.columns], expected,
+                                  check_dtype=False)
+
+
 @pytest.fixture()
 def dest_model(shellmound_simulation, project_root_path):
     m = MF6model(simulation=shellmound_simulation)
@@ -2,12 +2,14 @@
 import platform
 import sys
 
+import flopy.modflow as fm
 import numpy as np
 import pandas as pd
 import pytest
 
 from mfsetup import MF6model
 from mfsetup.wells import (
+    FastModflowMnw2,
     assign_layers_from_screen_top_botm,
     get_open_interval_thickness,
     get_package_stress_period_data,
@@ -200,3 +202,49 @@ def test_get_package_stress_period_data(models_with_dis):
     elif models_with_dis.name == 'pfl':
         assert np.array_equal(result.per.unique(),
                               np.arange(models_with_dis.nper))
+
+
+def test_fast_modflow_mnw2(tmpdir):
+    """Compare FastModflowMnw2 to the flopy ModflowMnw2 package,
+    with multi-node wells, and itmp < 0 and == 0."""
+    nwells, nper = 20, 6
+    packages = {}
+    for package_name, mnw2_class in ('flopy', fm.ModflowMnw2), ('mfsetup', FastModflowMnw2):
+        m = fm.Modflow('mnw', model_ws=str(tmpdir / package_name))
+        fm.ModflowDis(m, nlay=3, nrow=10, ncol=10, nper=nper)
+        nd = fm.ModflowMnw2.get_empty_node_data(nwells + 1)
+        nd['i'] = np.arange(nwells + 1) % 10
+        nd['j'] = np.arange(nwells + 1) // 10
+        nd['ztop'] = -1
+        nd['zbotm'] = -10
+        nd['zpump'] = -9
+        # well0 has two nodes
+        nd['wellid'] = [f'well{i}' for i in range(nwells)] + ['well0']
+        nd['k'][-1] = 1
+        nd['losstype'] = 'skin'
+        nd['pumploc'] = -1
+        nd['rw'] = 0.1
+        nd['rskin'] = 0.15
+        nd['kskin'] = 50
+        spd = {}
+        itmp = [nwells, nwells - 5, -1, 0, 3, -1]
+        for per, n in enumerate(itmp):
+            if n > 0:
+                spd_per = fm.ModflowMnw2.get_empty_stress_period_data(n)
+                spd_per['wellid'] = [f'well{i}' for i in range(nwells)][::-1][:n]
+                spd_per['qdes'] = -100. * np.arange(n) - per
+                spd[per] = spd_per
+        packages[package_name] = mnw2_class(m, mnwmax=nwells, node_data=nd,
+                                            stress_period_data=spd, itmp=itmp)
+        packages[package_name].write_file()
+    flopy_mnw2, mnw2 = packages['flopy'], packages['mfsetup']
+    assert mnw2.mnw.keys() == flopy_mnw2.mnw.keys()
+    for wellid, mnw in mnw2.mnw.items():
+        assert np.array_equal(mnw.node_data, flopy_mnw2.mnw[wellid].node_data)
+        assert np.array_equal(mnw.stress_period_data,
+                              flopy_mnw2.mnw[wellid].stress_period_data)
+    with open(mnw2.fn_path) as src:
+        results = src.read()
+    with open(flopy_mnw2.fn_path) as src:
+        expected = src.read()
+    assert results == expected
@@ -0,0 +1,11 @@
+# BAS6 package for  MODFLOW-NWT, generated by Flopy.
+FREE
+OPEN/CLOSE            external/ibound0.dat               1     (FREE) -1 ibound layer 1
+OPEN/CLOSE            external/ibound1.dat               1     (FREE) -1 ibound layer 2
+OPEN/CLOSE            external/ibound2.dat               1     (FREE) -1 ibound layer 3
+OPEN/CLOSE            external/ibound3.dat               1     (FREE) -1 ibound layer 4
+     -9999
+OPEN/CLOSE              external/strt0.dat               1     (FREE) -1 strt layer 1
+OPEN/CLOSE              external/strt1.dat               1     (FREE) -1 strt layer 2
+OPEN/CLOSE              external/strt2.dat               1     (FREE) -1 strt layer 3
+OPEN/CLOSE              external/strt3.dat               1     (FREE) -1 strt layer 4
@@ -0,0 +1,15 @@
+# pleasant model version 0.post44+g75119f5
+# bas6 package for modflow-nwt generated by flopy version 3.8.2 3.8.2
+# via modflow-setup version 0.post44+g75119f5 at 2026-10-19 10:54:48
+FREE
+OPEN/CLOSE         external/ibound_000.dat               1     (FREE) -1 ibound layer 1                
+OPEN/CLOSE         external/ibound_001.dat               1     (FREE) -1 ibound layer 2                
+OPEN/CLOSE         external/ibound_002.dat               1     (FREE) -1 ibound layer 3                
+OPEN/CLOSE         external/ibound_003.dat               1     (FREE) -1 ibound layer 4                
+OPEN/CLOSE         external/ibound_004.dat               1     (FREE) -1 ibound layer 5                
+     -9999
+OPEN/CLOSE           external/strt_000.dat               1     (FREE) -1 strt layer 1                  
+OPEN/CLOSE           external/strt_001.dat               1     (FREE) -1 strt layer 2                  
+OPEN/CLOSE           external/strt_002.dat               1     (FREE) -1 strt layer 3                  
+OPEN/CLOSE           external/strt_003.dat               1     (FREE) -1 strt layer 4                  
+OPEN/CLOSE           external/strt_004.dat               1     (FREE) -1 strt layer 5                  